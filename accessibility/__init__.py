@@ -0,0 +1,7 @@
+"""
+Общие компоненты расчёта изохрон и транспортной доступности.
+
+Используются скриптами Task4 (processing-алгоритм), Task5 и second.py.
+Модули импортируются по отдельности, чтобы не тянуть лишние зависимости
+(qgis, numpy) туда, где они не нужны.
+"""
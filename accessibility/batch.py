@@ -0,0 +1,275 @@
+"""
+Пакетный расчёт изохрон от множества стартов в пуле процессов.
+
+Граф (и таблица остановок) не копируется в каждый процесс: исполнители
+открывают артефакты graph_cache через memory-map только для чтения, так
+что страницы файлов общие для всех процессов. Задание описывает расчёт
+для одного старта; run_batch раздаёт старты пачками и отдаёт результаты
+по мере готовности, чтобы их можно было сразу писать в выходной слой.
+"""
+import math
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+
+import numpy as np
+
+from . import graph_cache
+from .graph import WalkGraph
+from .pool import mp_context
+from .search import bounded_search
+from .service_area import RoadNetwork
+from .snapping import NodeGrid
+from .transit import StopTimeTable
+
+DEFAULT_BATCH_CHUNK = 8  # стартов в одной пачке
+
+_JOB = None  # задание процесса-исполнителя (см. _init_worker)
+
+
+def _hull_or_points(xy, hull_kind):
+    """Для выпуклой оболочки — её кольцо (меньше данных между процессами), иначе сами точки."""
+    if hull_kind == 'convex':
+        from .hulls import convex_hull_xy
+        return convex_hull_xy(xy)
+    return xy
+
+
+def shape_polygon(shape, hull_kind='convex'):
+    """QgsGeometry изохроны из формы результата задания (кольцо, точки или отрезки) или None."""
+    from .hulls import HULL_EDGES, isochrone_polygon
+    if hull_kind == HULL_EDGES:
+        return isochrone_polygon(hull_kind, segments=shape)
+    return isochrone_polygon(hull_kind, points=shape)
+
+
+def cache_network(network, root=None):
+    """
+    Кладёт RoadNetwork в graph_cache (если её там ещё нет) для ServiceAreaJob.
+
+    Returns:
+    --------
+    str: ключ сети в кэше
+    """
+    key = graph_cache.graph_fingerprint(kind='road_network', roads=network.key)
+    if graph_cache.load_graph(key, root, mmap=True) is None:
+        graph_cache.save_graph(key, network.to_arrays(), meta={'nodes': network.num_nodes}, root=root)
+    return key
+
+
+class ServiceAreaJob:
+    """
+    Зона обслуживания по RoadNetwork (Task5, second.py).
+
+    Результат старта — словарь: node, snap_dist, shapes (кольцо выпуклой
+    оболочки или отрезки (K, 2, 2) — по порогу), counts (число достигнутых
+    частей рёбер), net_population (население по сети, если задана привязка).
+    """
+
+    def __init__(self, network_key, cutoffs, hull_kind='convex', population=None,
+                 snap_tolerance=math.inf, root=None):
+        self.network_key = network_key
+        self.cutoffs = list(cutoffs)
+        self.hull_kind = hull_kind
+        self.population = population  # NodePopulation или None
+        self.snap_tolerance = snap_tolerance
+        self.root = root
+        self.network = None
+
+    def __getstate__(self):
+        state = dict(self.__dict__)
+        state['network'] = None  # сеть открывается в исполнителе с диска
+        return state
+
+    def load(self):
+        if self.network is not None:
+            return
+        loaded = graph_cache.load_graph(self.network_key, self.root, mmap=True)
+        if loaded is None:
+            raise Exception(f"Сеть {self.network_key[:12]} не найдена в кэше графов")
+        self.network = RoadNetwork.from_arrays(loaded[0], key=self.network_key)
+
+    def snap_many(self, xy):
+        """Привязка пачки стартов к сети одним запросом: (node_ids, distances), -1 — не привязан."""
+        return self.network.snap_many(xy, self.snap_tolerance)
+
+    def run(self, x, y, snapped=None):
+        node, snap_dist = snapped if snapped is not None else self.network.snap(x, y, self.snap_tolerance)
+        if node is None:
+            return None
+        search = self.network.search(node, self.cutoffs)
+        intervals = self.network.intervals(search)
+        net_population = [0.0] * len(intervals)
+        if self.population is not None:
+            net_population = self.population.within(search)[0].tolist()
+        shapes = []
+        for interval in intervals:
+            if self.hull_kind == 'edges':
+                shapes.append(interval.segments)
+            else:
+                shapes.append(_hull_or_points(interval.end_points, self.hull_kind))
+        return {
+            'node': node,
+            'snap_dist': snap_dist,
+            'shapes': shapes,
+            'counts': [len(interval) for interval in intervals],
+            'net_population': net_population,
+        }
+
+
+class TransitJob:
+    """
+    Изохроны ОТ (Task4) по пешему графу и таблице остановка → остановка.
+
+    Пешком — ограниченный поиск от старта, подход к остановкам — время до
+    узла остановки плюс подход от узла, дальше — StopTimeTable.query.
+    Результат старта — словарь: node, snap_dist, shapes (кольцо или точки
+    для каждого шага), counts (число точек шага).
+    """
+
+    def __init__(self, graph_key, table_key, stop_ids, stop_xy, stop_nodes, stop_offsets,
+                 cutoffs, walk_speed_mps, hull_kind='convex', max_snap=500.0, root=None):
+        self.graph_key = graph_key
+        self.table_key = table_key
+        self.stop_ids = np.asarray(stop_ids, dtype=np.int64)
+        self.stop_xy = np.asarray(stop_xy, dtype=np.float64).reshape(-1, 2)
+        self.stop_nodes = np.asarray(stop_nodes, dtype=np.int64)      # -1 — остановка не привязана
+        self.stop_offsets = np.asarray(stop_offsets, dtype=np.float64)  # расстояние узел → остановка
+        self.cutoffs = list(cutoffs)
+        self.walk_speed_mps = walk_speed_mps
+        self.hull_kind = hull_kind
+        self.max_snap = max_snap
+        self.root = root
+        self.graph = None
+        self.grid = None
+        self.table = None
+
+    def __getstate__(self):
+        state = dict(self.__dict__)
+        state.update(graph=None, grid=None, table=None)
+        return state
+
+    def load(self):
+        if self.graph is not None:
+            return
+        graph_arrays = graph_cache.load_graph(self.graph_key, self.root, mmap=True)
+        table_arrays = graph_cache.load_graph(self.table_key, self.root, mmap=True)
+        if graph_arrays is None or table_arrays is None:
+            raise Exception("Пеший граф или таблица остановок не найдены в кэше графов")
+        self.graph = WalkGraph.from_arrays(graph_arrays[0])
+        self.grid = NodeGrid.from_arrays(self.graph.node_xy, graph_arrays[0])
+        self.table = StopTimeTable.from_arrays(table_arrays[0])
+
+    def snap_many(self, xy):
+        """Привязка пачки стартов к пешему графу одним запросом: (node_ids, distances), -1 — не привязан."""
+        nodes, dists = self.grid.nearest_many(xy)
+        nodes[dists > self.max_snap] = -1
+        return nodes, dists
+
+    def run(self, x, y, snapped=None):
+        node, snap_dist = snapped if snapped is not None else self.grid.nearest(x, y)
+        if node is None or snap_dist > self.max_snap:
+            return None
+        search = bounded_search(self.graph, node, self.cutoffs)
+        dense = search.to_dense(self.graph.num_nodes)
+
+        # Подход к остановкам: как Шаг 8 Task4
+        bound = self.stop_nodes >= 0
+        access = np.empty(len(self.stop_ids))
+        access[bound] = dense[self.stop_nodes[bound]] + self.stop_offsets[bound] / self.walk_speed_mps
+        direct = np.hypot(self.stop_xy[~bound, 0] - x, self.stop_xy[~bound, 1] - y)
+        access[~bound] = direct / self.walk_speed_mps
+        arrival = self.table.query(dict(zip(self.stop_ids.tolist(), access.tolist())), self.cutoffs[-1])
+
+        # Остановка попадает только в первый подходящий шаг (как Шаг 11 Task4)
+        stop_pos = {stop_id: i for i, stop_id in enumerate(self.stop_ids.tolist())}
+        reached = np.array([stop_pos[s] for s in arrival], dtype=np.int64)
+        reached_t = np.array([arrival[s] for s in arrival], dtype=np.float64)
+        first_step = np.searchsorted(np.asarray(self.cutoffs), reached_t, side='left')
+
+        walk_xy = self.graph.node_xy[search.nodes]
+        bounds = search.bounds(strict=True)
+        shapes, counts = [], []
+        for k, cutoff in enumerate(self.cutoffs):
+            xy = np.concatenate((walk_xy[:bounds[k]], self.stop_xy[reached[first_step == k]]))
+            counts.append(len(xy))
+            shapes.append(_hull_or_points(xy, self.hull_kind))
+        return {'node': node, 'snap_dist': snap_dist, 'shapes': shapes, 'counts': counts}
+
+
+def _init_worker(job):
+    global _JOB
+    job.load()
+    _JOB = job
+
+
+def _run_chunk(start, origins, job=None):
+    """Пачка стартов: привязка всех к сети одним запросом, затем расчёт каждого."""
+    job = job or _JOB
+    nodes, dists = job.snap_many(origins)
+    return [(start + i, job.run(x, y, (node if node >= 0 else None, dist)))
+            for i, ((x, y), node, dist) in enumerate(zip(origins.tolist(), nodes.tolist(), dists.tolist()))]
+
+
+def run_batch(job, origins, workers=None, chunk_size=DEFAULT_BATCH_CHUNK,
+              progress=None, is_canceled=None):
+    """
+    Расчёт задания для каждого старта; генератор пар (индекс старта, результат).
+
+    Результаты отдаются по мере готовности пачек (не по порядку стартов);
+    результат None — старт не привязан к сети.
+
+    Parameters:
+    -----------
+    job : ServiceAreaJob или TransitJob
+        Артефакты задания уже должны лежать в graph_cache
+    origins : ndarray (N, 2)
+        Координаты стартов в CRS графа
+    workers : int
+        Число процессов (по умолчанию число ядер); при 1, недоступном пуле
+        или внутри QGIS Desktop (см. pool.mp_context) — в текущем процессе
+    progress : callable
+        (готово стартов, всего)
+    is_canceled : callable
+        Возвращает True, если расчёт нужно прервать
+    """
+    origins = np.asarray(origins, dtype=np.float64).reshape(-1, 2)
+    chunk_size = max(int(chunk_size), 1)
+    chunks = {i0: origins[i0:i0 + chunk_size] for i0 in range(0, len(origins), chunk_size)}
+    workers = min(workers or os.cpu_count() or 1, len(chunks))
+    done = 0
+
+    context = mp_context() if workers > 1 else None
+    if context is not None:
+        try:
+            pool = ProcessPoolExecutor(max_workers=workers, mp_context=context,
+                                       initializer=_init_worker, initargs=(job,))
+        except OSError:
+            pool = None
+        if pool is not None:
+            try:
+                futures = {pool.submit(_run_chunk, i0, xy): i0 for i0, xy in chunks.items()}
+                for future in as_completed(futures):
+                    try:
+                        items = future.result()
+                    except BrokenProcessPool:
+                        break  # оставшиеся пачки досчитываются ниже в текущем процессе
+                    del chunks[futures[future]]
+                    yield from items
+                    done += len(items)
+                    if progress:
+                        progress(done, len(origins))
+                    if is_canceled and is_canceled():
+                        return
+            finally:
+                pool.shutdown(wait=True, cancel_futures=True)
+
+    if chunks:
+        job.load()
+    for i0, xy in list(chunks.items()):
+        yield from _run_chunk(i0, xy, job)
+        done += len(xy)
+        if progress:
+            progress(done, len(origins))
+        if is_canceled and is_canceled():
+            return
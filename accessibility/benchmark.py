@@ -0,0 +1,394 @@
+"""
+Замеры стадий Task4, second.py и Task5 на синтетических городах разного размера.
+
+    python -m accessibility.benchmark --sizes 10000 100000 1000000 --out bench
+
+Для каждого размера строится город (synthetic.generate_city), и стадии
+каждого пайплайна выполняются теми же функциями пакета, что и в скриптах:
+    task4  — пеший граф (+ рельеф), Dijkstra, привязка остановок,
+             сопоставление треков, сеть ОТ и RAPTOR, оболочки, население;
+    second — граф дорог (пешком, 5/10/15 мин), поиск, интервалы, оболочки,
+             население по сети, растр времени и его контуры на порогах;
+    task5  — то же для автомобиля (10/15 мин) от центров всех районов.
+Замеры пишутся через instrument.Recorder: out.json — все интервалы со
+счётчиками, out.md — таблица секунд «стадия × размер» (с --baseline — ещё
+и отношение к прошлому отчёту). Население по геометриям зданий (GEOS,
+BuildingStore) замеряется только с --with-qgis — наложением пачкой и по
+одному зданию для сравнения.
+"""
+import argparse
+import json
+import math
+import os
+import platform
+import time
+from collections import defaultdict
+
+import numpy as np
+
+from . import instrument
+from .elevation import ElevationGrid, slope_adjusted_costs
+from .graph import EdgeListBuilder
+from .hulls import convex_hull_xy
+from .instrument import Recorder, activate
+from .population import NodePopulation
+from .search import bounded_search
+from .service_area import RoadNetwork
+from .snapping import NodeGrid
+from .speed_profile import RouteLines, build_speed_profile
+from .surface import DEFAULT_SURFACE_CELL
+from .synthetic import CITY_KINDS, generate_city
+from .transit import DEFAULT_MAX_TRANSFERS, TransitIndex, raptor_search, transfer_walk_times
+
+PIPELINES = ('task4', 'second', 'task5')
+
+# Параметры по умолчанию скриптов
+TASK4_WALK_KMH = 5.0
+TASK4_BUS_KMH = 25.0
+TASK4_STEP_MIN = 5.0
+TASK4_STEPS = 4
+TASK4_TRANSFER_DIST = 200.0
+TASK4_VERTEX_RADIUS = 200.0
+TASK4_MAX_SNAP = 500.0
+TASK4_SNAP_DIST = 25.0
+SECOND_KMH = 5.0
+SECOND_MINUTES = (5, 10, 15)
+TASK5_KMH = 40.0
+TASK5_MINUTES = (10, 15)
+
+
+def _walk_graph(city, walk_speed_mps):
+    """Пеший граф как в Task4._build_walk_graph: отрезок за отрезком, рельеф — векторно, цепочки сжаты."""
+    builder = EdgeListBuilder()
+    for part in city.roads:
+        pts = part.tolist()
+        for (x1, y1), (x2, y2) in zip(pts[:-1], pts[1:]):
+            length = math.hypot(x2 - x1, y2 - y1)
+            if length < 0.1:
+                continue
+            builder.add_edge(builder.node(x1, y1), builder.node(x2, y2), length / walk_speed_mps, length)
+    with instrument.span('elevation'):
+        grid = ElevationGrid.rasterize_polygons(
+            ((rings, high) for rings, _, high in city.elevation), city.extent)
+        node_xy = builder.node_xy()
+        node_h = grid.sample(node_xy[:, 0], node_xy[:, 1])
+        src, dst, flat_cost, length = builder.records()
+        cost = slope_adjusted_costs(length, flat_cost, node_h[src], node_h[dst])
+    graph = builder.build(cost, contract=True)
+    stats = graph.chains.summary()
+    instrument.count('nodes', stats['nodes_before'])
+    instrument.count('edges', stats['edges_before'])
+    instrument.count('search_nodes', stats['nodes_after'])
+    instrument.count('search_edges', stats['edges_after'])
+    return graph
+
+
+def _transfer_pairs(stop_xy, max_dist):
+    """Пары остановок ближе max_dist (хеш по ячейкам max_dist)."""
+    cells = defaultdict(list)
+    keys = np.floor(stop_xy / max_dist).astype(np.int64).tolist()
+    for i, key in enumerate(keys):
+        cells[tuple(key)].append(i)
+    pairs = []
+    for i, (cx, cy) in enumerate(keys):
+        x, y = stop_xy[i]
+        for dx in (-1, 0, 1):
+            for dy in (-1, 0, 1):
+                for j in cells.get((cx + dx, cy + dy), ()):
+                    if j == i:
+                        continue
+                    d = math.hypot(stop_xy[j, 0] - x, stop_xy[j, 1] - y)
+                    if d <= max_dist:
+                        pairs.append((i, j, d))
+    return pairs
+
+
+def _building_store(city):
+    """BuildingStore по зданиям города (memory-слой QGIS)."""
+    from qgis.core import QgsFeature, QgsField, QgsVectorLayer
+    from qgis.PyQt.QtCore import QVariant
+
+    from .buildings import BuildingStore
+    from .hulls import polygon_from_ring
+
+    layer = QgsVectorLayer("Polygon?crs=EPSG:32648", "buildings", "memory")
+    layer.dataProvider().addAttributes([QgsField('Насел', QVariant.Double)])
+    layer.updateFields()
+    features = []
+    for ring, pop in zip(city.building_rings, city.building_population.tolist()):
+        feat = QgsFeature(layer.fields())
+        feat.setGeometry(polygon_from_ring(ring[:-1]))
+        feat.setAttributes([pop])
+        features.append(feat)
+    layer.dataProvider().addFeatures(features)
+    return BuildingStore(layer, 'Насел')
+
+
+def _geos_population(store, rings, proportional):
+    """
+    Население по оболочкам: наложение пачкой (population) и по одному зданию
+    (population_loop, эталон); расхождения считаются в population_mismatch.
+    """
+    if store is None:
+        return
+    from .hulls import polygon_from_ring
+    polygons = [polygon_from_ring(ring) for ring in rings if len(ring) >= 3]
+    with instrument.span('population'):
+        bulk = [store.population_in_polygon(polygon, proportional=proportional) for polygon in polygons]
+    with instrument.span('population_loop'):
+        loop = [store.population_in_polygon_loop(polygon, proportional=proportional) for polygon in polygons]
+    for a, b in zip(bulk, loop):
+        if not np.allclose(a, b, rtol=1e-9, atol=1e-6):
+            instrument.count('population_mismatch')
+
+
+def bench_task4(city, origins, store=None, workers=None):
+    walk_mps = TASK4_WALK_KMH / 3.6
+    bus_mps = TASK4_BUS_KMH / 3.6
+    cutoffs = [TASK4_STEP_MIN * step * 60.0 for step in range(1, TASK4_STEPS + 1)]
+
+    with instrument.span('walk_graph'):
+        graph = _walk_graph(city, walk_mps)
+        grid = NodeGrid.build(graph.node_xy)
+
+    with instrument.span('stop_snap'):
+        nodes, dists = grid.nearest_many(city.stop_xy, TASK4_VERTEX_RADIUS)
+        stop_nodes = {stop_id: (node, d) if node >= 0 else (None, None)
+                      for stop_id, (node, d) in enumerate(zip(nodes.tolist(), dists.tolist()))}
+        instrument.count('stops', len(stop_nodes))
+
+    routes = RouteLines.from_parts((r['rid'], [r['xy'].tolist()]) for r in city.routes)
+    with instrument.span('stop_binding'):
+        route_pos = routes.bind_points(city.stop_xy, TASK4_SNAP_DIST)[0]
+        instrument.count('route_stops', int((route_pos >= 0).sum()))
+
+    with instrument.span('track_matching'):
+        profile = build_speed_profile(routes, city.track_xy, city.track_offsets, city.track_speeds,
+                                      workers=workers)
+        instrument.count('track_parts', len(city.track_speeds))
+
+    with instrument.span('pt_network'):
+        headway = {r['rid']: (r['HEADWAY'] if isinstance(r['HEADWAY'], (int, float))
+                              else float(r['HEADWAY'].split()[0]) * 60.0) for r in city.routes}
+        index = TransitIndex(city.stops_route_map, headway)
+        ride_times = {}
+        for route in city.routes:
+            rid = route['rid']
+            items = city.stops_route_map[rid]
+            measures = np.array([m for _, m, _ in items])
+            speeds = profile.segment_speeds(rid, measures[:-1], measures[1:])
+            seg_len = np.diff(measures)
+            length = float(np.hypot(*(route['xy'][1:] - route['xy'][:-1]).T).sum())
+            fallback = (route['TRAVELTIME'] * seg_len / length if route['TRAVELTIME'] else seg_len / bus_mps)
+            ride_times[rid] = np.where(speeds > 0, seg_len / np.where(speeds > 0, speeds, 1.0),
+                                       fallback).tolist()
+        pairs = _transfer_pairs(city.stop_xy, TASK4_TRANSFER_DIST)
+        times = transfer_walk_times(graph, pairs, stop_nodes, walk_mps, TASK4_TRANSFER_DIST * 3.0 / walk_mps)
+        footpaths = defaultdict(list)
+        for a, b, _ in pairs:
+            footpaths[a].append((b, times[(a, b)]))
+        instrument.count('transfer_pairs', len(pairs))
+
+    stop_ids = np.arange(len(city.stop_xy))
+    bound = np.array([stop_nodes[s][0] is not None for s in stop_ids.tolist()])
+    nodes_of = np.array([stop_nodes[s][0] if stop_nodes[s][0] is not None else 0 for s in stop_ids.tolist()])
+    offsets_of = np.array([stop_nodes[s][1] or 0.0 for s in stop_ids.tolist()])
+    origin_nodes, origin_dists = grid.nearest_many(origins)
+    for (x, y), node, d in zip(np.asarray(origins).tolist(), origin_nodes.tolist(), origin_dists.tolist()):
+        if node < 0 or d > TASK4_MAX_SNAP:
+            continue
+        with instrument.span('walk_search'):
+            search = bounded_search(graph, node, cutoffs)
+        with instrument.span('stop_access'):
+            dense = search.to_dense(graph.num_nodes)
+            access = np.where(bound, dense[nodes_of] + offsets_of / walk_mps,
+                              np.hypot(city.stop_xy[:, 0] - x, city.stop_xy[:, 1] - y) / walk_mps)
+            access_times = dict(zip(stop_ids.tolist(), access.tolist()))
+        with instrument.span('pt_search'):
+            arrival, stats = raptor_search(index, access_times, ride_times, footpaths, cutoffs[-1],
+                                           DEFAULT_MAX_TRANSFERS)
+            for name, value in stats.items():
+                instrument.count(f"raptor_{name}", value)
+        with instrument.span('hulls'):
+            walk_xy = graph.node_xy[search.nodes]
+            bounds = search.bounds(strict=True)
+            reached = np.array(list(arrival.keys()), dtype=np.int64)
+            reached_t = np.array(list(arrival.values()), dtype=np.float64)
+            first = np.searchsorted(np.asarray(cutoffs), reached_t, side='left')
+            rings = []
+            points = np.zeros((0, 2))
+            for k in range(len(cutoffs)):
+                points = np.concatenate((points, walk_xy[(bounds[k - 1] if k else 0):bounds[k]],
+                                         city.stop_xy[reached[first == k]]))
+                rings.append(convex_hull_xy(points))
+        _geos_population(store, rings, proportional=False)
+
+
+def bench_service_area(city, origins, speed_kmh, minutes, store=None):
+    """Пайплайн second.py / Task5: граф дорог в метрах, пороги — расстояния."""
+    distances = [speed_kmh / 3.6 * m * 60.0 for m in minutes]
+    with instrument.span('road_network'):
+        network = RoadNetwork.from_polylines(part.tolist() for part in city.roads)
+        stats = network.graph.chains.summary()
+        instrument.count('nodes', stats['nodes_before'])
+        instrument.count('edges', stats['edges_before'])
+        instrument.count('search_nodes', stats['nodes_after'])
+        instrument.count('search_edges', stats['edges_after'])
+    with instrument.span('node_population'):
+        assignment = NodePopulation.assign(network.grid, city.building_centroids, city.building_population)
+    for x, y in origins:
+        node, _ = network.snap(x, y)
+        if node is None:
+            continue
+        with instrument.span('search'):
+            search = network.search(node, distances)
+        with instrument.span('intervals'):
+            intervals = network.intervals(search)
+        with instrument.span('hulls'):
+            rings = [convex_hull_xy(interval.end_points) for interval in intervals]
+        with instrument.span('net_population'):
+            assignment.within(search)
+        with instrument.span('surface'):
+            surface = network.time_surface(search, speed_kmh / 3.6, cell_size=DEFAULT_SURFACE_CELL)
+            instrument.count('surface_cells', surface.values.size)
+        with instrument.span('contours'):
+            for m in minutes:
+                surface.rings(m * 60.0)
+        _geos_population(store, rings, proportional=True)
+
+
+def run_size(segments, args):
+    """Все выбранные пайплайны для одного размера города."""
+    t0 = time.perf_counter()
+    city = generate_city(segments, args.kind, args.polygons, args.seed)
+    generate_sec = time.perf_counter() - t0
+    summary = city.summary()
+    print(f"Город {segments}: {summary} (генерация {generate_sec:.1f} с)")
+    if args.gpkg:
+        from .synthetic import write_geopackage
+        os.makedirs(args.gpkg, exist_ok=True)
+        print(f"   GeoPackage: {write_geopackage(city, os.path.join(args.gpkg, f'city_{segments}.gpkg'))}")
+
+    rng = np.random.default_rng(args.seed)
+    (xmin, ymin, xmax, ymax), (cx, cy) = city.extent, city.center()
+    origins = np.column_stack((rng.uniform((xmin + cx) / 2, (xmax + cx) / 2, args.origins),
+                               rng.uniform((ymin + cy) / 2, (ymax + cy) / 2, args.origins))).tolist()
+    district_centers = [ring[:-1].mean(axis=0).tolist() for _, ring in city.districts]
+    store = _building_store(city) if args.with_qgis else None
+
+    result = {'segments': segments, 'city': summary, 'generate_seconds': round(generate_sec, 3),
+              'pipelines': {}}
+    for name in args.pipelines:
+        recorder = Recorder(memory=args.memory)
+        with activate(recorder):
+            with recorder.span(name):
+                if name == 'task4':
+                    bench_task4(city, origins, store, args.workers or None)
+                elif name == 'second':
+                    bench_service_area(city, origins, SECOND_KMH, SECOND_MINUTES, store)
+                else:
+                    bench_service_area(city, district_centers, TASK5_KMH, TASK5_MINUTES, store)
+        result['pipelines'][name] = recorder.to_dict()
+        for line in recorder.summary_lines():
+            print(f"   {line}")
+    return result
+
+
+def _stage_seconds(report):
+    """(размер, пайплайн, путь интервала) → секунды."""
+    table = {}
+    for size in report['sizes']:
+        for name, data in size['pipelines'].items():
+            for span in data['spans']:
+                table[(size['segments'], name, span['path'])] = span['seconds']
+    return table
+
+
+def markdown_report(report, baseline=None):
+    """Таблица «стадия × размер» по каждому пайплайну; с baseline — отношение к нему."""
+    current = _stage_seconds(report)
+    previous = _stage_seconds(baseline) if baseline else {}
+    sizes = [size['segments'] for size in report['sizes']]
+    env = report['environment']
+    lines = [
+        "# Замеры на синтетических городах",
+        "",
+        f"Python {env['python']}, numpy {env['numpy']}, ядер: {env['cpus']}, "
+        f"город: {report['kind']}{' (улицы полигонами)' if report['road_polygons'] else ''}, "
+        f"seed {report['seed']}, стартов: {report['origins']}",
+        "",
+        "| отрезков | " + " | ".join(str(s) for s in sizes) + " |",
+        "|---|" + "---|" * len(sizes),
+    ]
+    for field in ('stops', 'routes', 'tracks', 'buildings', 'extent_km'):
+        lines.append(f"| {field} | " + " | ".join(str(size['city'][field]) for size in report['sizes']) + " |")
+    for name in report['pipelines']:
+        paths = []
+        for size in report['sizes']:
+            for span in size['pipelines'].get(name, {}).get('spans', []):
+                if span['path'] not in paths:
+                    paths.append(span['path'])
+        lines += ["", f"## {name}, секунды", "",
+                  "| стадия | " + " | ".join(str(s) for s in sizes) + " |",
+                  "|---|" + "---|" * len(sizes)]
+        for path in paths:
+            cells = []
+            for s in sizes:
+                sec = current.get((s, name, path))
+                if sec is None:
+                    cells.append("—")
+                    continue
+                cell = f"{sec:.3f}"
+                base = previous.get((s, name, path))
+                if base:
+                    cell += f" (×{sec / base:.2f})"
+                cells.append(cell)
+            label = "&nbsp;&nbsp;" * path.count('/') + path.rsplit('/', 1)[-1]
+            lines.append(f"| {label} | " + " | ".join(cells) + " |")
+    return "\n".join(lines) + "\n"
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m accessibility.benchmark',
+                                     description='Замеры стадий пайплайнов на синтетических городах')
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10000, 100000])
+    parser.add_argument('--kind', choices=CITY_KINDS, default='grid')
+    parser.add_argument('--polygons', action='store_true', help='улицы кольцами кварталов (вариант Task4)')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--origins', type=int, default=3, help='стартов для task4 и second')
+    parser.add_argument('--pipelines', nargs='+', choices=PIPELINES, default=list(PIPELINES))
+    parser.add_argument('--workers', type=int, default=0, help='процессов для сопоставления треков')
+    parser.add_argument('--memory', action='store_true', help='пиковая память стадий (медленнее)')
+    parser.add_argument('--with-qgis', action='store_true', help='население по геометриям зданий (GEOS)')
+    parser.add_argument('--gpkg', help='каталог для GeoPackage сгенерированных городов (нужен QGIS)')
+    parser.add_argument('--baseline', help='прошлый отчёт .json для сравнения')
+    parser.add_argument('--out', default='benchmark', help='префикс файлов отчёта')
+    args = parser.parse_args(argv)
+
+    if args.with_qgis or args.gpkg:
+        from .headless import start_qgis
+        print(f"Запуск QGIS: {start_qgis():.2f} с")
+
+    report = {
+        'created': time.strftime('%Y-%m-%d %H:%M:%S'),
+        'environment': {'python': platform.python_version(), 'numpy': np.__version__,
+                        'cpus': os.cpu_count(), 'machine': platform.machine()},
+        'kind': args.kind, 'road_polygons': args.polygons, 'seed': args.seed,
+        'origins': args.origins, 'pipelines': args.pipelines,
+        'sizes': [run_size(segments, args) for segments in args.sizes],
+    }
+    baseline = None
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as f:
+            baseline = json.load(f)
+
+    with open(f"{args.out}.json", 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    with open(f"{args.out}.md", 'w', encoding='utf-8') as f:
+        f.write(markdown_report(report, baseline))
+    print(f"Отчёт: {args.out}.json, {args.out}.md")
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -0,0 +1,241 @@
+"""
+Хранилище зданий с населением на время сессии.
+
+Слой зданий читается один раз: геометрии (в нужной CRS), пространственный
+индекс и массив numpy с уже разобранными значениями населения. Повторные
+расчёты для любых изохрон и стартов обращаются к хранилищу, а не к слою.
+Хранилище сбрасывается при изменении или удалении слоя.
+
+Население в полигоне считается наложением пачкой (overlay.classify_boxes):
+здания далеко от границы полигона делятся на «внутри» и «снаружи»
+массивами, точные предикаты GEOS по подготовленному один раз полигону
+вызываются только для зданий у границы, а площади пересечений — только
+для пересекающих её.
+"""
+import numpy as np
+from qgis.core import (
+    QgsCoordinateTransform,
+    QgsFeatureRequest,
+    QgsGeometry,
+    QgsProject,
+    QgsSpatialIndex,
+)
+
+from . import instrument
+from .overlay import BOUNDARY, INSIDE, classify_boxes
+
+MIN_PARTIAL_SHARE = 0.05  # доля площади, начиная с которой учитывается частично попавшее здание
+
+_STORES = {}
+_WATCHED = set()
+
+
+def parse_population(value):
+    """Число жителей из атрибута ('12,5', 12, None → 12.5, 12.0, 0.0)."""
+    if value is None:
+        return 0.0
+    try:
+        text = str(value).replace(',', '.').strip()
+        return float(text) if text else 0.0
+    except (ValueError, TypeError):
+        return 0.0
+
+
+class BuildingStore:
+    """
+    Здания слоя: fids, population, areas, centroids, bounds (охваты
+    xmin, ymin, xmax, ymax) — массивы numpy одной длины; geometries —
+    QgsGeometry в CRS хранилища; в индексе id объекта равен позиции в
+    этих массивах.
+    """
+
+    def __init__(self, layer, population_field, crs=None):
+        self.layer_id = layer.id()
+        self.population_field = population_field
+        self.crs = crs if crs is not None else layer.crs()
+        self.feature_count = layer.featureCount()
+
+        transform = None
+        if layer.crs() != self.crs:
+            transform = QgsCoordinateTransform(layer.crs(), self.crs, QgsProject.instance())
+
+        request = QgsFeatureRequest().setSubsetOfAttributes([population_field], layer.fields())
+        fids, population, areas, centroids, bounds = [], [], [], [], []
+        self.geometries = []
+        self.index = QgsSpatialIndex()
+        for feature in layer.getFeatures(request):
+            geom = feature.geometry()
+            if not geom or geom.isEmpty():
+                continue
+            geom = QgsGeometry(geom)
+            if transform is not None:
+                geom.transform(transform)
+            pos = len(self.geometries)
+            bbox = geom.boundingBox()
+            self.index.addFeature(pos, bbox)
+            bounds.append((bbox.xMinimum(), bbox.yMinimum(), bbox.xMaximum(), bbox.yMaximum()))
+            self.geometries.append(geom)
+            fids.append(feature.id())
+            population.append(parse_population(feature[population_field]))
+            areas.append(geom.area())
+            c = geom.centroid().asPoint()
+            centroids.append((c.x(), c.y()))
+
+        self.fids = np.array(fids, dtype=np.int64)
+        self.population = np.array(population, dtype=np.float64)
+        self.areas = np.array(areas, dtype=np.float64)
+        self.centroids = np.array(centroids, dtype=np.float64).reshape(-1, 2)
+        self.bounds = np.array(bounds, dtype=np.float64).reshape(-1, 4)
+        self.node_assignments = {}  # привязки к узлам графов, см. population.node_population
+
+    def __len__(self):
+        return len(self.geometries)
+
+    @property
+    def total_population(self):
+        return float(self.population.sum())
+
+    def candidates(self, rect):
+        """Позиции зданий, чей охват пересекает прямоугольник."""
+        return np.array(self.index.intersects(rect), dtype=np.int64)
+
+    def population_in_polygon(self, polygon_geom, proportional=True):
+        """
+        Население в полигоне (полигон — в CRS хранилища).
+
+        proportional=True — правило second.py/Task5: здание целиком внутри
+        учитывается полностью, пересекающее — пропорционально площади, если
+        доля больше MIN_PARTIAL_SHARE; здания без жителей пропускаются.
+        proportional=False — правило Task4: любое пересекающее здание целиком.
+
+        Returns:
+        --------
+        tuple: (population, buildings_count, inside_count, partial_count)
+        """
+        candidates = self.candidates(polygon_geom.boundingBox())
+        if proportional:
+            candidates = candidates[self.population[candidates] > 0]
+        with instrument.span('overlay_classify'):
+            state = classify_boxes(self.bounds[candidates], polygon_rings(polygon_geom))
+        inside = [candidates[state == INSIDE]]
+        near = candidates[state == BOUNDARY].tolist()
+
+        crossing = []
+        predicates = len(near)
+        if near:
+            with instrument.span('overlay_geos'):
+                engine = QgsGeometry.createGeometryEngine(polygon_geom.constGet())
+                engine.prepareGeometry()
+                near_inside = []
+                for pos in near:
+                    building = self.geometries[pos].constGet()
+                    if not engine.intersects(building):
+                        continue
+                    predicates += proportional
+                    if not proportional or engine.contains(building):
+                        near_inside.append(pos)
+                    elif self.areas[pos] > 0:
+                        crossing.append(pos)
+                inside.append(np.array(near_inside, dtype=np.int64))
+
+                # Площади пересечений — только для зданий, пересекающих границу
+                part_areas = []
+                for pos in crossing:
+                    part = engine.intersection(self.geometries[pos].constGet())
+                    part_areas.append(part.area() if part is not None and not part.isEmpty() else 0.0)
+
+        inside = np.concatenate(inside)
+        total = float(self.population[inside].sum())
+        count = float(len(inside))
+        partial = 0
+        if crossing:
+            crossing = np.array(crossing, dtype=np.int64)
+            share = np.array(part_areas) / self.areas[crossing]
+            counted = share > MIN_PARTIAL_SHARE
+            total += float((self.population[crossing[counted]] * share[counted]).sum())
+            count += float(share[counted].sum())
+            partial = int(counted.sum())
+        instrument.count('candidate_buildings', len(candidates))
+        instrument.count('boundary_buildings', len(near))
+        instrument.count('geos_predicates', predicates + len(crossing))
+        return total, count, len(inside), partial
+
+    def population_in_polygon_loop(self, polygon_geom, proportional=True):
+        """
+        То же, что population_in_polygon, по одному зданию без подготовки полигона.
+
+        Эталон для сравнения в benchmark: intersects, within и intersection
+        вызываются для каждого кандидата.
+        """
+        total = 0.0
+        count = 0.0
+        inside = 0
+        partial = 0
+        candidates = self.candidates(polygon_geom.boundingBox()).tolist()
+        for pos in candidates:
+            pop = self.population[pos]
+            if proportional and pop <= 0:
+                continue
+            building = self.geometries[pos]
+            if not building.intersects(polygon_geom):
+                continue
+            if not proportional:
+                total += pop
+                count += 1
+                inside += 1
+                continue
+            if building.within(polygon_geom):
+                total += pop
+                count += 1
+                inside += 1
+            else:
+                area = self.areas[pos]
+                if area <= 0:
+                    continue
+                part = building.intersection(polygon_geom)
+                if part and not part.isEmpty():
+                    share = part.area() / area
+                    if share > MIN_PARTIAL_SHARE:
+                        total += pop * share
+                        count += share
+                        partial += 1
+        return total, count, inside, partial
+
+
+def polygon_rings(polygon_geom):
+    """Кольца полигона или мультиполигона как массивы (M, 2) вершин."""
+    parts = polygon_geom.asMultiPolygon() if polygon_geom.isMultipart() else [polygon_geom.asPolygon()]
+    return [np.array([(p.x(), p.y()) for p in ring], dtype=np.float64).reshape(-1, 2)
+            for polygon in parts for ring in polygon]
+
+
+def invalidate(layer_id=None):
+    """Сбрасывает хранилища слоя (или все, если layer_id не задан)."""
+    for key in list(_STORES):
+        if layer_id is None or key[0] == layer_id:
+            del _STORES[key]
+
+
+def _watch(layer):
+    if layer.id() in _WATCHED:
+        return
+    layer_id = layer.id()
+    layer.dataChanged.connect(lambda: invalidate(layer_id))
+    layer.willBeDeleted.connect(lambda: invalidate(layer_id))
+    _WATCHED.add(layer_id)
+
+
+def get_store(layer, population_field, crs=None):
+    """
+    Хранилище зданий слоя, загруженное один раз за сессию.
+
+    crs — CRS, в которой нужны геометрии (по умолчанию CRS слоя).
+    """
+    target_crs = crs if crs is not None else layer.crs()
+    key = (layer.id(), population_field, target_crs.authid())
+    store = _STORES.get(key)
+    if store is None or store.feature_count != layer.featureCount():
+        store = BuildingStore(layer, population_field, target_crs)
+        _STORES[key] = store
+        _watch(layer)
+    return store
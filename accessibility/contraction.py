@@ -0,0 +1,303 @@
+"""
+Сжатие цепочек узлов степени 2 в графе улиц.
+
+Каждая вершина полилинии становится узлом графа, поэтому изогнутая улица —
+это длинная цепочка узлов с двумя соседями. Поиск по такому графу тратит
+извлечения из кучи на каждую вершину, хотя выбор пути есть только на
+развилках. Здесь цепочки заменяются одним ребром между развилками со
+стоимостью, равной сумме стоимостей звеньев.
+
+Промежуточные узлы не удаляются: их координаты остаются в node_xy, а
+ChainIndex хранит порядок узлов в цепочке и накопленную стоимость от её
+начала. После поиска по развилкам время каждого промежуточного узла
+восстанавливается как min(t(начало) + cum, t(конец) + total - cum) —
+SearchResult получается тем же, что и без сжатия, поэтому геометрия
+достигнутых рёбер и частичные рёбра на порогах строятся как прежде.
+
+Сжимаются только двусторонние звенья с одинаковой стоимостью в обе
+стороны (так строит EdgeListBuilder); концы односторонних рёбер и петель
+остаются развилками. Кратные записи одного звена схлопываются в одну с
+наименьшей стоимостью.
+"""
+import numpy as np
+
+from .snapping import csr_ranges
+
+
+class ChainIndex:
+    """
+    Цепочки промежуточных узлов сжатого графа.
+
+    node_chain[n] — номер цепочки промежуточного узла (-1 у развилок),
+    node_cum[n] — стоимость от начала цепочки до узла. Узлы цепочки c —
+    chain_nodes[chain_offsets[c]:chain_offsets[c + 1]] в порядке от
+    chain_src[c] к chain_dst[c]; chain_cost[c] — стоимость всей цепочки.
+    stats — (узлов, записей рёбер) до и после сжатия.
+    """
+
+    def __init__(self, node_chain, node_cum, chain_src, chain_dst, chain_cost,
+                 chain_offsets, chain_nodes, stats):
+        self.node_chain = node_chain
+        self.node_cum = node_cum
+        self.chain_src = chain_src
+        self.chain_dst = chain_dst
+        self.chain_cost = chain_cost
+        self.chain_offsets = chain_offsets
+        self.chain_nodes = chain_nodes
+        self.stats = stats
+
+        # Цепочки, примыкающие к каждой развилке (петля — дважды)
+        ends = np.concatenate((chain_src, chain_dst)).astype(np.int64)
+        ids = np.concatenate((np.arange(len(chain_src)),) * 2)
+        self.junction_chains = ids[np.argsort(ends, kind='stable')]
+        self.junction_offsets = np.zeros(len(node_chain) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(ends, minlength=len(node_chain)), out=self.junction_offsets[1:])
+
+    @property
+    def num_chains(self):
+        return len(self.chain_src)
+
+    def summary(self):
+        """Словарь nodes_before, edges_before, nodes_after, edges_after (рёбра — неориентированные записи)."""
+        return dict(zip(('nodes_before', 'edges_before', 'nodes_after', 'edges_after'),
+                        (int(v) for v in self.stats)))
+
+    def nbytes(self):
+        return int(sum(a.nbytes for a in (self.node_chain, self.node_cum, self.chain_src, self.chain_dst,
+                                          self.chain_cost, self.chain_offsets, self.chain_nodes)))
+
+    def map_sources(self, sources):
+        """
+        Старты на промежуточных узлах переносятся на концы их цепочек.
+
+        Returns:
+        --------
+        tuple: (пары (развилка, стоимость) для поиска, тройки (цепочка, cum, стоимость) стартов на цепочках)
+        """
+        mapped, on_chains = [], []
+        for node, cost in sources:
+            chain = int(self.node_chain[node])
+            if chain < 0:
+                mapped.append((node, cost))
+                continue
+            cum = float(self.node_cum[node])
+            mapped.append((int(self.chain_src[chain]), cost + cum))
+            mapped.append((int(self.chain_dst[chain]), cost + float(self.chain_cost[chain]) - cum))
+            on_chains.append((chain, cum, cost))
+        return mapped, on_chains
+
+    def expand(self, nodes, times, limit, on_chains=()):
+        """
+        Добавляет к развилкам результата поиска промежуточные узлы в пределах limit.
+
+        Returns:
+        --------
+        tuple: (nodes, times) в порядке неубывания времени
+        """
+        starts = self.junction_offsets[nodes]
+        chains = self.junction_chains[csr_ranges(starts, self.junction_offsets[nodes + 1] - starts)]
+        if on_chains:
+            chains = np.concatenate((chains, [c for c, _, _ in on_chains]))
+        chains = np.unique(chains)
+        if len(chains) == 0:
+            return nodes, times
+
+        # Время концов цепочек — по отсортированным развилкам результата
+        order = np.argsort(nodes, kind='stable')
+        sorted_nodes, sorted_times = nodes[order], times[order]
+
+        def time_at(query):
+            pos = np.minimum(np.searchsorted(sorted_nodes, query), max(len(sorted_nodes) - 1, 0))
+            if len(sorted_nodes) == 0:
+                return np.full(len(query), np.inf)
+            return np.where(sorted_nodes[pos] == query, sorted_times[pos], np.inf)
+
+        begin = self.chain_offsets[chains]
+        counts = self.chain_offsets[chains + 1] - begin
+        inner = self.chain_nodes[csr_ranges(begin, counts)]
+        cum = self.node_cum[inner]
+        t = np.minimum(np.repeat(time_at(self.chain_src[chains]), counts) + cum,
+                       np.repeat(time_at(self.chain_dst[chains]), counts)
+                       + np.repeat(self.chain_cost[chains], counts) - cum)
+
+        # Старт на цепочке: соседние узлы той же цепочки — напрямую по ней
+        if on_chains:
+            cand_nodes, cand_times = [inner], [t]
+            for chain, cum0, cost0 in on_chains:
+                own = self.chain_nodes[self.chain_offsets[chain]:self.chain_offsets[chain + 1]]
+                cand_nodes.append(own)
+                cand_times.append(cost0 + np.abs(self.node_cum[own] - cum0))
+            inner, t = np.concatenate(cand_nodes), np.concatenate(cand_times)
+            by_node = np.lexsort((t, inner))
+            inner, t = inner[by_node], t[by_node]
+            first = np.ones(len(inner), dtype=bool)
+            first[1:] = inner[1:] != inner[:-1]
+            inner, t = inner[first], t[first]
+
+        keep = t <= limit
+        all_nodes = np.concatenate((nodes, inner[keep])).astype(np.int32)
+        all_times = np.concatenate((times, t[keep]))
+        by_time = np.argsort(all_times, kind='stable')
+        return all_nodes[by_time], all_times[by_time]
+
+    def links(self):
+        """
+        Исходные звенья цепочек: начало → промежуточные узлы → конец.
+
+        Returns:
+        --------
+        tuple: (a, b, cost) — массивы одной длины
+        """
+        num = self.num_chains
+        if num == 0:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64), np.zeros(0)
+        # Последовательность узлов цепочки c — seq[seq_off[c]:seq_off[c + 1]], с концами
+        seq_off = self.chain_offsets + 2 * np.arange(num + 1)
+        nodes = np.empty(seq_off[-1], dtype=np.int64)
+        cum = np.empty(seq_off[-1], dtype=np.float64)
+        last = seq_off[1:] - 1
+        nodes[seq_off[:-1]] = self.chain_src
+        cum[seq_off[:-1]] = 0.0
+        nodes[last] = self.chain_dst
+        cum[last] = self.chain_cost
+        inner = np.arange(len(self.chain_nodes)) + 2 * np.repeat(np.arange(num), np.diff(self.chain_offsets)) + 1
+        nodes[inner] = self.chain_nodes
+        cum[inner] = self.node_cum[self.chain_nodes]
+        step = np.ones(len(nodes) - 1, dtype=bool)
+        step[last[:-1]] = False  # переход к следующей цепочке
+        j = np.flatnonzero(step)
+        return nodes[j], nodes[j + 1], cum[j + 1] - cum[j]
+
+    def to_arrays(self):
+        return {
+            'chain_node': self.node_chain,
+            'chain_node_cum': self.node_cum,
+            'chain_src': self.chain_src,
+            'chain_dst': self.chain_dst,
+            'chain_cost': self.chain_cost,
+            'chain_offsets': self.chain_offsets,
+            'chain_nodes': self.chain_nodes,
+            'chain_stats': self.stats,
+        }
+
+    @classmethod
+    def from_arrays(cls, arrays):
+        return cls(arrays['chain_node'], arrays['chain_node_cum'], arrays['chain_src'], arrays['chain_dst'],
+                   arrays['chain_cost'], arrays['chain_offsets'], arrays['chain_nodes'], arrays['chain_stats'])
+
+
+def contract_records(num_nodes, src, dst, cost, both_ways=None):
+    """
+    Сжимает цепочки степени 2 в записях рёбер.
+
+    Parameters:
+    -----------
+    num_nodes : int
+        Число узлов (id узлов — 0..num_nodes-1)
+    src, dst, cost : array
+        Записи рёбер (как EdgeListBuilder.records)
+    both_ways : array of bool
+        Двусторонние записи (по умолчанию все)
+
+    Returns:
+    --------
+    tuple: (ChainIndex, edge_src, edge_dst, edge_cost) — ориентированные рёбра сжатого графа
+    """
+    src = np.asarray(src, dtype=np.int64)
+    dst = np.asarray(dst, dtype=np.int64)
+    cost = np.asarray(cost, dtype=np.float64)
+    both = np.ones(len(src), dtype=bool) if both_ways is None else np.asarray(both_ways, dtype=bool)
+    records_before = len(src)
+
+    # Кратные записи: у двусторонних направление не важно, остаётся самая дешёвая
+    a = np.where(both, np.minimum(src, dst), src)
+    b = np.where(both, np.maximum(src, dst), dst)
+    order = np.lexsort((cost, both, b, a))
+    a, b, both, cost = a[order], b[order], both[order], cost[order]
+    first = np.ones(len(a), dtype=bool)
+    first[1:] = (a[1:] != a[:-1]) | (b[1:] != b[:-1]) | (both[1:] != both[:-1])
+    a, b, both, cost = a[first], b[first], both[first], cost[first]
+
+    # Промежуточный узел — ровно два двусторонних звена и ни одного одностороннего или петли
+    links = both & (a != b)
+    degree = np.bincount(a[links], minlength=num_nodes) + np.bincount(b[links], minlength=num_nodes)
+    junction = degree != 2
+    junction[a[~links]] = True
+    junction[b[~links]] = True
+
+    la, lb, lcost = a[links], b[links], cost[links]
+    ends = np.concatenate((la, lb))
+    inc_rec = np.concatenate((np.arange(len(la)),) * 2)[np.argsort(ends, kind='stable')]
+    inc_off = np.zeros(num_nodes + 1, dtype=np.int64)
+    np.cumsum(np.bincount(ends, minlength=num_nodes), out=inc_off[1:])
+
+    # Звенья между двумя развилками остаются рёбрами как есть
+    direct = junction[la] & junction[lb]
+    visited = direct.copy()
+
+    la_l, lb_l, lcost_l = la.tolist(), lb.tolist(), lcost.tolist()
+    inc_rec_l, inc_off_l = inc_rec.tolist(), inc_off.tolist()
+    junction_l = junction.tolist()
+    visited_l = visited.tolist()
+    node_chain = np.full(num_nodes, -1, dtype=np.int32)
+    node_cum = np.zeros(num_nodes, dtype=np.float64)
+    chain_src, chain_dst, chain_cost = [], [], []
+    chain_nodes, chain_cum, chain_offsets = [], [], [0]
+
+    def walk(start, rec):
+        prev_rec, cur = rec, (lb_l[rec] if la_l[rec] == start else la_l[rec])
+        total = lcost_l[rec]
+        visited_l[rec] = True
+        cid = len(chain_src)
+        while not junction_l[cur]:
+            chain_nodes.append(cur)
+            chain_cum.append(total)
+            r0, r1 = inc_rec_l[inc_off_l[cur]], inc_rec_l[inc_off_l[cur] + 1]
+            nxt_rec = r1 if r0 == prev_rec else r0
+            visited_l[nxt_rec] = True
+            total += lcost_l[nxt_rec]
+            cur = lb_l[nxt_rec] if la_l[nxt_rec] == cur else la_l[nxt_rec]
+            prev_rec = nxt_rec
+        chain_src.append(start)
+        chain_dst.append(cur)
+        chain_cost.append(total)
+        chain_offsets.append(len(chain_nodes))
+        return cid
+
+    for rec in range(len(la_l)):
+        if visited_l[rec]:
+            continue
+        if junction_l[la_l[rec]]:
+            walk(la_l[rec], rec)
+        elif junction_l[lb_l[rec]]:
+            walk(lb_l[rec], rec)
+    # Оставшиеся звенья — замкнутые кольца без развилок: один узел кольца становится развилкой
+    for rec in range(len(la_l)):
+        if not visited_l[rec]:
+            junction_l[la_l[rec]] = True
+            walk(la_l[rec], rec)
+
+    chain_src = np.array(chain_src, dtype=np.int32)
+    chain_dst = np.array(chain_dst, dtype=np.int32)
+    chain_cost = np.array(chain_cost, dtype=np.float64)
+    chain_offsets = np.array(chain_offsets, dtype=np.int64)
+    chain_nodes = np.array(chain_nodes, dtype=np.int32)
+    node_chain[chain_nodes] = np.repeat(np.arange(len(chain_src), dtype=np.int32), np.diff(chain_offsets))
+    node_cum[chain_nodes] = np.array(chain_cum, dtype=np.float64)
+
+    # Рёбра сжатого графа: прямые звенья, цепочки (кроме петель) и односторонние записи как были;
+    # двусторонние петли в поиске ничего не дают
+    open_chains = chain_src != chain_dst
+    und_src = np.concatenate((la[direct], chain_src[open_chains]))
+    und_dst = np.concatenate((lb[direct], chain_dst[open_chains]))
+    und_cost = np.concatenate((lcost[direct], chain_cost[open_chains]))
+    keep_one_way = ~both
+    edge_src = np.concatenate((und_src, und_dst, a[keep_one_way])).astype(np.int32)
+    edge_dst = np.concatenate((und_dst, und_src, b[keep_one_way])).astype(np.int32)
+    edge_cost = np.concatenate((und_cost, und_cost, cost[keep_one_way]))
+
+    num_junctions = int(np.count_nonzero(junction_l))
+    stats = np.array([num_nodes, records_before, num_junctions, len(und_src) + int(keep_one_way.sum())],
+                     dtype=np.int64)
+    index = ChainIndex(node_chain, node_cum, chain_src, chain_dst, chain_cost, chain_offsets, chain_nodes, stats)
+    return index, edge_src, edge_dst, edge_cost
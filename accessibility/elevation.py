@@ -0,0 +1,153 @@
+"""
+Сетка высот для учёта рельефа в пешеходном графе.
+
+Сетка строится один раз: растеризацией полигонов SRTM (значение MAX/VALUE)
+или чтением растровой ЦМР. Высоты узлов графа затем берутся из сетки
+одним векторизованным запросом.
+"""
+import math
+
+import numpy as np
+
+DEFAULT_CELL_SIZE = 30.0     # м, шаг SRTM
+MAX_GRID_CELLS = 25_000_000  # ограничение размера сетки (~100 МБ float32)
+
+
+class ElevationGrid:
+    """Регулярная сетка высот; строка 0 — верхний край (y_top), NaN — нет данных."""
+
+    def __init__(self, values, x0, y_top, cell_w, cell_h=None):
+        self.values = values
+        self.x0 = float(x0)
+        self.y_top = float(y_top)
+        self.cell_w = float(cell_w)
+        self.cell_h = float(cell_h if cell_h is not None else cell_w)
+
+    @property
+    def shape(self):
+        return self.values.shape
+
+    def sample(self, xs, ys):
+        """Высоты в точках (массивы xs, ys); вне сетки и без данных — NaN."""
+        xs = np.asarray(xs, dtype=np.float64)
+        ys = np.asarray(ys, dtype=np.float64)
+        rows, cols = self.values.shape
+        col = np.floor((xs - self.x0) / self.cell_w).astype(np.int64)
+        row = np.floor((self.y_top - ys) / self.cell_h).astype(np.int64)
+        inside = (col >= 0) & (col < cols) & (row >= 0) & (row < rows)
+        out = np.full(xs.shape, np.nan, dtype=np.float64)
+        out[inside] = self.values[row[inside], col[inside]]
+        return out
+
+    @classmethod
+    def rasterize_polygons(cls, polygons, extent, cell_size=DEFAULT_CELL_SIZE):
+        """
+        Растеризует полигоны высот (правило чёт-нечет, центр ячейки).
+
+        Parameters:
+        -----------
+        polygons : iterable
+            Пары (rings, height), rings — список массивов (K, 2) колец полигона
+        extent : tuple
+            (xmin, ymin, xmax, ymax) области сетки
+        cell_size : float
+            Размер ячейки в единицах CRS; увеличивается, если сетка выходит за MAX_GRID_CELLS
+        """
+        xmin, ymin, xmax, ymax = extent
+        width = max(xmax - xmin, cell_size)
+        height = max(ymax - ymin, cell_size)
+        if (width / cell_size) * (height / cell_size) > MAX_GRID_CELLS:
+            cell_size = math.sqrt(width * height / MAX_GRID_CELLS)
+        nx = int(math.ceil(width / cell_size))
+        ny = int(math.ceil(height / cell_size))
+        values = np.full((ny, nx), np.nan, dtype=np.float32)
+        grid = cls(values, xmin, ymax, cell_size)
+        for rings, h in polygons:
+            grid._fill_polygon(rings, h)
+        return grid
+
+    def _fill_polygon(self, rings, value, max_block=2_000_000):
+        rings = [np.asarray(r, dtype=np.float64) for r in rings if len(r) >= 3]
+        if not rings:
+            return
+        rows, cols = self.values.shape
+        pts = np.concatenate(rings)
+        c0 = max(0, int(math.floor((pts[:, 0].min() - self.x0) / self.cell_w)))
+        c1 = min(cols - 1, int(math.floor((pts[:, 0].max() - self.x0) / self.cell_w)))
+        r0 = max(0, int(math.floor((self.y_top - pts[:, 1].max()) / self.cell_h)))
+        r1 = min(rows - 1, int(math.floor((self.y_top - pts[:, 1].min()) / self.cell_h)))
+        if c0 > c1 or r0 > r1:
+            return
+
+        # Рёбра всех колец (кольцо замыкается, если оно не замкнуто)
+        starts, ends = [], []
+        for r in rings:
+            closed = r if np.array_equal(r[0], r[-1]) else np.vstack((r, r[:1]))
+            starts.append(closed[:-1])
+            ends.append(closed[1:])
+        a = np.concatenate(starts)
+        b = np.concatenate(ends)
+        dy = b[:, 1] - a[:, 1]
+        keep = dy != 0  # горизонтальные рёбра не пересекают строку центров
+        a, b, dy = a[keep], b[keep], dy[keep]
+        if len(a) == 0:
+            return
+        slope = (b[:, 0] - a[:, 0]) / dy
+
+        step = max(1, max_block // len(a))
+        for block_start in range(r0, r1 + 1, step):
+            row_ids = np.arange(block_start, min(r1 + 1, block_start + step))
+            yc = self.y_top - (row_ids + 0.5) * self.cell_h
+            cross = (a[None, :, 1] <= yc[:, None]) != (b[None, :, 1] <= yc[:, None])
+            xint = a[None, :, 0] + (yc[:, None] - a[None, :, 1]) * slope[None, :]
+            for k, row in enumerate(row_ids):
+                xs = np.sort(xint[k][cross[k]])
+                for xa, xb in zip(xs[0::2], xs[1::2]):
+                    ca = max(c0, int(math.ceil((xa - self.x0) / self.cell_w - 0.5)))
+                    cb = min(c1, int(math.floor((xb - self.x0) / self.cell_w - 0.5)))
+                    if ca <= cb:
+                        self.values[row, ca:cb + 1] = value
+
+    @classmethod
+    def from_raster_file(cls, path, band=1):
+        """Читает ЦМР (GeoTIFF и др.) через GDAL; поддерживаются растры без поворота."""
+        from osgeo import gdal
+
+        ds = gdal.Open(path)
+        if ds is None:
+            raise Exception(f"Не удалось открыть растр высот: {path}")
+        gt = ds.GetGeoTransform()
+        if gt[2] != 0 or gt[4] != 0:
+            raise Exception("Повёрнутые растры высот не поддерживаются")
+        rb = ds.GetRasterBand(band)
+        values = rb.ReadAsArray().astype(np.float32)
+        nodata = rb.GetNoDataValue()
+        if nodata is not None:
+            values[values == nodata] = np.nan
+        return cls(values, gt[0], gt[3], gt[1], abs(gt[5]))
+
+
+def tobler_speed_mps(slope):
+    """Скорость по формуле Tobler (км/ч → м/с) с ограничением 0.5–8 км/ч; slope = dh/dx."""
+    v_kmh = 6.0 * np.exp(-3.5 * np.abs(np.asarray(slope, dtype=np.float64) + 0.05))
+    return np.clip(v_kmh, 0.5, 8.0) * 1000.0 / 3600.0
+
+
+def slope_adjusted_costs(length, flat_cost, h_from, h_to, min_speed_mps=0.3):
+    """
+    Время прохождения рёбер с учётом уклона.
+
+    Базовая скорость ребра (length / flat_cost) умножается на отношение
+    скорости Tobler на уклоне к скорости Tobler на ровном месте.
+    Рёбра без высоты на одном из концов сохраняют flat_cost.
+    """
+    length = np.asarray(length, dtype=np.float64)
+    flat_cost = np.asarray(flat_cost, dtype=np.float64)
+    base_speed = length / flat_cost
+    with np.errstate(invalid='ignore', divide='ignore'):
+        slope = (h_to - h_from) / length
+        factor = tobler_speed_mps(slope) / tobler_speed_mps(0.0)
+        speed = np.maximum(min_speed_mps, base_speed * factor)
+        cost = length / speed
+    known = ~(np.isnan(h_from) | np.isnan(h_to))
+    return np.where(known, cost, flat_cost)
@@ -0,0 +1,74 @@
+"""
+Окно загрузки дорог вокруг старта.
+
+Дальше speed × max_time от старта ничего не достижимо, поэтому для
+одиночного расчёта из слоя читаются только объекты, пересекающие квадрат
+с этим радиусом (QgsFeatureRequest.setFilterRect), и граф строится по
+малой доле сети. Кратчайший путь к любой точке внутри радиуса целиком
+лежит в круге этого радиуса, значит, все его объекты в окно попадают —
+результат совпадает с расчётом по всему слою.
+
+Радиус берётся с запасом: на спуске скорость по Tobler выше ровной в
+SLOPE_SPEED_FACTOR раз, с ОТ — по наибольшей скорости, с которой
+считаются перегоны (треки, TRAVELTIME, BUS_SPEED), плюс допуск привязки
+старта к графу.
+"""
+from .elevation import tobler_speed_mps
+
+SLOPE_SPEED_FACTOR = float(tobler_speed_mps(-0.05) / tobler_speed_mps(0.0))  # ≈1.19, максимум Tobler
+DEFAULT_SNAP_MARGIN = 500.0  # м, как допуск привязки старта в Task4
+
+
+def reach_radius(speed_kmh, max_minutes, slope=False, pt_speed_kmh=None, margin=DEFAULT_SNAP_MARGIN):
+    """
+    Радиус (м), дальше которого от старта за max_minutes не добраться.
+
+    Parameters:
+    -----------
+    speed_kmh : float
+        Наибольшая скорость по сети (пешком или на автомобиле)
+    slope : bool
+        Стоимости рёбер с учётом уклона (скорость на спуске выше)
+    pt_speed_kmh : float
+        Если задана — наибольшая скорость перегонов ОТ
+    margin : float
+        Запас на привязку старта, м
+    """
+    speed = speed_kmh * (SLOPE_SPEED_FACTOR if slope else 1.0)
+    if pt_speed_kmh:
+        speed = max(speed, pt_speed_kmh)
+    return speed / 3.6 * max_minutes * 60.0 + margin
+
+
+def distance_window(x, y, radius):
+    """Окно (xmin, ymin, xmax, ymax) вокруг точки, округлённое до метра — годится в ключ кэша."""
+    return (round(x - radius), round(y - radius), round(x + radius), round(y + radius))
+
+
+def clip_extent(extent, window):
+    """Пересечение экстента (xmin, ymin, xmax, ymax) с окном; None — окна нет."""
+    if window is None:
+        return tuple(extent)
+    return (max(extent[0], window[0]), max(extent[1], window[1]),
+            min(extent[2], window[2]), min(extent[3], window[3]))
+
+
+def window_request(window):
+    """QgsFeatureRequest объектов, пересекающих окно (None — весь слой)."""
+    from qgis.core import QgsFeatureRequest, QgsRectangle
+    request = QgsFeatureRequest()
+    if window is not None:
+        request.setFilterRect(QgsRectangle(*window))
+    return request
+
+
+def layer_in_window(layer, window):
+    """
+    Memory-слой с объектами слоя, пересекающими окно (без окна — сам слой).
+
+    Объекты читаются через фильтр по прямоугольнику, так что провайдер
+    с пространственным индексом (GeoPackage, PostGIS) отдаёт только их.
+    """
+    if window is None:
+        return layer
+    return layer.materialize(window_request(window))
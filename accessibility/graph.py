@@ -0,0 +1,198 @@
+"""
+Компактное представление графа в формате CSR (compressed sparse row).
+
+Узлы — целые числа 0..N-1, координаты в массиве node_xy (N, 2).
+Исходящие рёбра узла u: targets[offsets[u]:offsets[u + 1]]
+со стоимостями weights[...] (секунды пути).
+
+Граф может быть сжат (см. contraction): рёбра есть только у развилок,
+промежуточные узлы цепочек описывает graph.chains, и bounded_search
+восстанавливает их времена сам.
+"""
+from array import array
+
+import numpy as np
+
+from .contraction import ChainIndex, contract_records
+
+
+class WalkGraph:
+    """Ориентированный граф на массивах numpy (двусторонние улицы — два ребра)."""
+
+    def __init__(self, node_xy, offsets, targets, weights, chains=None):
+        self.node_xy = node_xy
+        self.offsets = offsets
+        self.targets = targets
+        self.weights = weights
+        self.chains = chains  # ChainIndex сжатого графа или None
+
+    @classmethod
+    def from_edges(cls, node_xy, edge_src, edge_dst, edge_cost, chains=None):
+        """Собирает CSR из списка рёбер (src, dst, cost)."""
+        node_xy = np.asarray(node_xy, dtype=np.float64).reshape(-1, 2)
+        edge_src = np.asarray(edge_src, dtype=np.int32)
+        edge_dst = np.asarray(edge_dst, dtype=np.int32)
+        edge_cost = np.asarray(edge_cost, dtype=np.float64)
+        n = len(node_xy)
+        order = np.argsort(edge_src, kind='stable')
+        counts = np.bincount(edge_src, minlength=n)
+        offsets = np.zeros(n + 1, dtype=np.int64)
+        np.cumsum(counts, out=offsets[1:])
+        return cls(node_xy, offsets, edge_dst[order], edge_cost[order], chains)
+
+    @property
+    def num_nodes(self):
+        return len(self.node_xy)
+
+    @property
+    def num_edges(self):
+        return len(self.targets)
+
+    def degree(self):
+        """Число исходящих рёбер каждого узла."""
+        return np.diff(self.offsets)
+
+    def neighbors(self, u):
+        """Пары (v, cost) исходящих рёбер узла u."""
+        a, b = self.offsets[u], self.offsets[u + 1]
+        return zip(self.targets[a:b].tolist(), self.weights[a:b].tolist())
+
+    def edge_sources(self):
+        """Массив начальных узлов рёбер (в порядке targets)."""
+        return np.repeat(np.arange(self.num_nodes, dtype=np.int32), self.degree())
+
+    def links(self):
+        """
+        Исходные звенья графа без направления (u < v), у сжатого — с раскрытыми цепочками.
+
+        Из кратных звеньев остаётся самое дешёвое; стоимость — в единицах весов.
+
+        Returns:
+        --------
+        tuple: (u, v, cost) — массивы одной длины
+        """
+        src = self.edge_sources().astype(np.int64)
+        dst = np.asarray(self.targets, dtype=np.int64)
+        lo, hi = np.minimum(src, dst), np.maximum(src, dst)
+        cost = np.asarray(self.weights, dtype=np.float64)
+        order = np.lexsort((cost, hi, lo))
+        lo, hi, cost = lo[order], hi[order], cost[order]
+        first = np.ones(len(lo), dtype=bool)
+        first[1:] = (lo[1:] != lo[:-1]) | (hi[1:] != hi[:-1])
+        lo, hi, cost = lo[first], hi[first], cost[first]
+        if self.chains is None:
+            return lo, hi, cost
+
+        # Рёбра-цепочки между развилками заменяются звеньями цепочек
+        chains = self.chains
+        rows = np.concatenate((
+            np.column_stack((lo, hi, cost)),
+            np.column_stack((np.minimum(chains.chain_src, chains.chain_dst),
+                             np.maximum(chains.chain_src, chains.chain_dst), chains.chain_cost)),
+        ))
+        inverse = np.unique(rows, axis=0, return_inverse=True)[1].ravel()
+        plain = ~np.isin(inverse[:len(lo)], inverse[len(lo):])
+        a, b, link_cost = chains.links()
+        return (np.concatenate((lo[plain], np.minimum(a, b))), np.concatenate((hi[plain], np.maximum(a, b))),
+                np.concatenate((cost[plain], link_cost)))
+
+    def nbytes(self):
+        """Память под массивы графа, байт."""
+        chains = self.chains.nbytes() if self.chains is not None else 0
+        return int(self.node_xy.nbytes + self.offsets.nbytes + self.targets.nbytes + self.weights.nbytes + chains)
+
+    def to_arrays(self):
+        """Массивы для сохранения в кэш графа."""
+        arrays = {
+            'node_xy': self.node_xy,
+            'csr_offsets': self.offsets,
+            'csr_targets': self.targets,
+            'csr_weights': self.weights,
+        }
+        if self.chains is not None:
+            arrays.update(self.chains.to_arrays())
+        return arrays
+
+    @classmethod
+    def from_arrays(cls, arrays):
+        chains = ChainIndex.from_arrays(arrays) if 'chain_src' in arrays else None
+        return cls(arrays['node_xy'], arrays['csr_offsets'], arrays['csr_targets'], arrays['csr_weights'], chains)
+
+
+class EdgeListBuilder:
+    """
+    Накопитель узлов и рёбер при построении графа из геометрий.
+
+    Узлы склеиваются по координатам, округлённым до precision знаков
+    (для метровых CRS — до миллиметра), и получают последовательные id.
+    Ребро хранится одной записью (с флагом двустороннего движения)
+    и длиной — по ней можно пересчитать стоимости до сборки CSR.
+    """
+
+    def __init__(self, precision=3):
+        self.precision = precision
+        self.node_ids = {}
+        self.xs = array('d')
+        self.ys = array('d')
+        self.src = array('i')
+        self.dst = array('i')
+        self.cost = array('d')
+        self.length = array('d')
+        self.both_ways = array('b')
+
+    @property
+    def num_nodes(self):
+        return len(self.xs)
+
+    @property
+    def num_records(self):
+        return len(self.src)
+
+    def node(self, x, y):
+        """id узла в точке (x, y); новый узел создаётся при первом обращении."""
+        key = (round(x, self.precision), round(y, self.precision))
+        nid = self.node_ids.get(key)
+        if nid is None:
+            nid = len(self.xs)
+            self.node_ids[key] = nid
+            self.xs.append(x)
+            self.ys.append(y)
+        return nid
+
+    def add_edge(self, u, v, cost, length=0.0, both_ways=True):
+        self.src.append(u)
+        self.dst.append(v)
+        self.cost.append(cost)
+        self.length.append(length)
+        self.both_ways.append(1 if both_ways else 0)
+
+    def node_xy(self):
+        return np.column_stack((np.frombuffer(self.xs, dtype=np.float64),
+                                np.frombuffer(self.ys, dtype=np.float64)))
+
+    def records(self):
+        """Массивы (src, dst, cost, length) по записям рёбер."""
+        return (np.frombuffer(self.src, dtype=np.int32),
+                np.frombuffer(self.dst, dtype=np.int32),
+                np.frombuffer(self.cost, dtype=np.float64),
+                np.frombuffer(self.length, dtype=np.float64))
+
+    def build(self, cost=None, contract=False):
+        """
+        Итоговый WalkGraph; двусторонние записи разворачиваются в два ребра.
+
+        cost — необязательный массив стоимостей по записям (например, с учётом
+        уклона), заменяющий накопленные. contract — сжать цепочки узлов
+        степени 2 (см. contraction).
+        """
+        src, dst, rec_cost, _ = self.records()
+        if cost is not None:
+            rec_cost = np.asarray(cost, dtype=np.float64)
+        both = np.frombuffer(self.both_ways, dtype=np.int8).astype(bool)
+        if contract:
+            chains, edge_src, edge_dst, edge_cost = contract_records(self.num_nodes, src, dst, rec_cost, both)
+            return WalkGraph.from_edges(self.node_xy(), edge_src, edge_dst, edge_cost, chains)
+        return WalkGraph.from_edges(self.node_xy(),
+                                    np.concatenate((src, dst[both])),
+                                    np.concatenate((dst, src[both])),
+                                    np.concatenate((rec_cost, rec_cost[both])))
@@ -0,0 +1,176 @@
+"""
+Дисковый кэш скомпилированного пешеходного графа.
+
+Артефакт — каталог <кэш>/<отпечаток>/ с файлами *.npy (узлы, рёбра,
+стоимости, индекс узлов) и meta.json. Отпечаток собирается из отпечатков
+входных слоёв и параметров построения: при изменении любого из них
+граф строится заново под новым ключом.
+"""
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import time
+
+import numpy as np
+
+CACHE_VERSION = 3
+
+DEFAULT_CACHE_DIR = os.path.join(os.path.expanduser('~'), '.cache', 'accessibility_graphs')
+
+
+def cache_root():
+    """Каталог кэша (переопределяется переменной ACCESSIBILITY_CACHE_DIR)."""
+    return os.environ.get('ACCESSIBILITY_CACHE_DIR') or DEFAULT_CACHE_DIR
+
+
+def _file_stamp(path):
+    parts = []
+    for p in (path, path + '-wal'):
+        if os.path.isfile(p):
+            st = os.stat(p)
+            parts.append(f"{p}:{st.st_size}:{st.st_mtime_ns}")
+    return parts
+
+
+def layer_fingerprint(layer):
+    """
+    Отпечаток слоя QGIS.
+
+    Для файловых источников берутся путь, размер и время изменения файла;
+    для memory-слоёв и слоёв с несохранёнными правками — хэш геометрий и атрибутов.
+    """
+    if layer is None:
+        return 'none'
+    h = hashlib.sha1()
+    extent = layer.extent()
+    header = [
+        layer.providerType(),
+        layer.source(),
+        layer.crs().authid(),
+        layer.subsetString(),
+        str(layer.featureCount()),
+        f"{extent.xMinimum():.3f},{extent.yMinimum():.3f},{extent.xMaximum():.3f},{extent.yMaximum():.3f}",
+    ]
+    h.update('|'.join(header).encode('utf-8'))
+
+    path = layer.source().split('|')[0]
+    stamps = _file_stamp(path)
+    if stamps and not layer.isModified():
+        h.update('|'.join(stamps).encode('utf-8'))
+    else:
+        for f in layer.getFeatures():
+            geom = f.geometry()
+            if geom and not geom.isEmpty():
+                h.update(bytes(geom.asWkb()))
+            h.update(repr(f.attributes()).encode('utf-8'))
+    return h.hexdigest()
+
+
+def graph_fingerprint(**parts):
+    """Ключ кэша из отпечатков слоёв и параметров построения графа."""
+    parts = dict(parts, cache_version=CACHE_VERSION)
+    payload = json.dumps(parts, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha1(payload.encode('utf-8')).hexdigest()
+
+
+def artifact_path(key, root=None):
+    return os.path.join(root or cache_root(), key)
+
+
+def save_graph(key, arrays, meta=None, root=None):
+    """
+    Атомарно записывает артефакт графа.
+
+    Готовый артефакт с тем же ключом не перезаписывается; повреждённый
+    заменяется новым каталогом одной операцией переименования.
+
+    Parameters:
+    -----------
+    key : str
+        Отпечаток (graph_fingerprint)
+    arrays : dict
+        Имя → numpy-массив
+    meta : dict
+        Дополнительные сведения (счётчики, параметры построения)
+
+    Returns:
+    --------
+    str: путь к каталогу артефакта
+    """
+    root = root or cache_root()
+    os.makedirs(root, exist_ok=True)
+    target = artifact_path(key, root)
+    if _is_complete(target):
+        # Содержимое определяется ключом, а читатели (процессы пакетного режима,
+        # другие сессии QGIS) могут держать файлы артефакта открытыми через mmap
+        return target
+    tmp_dir = tempfile.mkdtemp(prefix=f".{key}.", dir=root)
+    try:
+        for name, arr in arrays.items():
+            np.save(os.path.join(tmp_dir, f"{name}.npy"), np.ascontiguousarray(arr))
+        info = dict(meta or {})
+        info.update({
+            'key': key,
+            'version': CACHE_VERSION,
+            'created': time.strftime('%Y-%m-%d %H:%M:%S'),
+            'arrays': sorted(arrays.keys()),
+        })
+        with open(os.path.join(tmp_dir, 'meta.json'), 'w', encoding='utf-8') as fh:
+            json.dump(info, fh, ensure_ascii=False, indent=2)
+        stale = None
+        if os.path.isdir(target):
+            # Повреждённый или старый артефакт одним переименованием уходит в сторону
+            # и удаляется уже после подмены: каталог по ключу никогда не бывает полуудалённым
+            stale = f"{tmp_dir}.stale"
+            os.replace(target, stale)
+        try:
+            os.replace(tmp_dir, target)
+        except OSError:
+            if not _is_complete(target):
+                raise
+            shutil.rmtree(tmp_dir, ignore_errors=True)  # тот же артефакт успел записать другой процесс
+        if stale is not None:
+            shutil.rmtree(stale, ignore_errors=True)
+    except Exception:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        raise
+    return target
+
+
+def _is_complete(target):
+    """Артефакт текущей версии со всеми массивами из meta.json."""
+    try:
+        with open(os.path.join(target, 'meta.json'), encoding='utf-8') as fh:
+            meta = json.load(fh)
+        return (meta.get('version') == CACHE_VERSION
+                and all(os.path.isfile(os.path.join(target, f"{name}.npy")) for name in meta['arrays']))
+    except (OSError, ValueError, KeyError, TypeError):
+        return False
+
+
+def load_graph(key, root=None, mmap=False):
+    """
+    Загружает артефакт графа.
+
+    Returns:
+    --------
+    tuple: (arrays, meta) или None, если артефакта нет или он повреждён
+    """
+    target = artifact_path(key, root)
+    meta_path = os.path.join(target, 'meta.json')
+    if not os.path.isfile(meta_path):
+        return None
+    try:
+        with open(meta_path, encoding='utf-8') as fh:
+            meta = json.load(fh)
+        if meta.get('version') != CACHE_VERSION:
+            return None
+        arrays = {}
+        for name in meta['arrays']:
+            arrays[name] = np.load(os.path.join(target, f"{name}.npy"),
+                                   mmap_mode='r' if mmap else None)
+    except (OSError, ValueError, KeyError):
+        return None
+    return arrays, meta
@@ -0,0 +1,389 @@
+"""
+Запуск расчётов без QGIS Desktop (без iface и открытого проекта).
+
+    python -m accessibility.headless service-area --roads roads.gpkg \\
+        --origin 104.261370,52.262468 --origin-crs EPSG:4326 \\
+        --buildings buildings.gpkg --population-field Насел --out car.gpkg
+
+    python -m accessibility.headless transit --roads walk.gpkg --stops stops.gpkg \\
+        --routes routes.gpkg --buildings buildings.gpkg --origin 500,500 --out pt.gpkg \\
+        --surface pt_time.tif --thresholds 7.5 12 20
+
+Профиль скоростей по трекам строится отдельным запуском transit с
+--tracks и --build-speed-profile (вне QGIS Desktop — в пуле процессов).
+
+Слои задаются путями к GeoPackage (для файла с несколькими слоями —
+"путь|layername=имя"), результаты пишутся в файлы. QgsApplication
+создаётся без GUI; qgis, numpy, processing и Task4 импортируются только
+после разбора аргументов и только командами, которым они нужны. Время
+запуска QGIS печатается отдельной строкой.
+"""
+import argparse
+import importlib.util
+import os
+import sys
+import time
+from importlib.machinery import SourceFileLoader
+
+_SCRIPT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Имена слоёв, по которым Task4 ищет данные в проекте
+TASK4_LAYER_NAMES = {
+    'roads': 'исправленные пешеходные графы',
+    'stops': 'ООТ_stoppoint_stoppoint',
+    'routes': 'Маршруты_ОТ_lineRoute',
+    'buildings': 'Здания_насел_attract',
+    'elevation': 'SRTM_Irkutsk_Poligon_Interval_1',
+    'tracks': 'Треки ОТ',
+}
+
+_QGS_APP = None
+
+
+def start_qgis(with_processing=False):
+    """
+    Инициализирует QgsApplication без GUI (один раз за процесс).
+
+    Returns:
+    --------
+    float: время запуска, с
+    """
+    global _QGS_APP
+    t0 = time.perf_counter()
+    os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+    from qgis.core import QgsApplication
+    if _QGS_APP is None:
+        prefix = os.environ.get('QGIS_PREFIX_PATH')
+        if prefix:
+            QgsApplication.setPrefixPath(prefix, True)
+        _QGS_APP = QgsApplication([], False)
+        _QGS_APP.initQgis()
+    if with_processing:
+        from processing.core.Processing import Processing
+        from qgis.analysis import QgsNativeAlgorithms
+        Processing.initialize()
+        registry = QgsApplication.processingRegistry()
+        if registry.providerById('native') is None:
+            registry.addProvider(QgsNativeAlgorithms())
+    return time.perf_counter() - t0
+
+
+def stop_qgis():
+    global _QGS_APP
+    if _QGS_APP is not None:
+        _QGS_APP.exitQgis()
+        _QGS_APP = None
+
+
+def load_layer(path, name=None):
+    """Векторный слой из файла (GeoPackage и всё, что открывает OGR)."""
+    from qgis.core import QgsVectorLayer
+    layer = QgsVectorLayer(path, name or os.path.splitext(os.path.basename(path))[0], 'ogr')
+    if not layer.isValid():
+        raise Exception(f"Не удалось открыть слой: {path}")
+    return layer
+
+
+def write_layer(layer, path, layer_name):
+    """Записывает слой в GeoPackage (слой в существующем файле перезаписывается)."""
+    from qgis.core import QgsCoordinateTransformContext, QgsVectorFileWriter
+    options = QgsVectorFileWriter.SaveVectorOptions()
+    options.driverName = 'GPKG'
+    options.layerName = layer_name
+    if os.path.exists(path):
+        options.actionOnExistingFile = QgsVectorFileWriter.CreateOrOverwriteLayer
+    result = QgsVectorFileWriter.writeAsVectorFormatV3(layer, path, QgsCoordinateTransformContext(), options)
+    if result[0] != QgsVectorFileWriter.NoError:
+        raise Exception(f"Не удалось записать {path}: {result[1]}")
+
+
+def _parse_xy(text):
+    try:
+        x, y = (float(v) for v in text.split(','))
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"ожидается X,Y: {text}")
+    return x, y
+
+
+def read_origins(args, crs):
+    """
+    Старты из --origin (повторяемый) и/или --origins (точечный слой) в CRS расчёта.
+
+    Returns:
+    --------
+    tuple: (список id, список (x, y))
+    """
+    from qgis.core import (QgsCoordinateReferenceSystem, QgsCoordinateTransform, QgsGeometry,
+                           QgsPointXY, QgsProject)
+    ids, xy = [], []
+    if args.origin:
+        source_crs = QgsCoordinateReferenceSystem(args.origin_crs) if args.origin_crs else crs
+        transform = QgsCoordinateTransform(source_crs, crs, QgsProject.instance()) if source_crs != crs else None
+        for i, (x, y) in enumerate(args.origin):
+            pt = QgsPointXY(x, y)
+            if transform is not None:
+                pt = transform.transform(pt)
+            ids.append(i)
+            xy.append((pt.x(), pt.y()))
+    if args.origins:
+        layer = load_layer(args.origins)
+        transform = None
+        if layer.crs() != crs:
+            transform = QgsCoordinateTransform(layer.crs(), crs, QgsProject.instance())
+        for feature in layer.getFeatures():
+            geom = feature.geometry()
+            if geom is None or geom.isEmpty():
+                continue
+            geom = QgsGeometry(geom)
+            if transform is not None:
+                geom.transform(transform)
+            pt = geom.centroid().asPoint()
+            ids.append(feature.id())
+            xy.append((pt.x(), pt.y()))
+    if not ids:
+        raise Exception("Не задано ни одной точки старта (--origin или --origins)")
+    return ids, xy
+
+
+def run_service_area(args):
+    """Изохроны по дорожной сети (как Task5 / second.py) для всех стартов в один файл."""
+    from qgis.core import QgsDistanceArea, QgsFeature, QgsField, QgsProject, QgsVectorLayer
+    from qgis.PyQt.QtCore import QVariant
+
+    from . import instrument
+    from .batch import ServiceAreaJob, cache_network, run_batch, shape_polygon
+    from .buildings import get_store as get_building_store
+    from .graph_cache import layer_fingerprint
+    from .population import node_population
+    from .qgis_layers import network_from_layer
+
+    t0 = time.perf_counter()
+    roads = load_layer(args.roads)
+    crs = roads.crs()
+    with instrument.span('road_network'):
+        network = network_from_layer(roads, key=layer_fingerprint(roads))
+    print(f"Граф дорог: узлов {network.num_nodes}, рёбер {len(network.rec_src)} "
+          f"({time.perf_counter() - t0:.2f} с)")
+    if network.graph.chains is not None:
+        stats = network.graph.chains.summary()
+        print(f"   Сжатие цепочек степени 2: узлов {stats['nodes_before']} → {stats['nodes_after']}, "
+              f"рёбер {stats['edges_before']} → {stats['edges_after']}")
+
+    speed_mps = args.speed_kmh * 1000.0 / 3600.0
+    distances = [speed_mps * minutes * 60.0 for minutes in args.minutes]
+
+    store = None
+    assignment = None
+    if args.buildings:
+        store = get_building_store(load_layer(args.buildings), args.population_field, crs)
+        assignment = node_population(store, network.key, network.grid)
+        print(f"Зданий: {len(store)}, население: {store.total_population:.0f} чел.")
+
+    origin_ids, origin_xy = read_origins(args, crs)
+    job = ServiceAreaJob(cache_network(network), distances, args.hull, assignment)
+
+    layer = QgsVectorLayer(f"Polygon?crs={crs.authid()}", "isochrones", "memory")
+    provider = layer.dataProvider()
+    provider.addAttributes([
+        QgsField("origin_id", QVariant.Int),
+        QgsField("time_min", QVariant.Double),
+        QgsField("points_count", QVariant.Int),
+        QgsField("area_m2", QVariant.Double),
+        QgsField("buildings_count", QVariant.Double),
+        QgsField("population", QVariant.Double),
+        QgsField("net_population", QVariant.Double)
+    ])
+    layer.updateFields()
+    area_calc = QgsDistanceArea()
+    area_calc.setSourceCrs(crs, QgsProject.instance().transformContext())
+    area_calc.setEllipsoid(crs.ellipsoidAcronym())
+
+    def report(done, total):
+        print(f"   Обработано стартов: {done}/{total}")
+
+    t0 = time.perf_counter()
+    unsnapped = 0
+    with instrument.span('isochrones'):
+        results = run_batch(job, origin_xy, workers=args.workers or None, progress=report)
+        for index, result in results:
+            if result is None:
+                unsnapped += 1
+                continue
+            features = []
+            for minutes, shape, count, net_pop in zip(args.minutes, result['shapes'], result['counts'],
+                                                      result['net_population']):
+                polygon_geom = shape_polygon(shape, args.hull)
+                if polygon_geom is None or polygon_geom.isEmpty():
+                    continue
+                population, buildings_count = 0.0, 0.0
+                if store is not None:
+                    with instrument.span('population'):
+                        population, buildings_count = store.population_in_polygon(polygon_geom)[:2]
+                feat = QgsFeature(layer.fields())
+                feat.setGeometry(polygon_geom)
+                feat.setAttributes([origin_ids[index], minutes, count, area_calc.measureArea(polygon_geom),
+                                    buildings_count, population, net_pop])
+                features.append(feat)
+            provider.addFeatures(features)
+    if unsnapped:
+        print(f"Не привязано к сети стартов: {unsnapped}")
+    print(f"Изохрон: {layer.featureCount()} ({time.perf_counter() - t0:.2f} с)")
+
+    write_layer(layer, args.out, args.layer_name)
+    print(f"Результат: {args.out}")
+
+
+def _load_task4():
+    """Модуль Task4 (файл без расширения рядом с пакетом)."""
+    path = os.path.join(_SCRIPT_DIR, 'Task4')
+    loader = SourceFileLoader('task4', path)
+    spec = importlib.util.spec_from_loader('task4', loader)
+    module = importlib.util.module_from_spec(spec)
+    loader.exec_module(module)
+    return module
+
+
+def run_transit(args):
+    """Изохроны ОТ: алгоритм Task4 на слоях из файлов, загруженных в пустой проект."""
+    import processing
+    from qgis.core import QgsProcessingContext, QgsProcessingFeedback, QgsProject
+
+    class ConsoleFeedback(QgsProcessingFeedback):
+        def pushInfo(self, info):
+            print(info)
+
+        def pushWarning(self, warning):
+            print(f"ВНИМАНИЕ: {warning}")
+
+        def reportError(self, error, fatalError=False):
+            print(f"ОШИБКА: {error}")
+
+    project = QgsProject.instance()
+    for key, name in TASK4_LAYER_NAMES.items():
+        path = getattr(args, key)
+        if path:
+            project.addMapLayer(load_layer(path, name))
+    crs = project.mapLayersByName(TASK4_LAYER_NAMES['roads'])[0].crs()
+
+    module = _load_task4()
+    algorithm = module.IsochronePTStage3ConvexHull()
+    params = {
+        'USE_SLOPE': bool(args.elevation),
+        'BATCH_WORKERS': args.workers,
+        'TRACK_WORKERS': args.workers,
+        'BUILD_SPEED_PROFILE': args.build_speed_profile,
+        'OUTPUT': args.out,
+    }
+    # С --origins старты берутся из слоя, точка старта не нужна
+    if args.origin and not args.origins:
+        x, y = args.origin[0]
+        params['SOURCE_POINT'] = f"{x},{y} [{args.origin_crs or crs.authid()}]"
+    # Замеры этапов пишет сам алгоритм (METRICS_JSON, PROFILE_STAGE)
+    if args.metrics:
+        params['METRICS_JSON'] = args.metrics
+        params['PROFILE_MEMORY'] = args.metrics_memory
+    if args.profile_stage:
+        params['PROFILE_STAGE'] = args.profile_stage
+    # Не заданные в командной строке параметры берутся по умолчанию из алгоритма
+    for name, value in (('TIME_INTERVAL', args.interval), ('STEPS', args.steps),
+                        ('WALK_SPEED', args.walk_speed), ('BUS_SPEED', args.bus_speed)):
+        if value is not None:
+            params[name] = value
+    if args.router:
+        params['PT_ROUTER'] = algorithm.PT_ROUTERS.index(args.router)
+    if args.origins:
+        params['ORIGINS'] = args.origins
+    if args.surface:
+        params['SURFACE_RASTER'] = args.surface
+        params['SURFACE_RULE'] = algorithm.SURFACE_RULES.index(args.surface_rule)
+        if args.surface_cell is not None:
+            params['SURFACE_CELL'] = args.surface_cell
+        if args.thresholds:
+            params['SURFACE_THRESHOLDS'] = ', '.join(f"{m:g}" for m in args.thresholds)
+
+    context = QgsProcessingContext()
+    context.setProject(project)
+    processing.run(algorithm, params, context=context, feedback=ConsoleFeedback())
+    if not args.build_speed_profile:
+        print(f"Результат: {args.out}")
+
+
+COMMANDS = {
+    'service-area': (run_service_area, False),
+    'transit': (run_transit, True),
+}
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog='python -m accessibility.headless',
+                                     description='Расчёт изохрон без QGIS Desktop')
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    def common(p):
+        p.add_argument('--roads', required=True, help='линии дорог (GeoPackage)')
+        p.add_argument('--buildings', help='здания с населением (GeoPackage)')
+        p.add_argument('--origin', type=_parse_xy, action='append', help='старт X,Y (можно несколько)')
+        p.add_argument('--origin-crs', help='CRS координат --origin, по умолчанию CRS дорог')
+        p.add_argument('--origins', help='точечный слой стартов (GeoPackage)')
+        p.add_argument('--workers', type=int, default=0, help='процессов (0 — по числу ядер)')
+        p.add_argument('--out', required=True, help='выходной GeoPackage')
+        p.add_argument('--metrics', help='JSON с замерами этапов (время, счётчики, память)')
+        p.add_argument('--metrics-memory', action='store_true', help='замерять пиковую память этапов')
+        p.add_argument('--profile-stage', help='этап, для которого снимается cProfile (.prof рядом с JSON)')
+
+    p = sub.add_parser('service-area', help='изохроны по дорожной сети (Task5, second.py)')
+    common(p)
+    p.add_argument('--population-field', default='Насел')
+    p.add_argument('--speed-kmh', type=float, default=40.0)
+    p.add_argument('--minutes', type=float, nargs='+', default=[10.0, 15.0])
+    p.add_argument('--hull', choices=('convex', 'concave', 'edges'), default='convex')
+    p.add_argument('--layer-name', default='isochrones')
+
+    p = sub.add_parser('transit', help='изохроны ОТ (алгоритм Task4)')
+    common(p)
+    p.add_argument('--stops', required=True)
+    p.add_argument('--routes', required=True)
+    p.add_argument('--tracks')
+    p.add_argument('--elevation', help='полигоны высот; без них рельеф не учитывается')
+    p.add_argument('--interval', type=float, help='шаг времени, мин')
+    p.add_argument('--steps', type=int)
+    p.add_argument('--walk-speed', type=float, help='км/ч')
+    p.add_argument('--bus-speed', type=float, help='км/ч, если нет TRAVELTIME')
+    p.add_argument('--router', choices=('dijkstra', 'raptor', 'compare', 'table'))
+    p.add_argument('--build-speed-profile', action='store_true',
+                   help='только построить профиль скоростей по --tracks (в пуле из --workers процессов)')
+    p.add_argument('--surface', help='растр времени пути (GeoTIFF); изохроны — его контуры')
+    p.add_argument('--surface-cell', type=float, help='размер ячейки растра, м')
+    p.add_argument('--surface-rule', choices=('node', 'edge'), default='node')
+    p.add_argument('--thresholds', type=float, nargs='+', help='пороги контуров растра, мин')
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    if args.command == 'transit' and not (args.origin or args.origins or args.build_speed_profile):
+        raise SystemExit("transit: нужна точка старта --origin или слой стартов --origins")
+    command, with_processing = COMMANDS[args.command]
+
+    from .instrument import Recorder, activate
+    recorder = Recorder(memory=args.metrics_memory, profile_stage=args.profile_stage)
+
+    t_start = time.perf_counter()
+    with activate(recorder):
+        with recorder.span('qgis_startup'):
+            startup = start_qgis(with_processing)
+        print(f"Запуск QGIS: {startup:.2f} с")
+        try:
+            with recorder.span(args.command):
+                command(args)
+        finally:
+            stop_qgis()
+    print(f"Всего: {time.perf_counter() - t_start:.1f} с")
+    # Для transit этапы алгоритма пишет Task4, здесь — только запуск и общее время
+    if args.metrics and args.command != 'transit':
+        print(f"Замеры этапов: {recorder.write_json(args.metrics)}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
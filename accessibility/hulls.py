@@ -0,0 +1,146 @@
+"""
+Полигоны изохрон из достигнутых точек и рёбер — в памяти, без processing.
+
+Виды полигона:
+    convex  — выпуклая оболочка (считается в numpy);
+    concave — вогнутая оболочка QgsGeometry.concaveHull (QGIS >= 3.28,
+              иначе выпуклая);
+    edges   — буфер вокруг достигнутых частей рёбер.
+
+convex_hull_xy — чистый numpy и не требует QGIS (её зовут и процессы
+пакетного режима); qgis.core импортируется функциями, строящими QgsGeometry.
+"""
+import numpy as np
+
+HULL_CONVEX = 'convex'
+HULL_CONCAVE = 'concave'
+HULL_EDGES = 'edges'
+HULL_TYPES = (HULL_CONVEX, HULL_CONCAVE, HULL_EDGES)
+
+DEFAULT_CONCAVE_RATIO = 0.3  # доля длины рёбер (0 — самая вогнутая, 1 — выпуклая)
+DEFAULT_EDGE_BUFFER = 50.0   # м
+BUFFER_SEGMENTS = 4
+
+
+def _as_xy(points):
+    """Массив (K, 2) из ndarray или списка QgsPointXY."""
+    if isinstance(points, np.ndarray):
+        return points.reshape(-1, 2).astype(np.float64, copy=False)
+    return np.array([(p.x(), p.y()) for p in points], dtype=np.float64).reshape(-1, 2)
+
+
+def _cross(o, a, b):
+    return (a[0] - o[0]) * (b[1] - o[1]) - (a[1] - o[1]) * (b[0] - o[0])
+
+
+def convex_hull_xy(xy):
+    """
+    Вершины выпуклой оболочки против часовой стрелки (без повтора первой).
+
+    Перед обходом Эндрю отбрасываются точки внутри четырёхугольника
+    крайних точек (эвристика Акла — Туссена) — обычно это почти все точки.
+
+    Returns:
+    --------
+    ndarray (H, 2); H < 3, если точки лежат на одной прямой
+    """
+    xy = np.unique(_as_xy(xy), axis=0)
+    if len(xy) < 3:
+        return xy
+    # Крайние точки по x и y в порядке против часовой стрелки
+    quad = xy[[np.argmin(xy[:, 0]), np.argmin(xy[:, 1]), np.argmax(xy[:, 0]), np.argmax(xy[:, 1])]]
+    inside = np.ones(len(xy), dtype=bool)
+    for k in range(4):
+        a, b = quad[k], quad[(k + 1) % 4]
+        inside &= ((b[0] - a[0]) * (xy[:, 1] - a[1]) - (b[1] - a[1]) * (xy[:, 0] - a[0])) > 0
+    pts = xy[~inside].tolist()  # np.unique уже отсортировал по x, затем по y
+
+    lower, upper = [], []
+    for p in pts:
+        while len(lower) >= 2 and _cross(lower[-2], lower[-1], p) <= 0:
+            lower.pop()
+        lower.append(p)
+    for p in reversed(pts):
+        while len(upper) >= 2 and _cross(upper[-2], upper[-1], p) <= 0:
+            upper.pop()
+        upper.append(p)
+    return np.array(lower[:-1] + upper[:-1], dtype=np.float64).reshape(-1, 2)
+
+
+def polygon_from_ring(ring):
+    """QgsGeometry полигона по вершинам кольца (замыкается автоматически)."""
+    from qgis.core import QgsGeometry, QgsPointXY
+    return QgsGeometry.fromPolygonXY([[QgsPointXY(x, y) for x, y in ring.tolist()]])
+
+
+def convex_hull(points):
+    """Выпуклая оболочка точек или None, если точек меньше трёх / все на прямой."""
+    ring = convex_hull_xy(points)
+    if len(ring) < 3:
+        return None
+    return polygon_from_ring(ring)
+
+
+def concave_hull(points, ratio=DEFAULT_CONCAVE_RATIO):
+    """Вогнутая оболочка (GEOS через QGIS); на старых версиях — выпуклая."""
+    from qgis.core import QgsGeometry, QgsPointXY
+    xy = _as_xy(points)
+    if not hasattr(QgsGeometry, 'concaveHull'):
+        return convex_hull(xy)
+    multi = QgsGeometry.fromMultiPointXY([QgsPointXY(x, y) for x, y in xy.tolist()])
+    geom = multi.concaveHull(ratio)
+    if geom is None or geom.isEmpty() or geom.area() <= 0:
+        return convex_hull(xy)
+    return geom
+
+
+def edges_polygon(segments, buffer_distance=DEFAULT_EDGE_BUFFER):
+    """Буфер вокруг достигнутых частей рёбер (segments — массив (K, 2, 2))."""
+    from qgis.core import QgsGeometry, QgsPointXY
+    if segments is None or len(segments) == 0:
+        return None
+    lines = [[QgsPointXY(ax, ay), QgsPointXY(bx, by)] for (ax, ay), (bx, by) in segments.tolist()]
+    geom = QgsGeometry.fromMultiPolylineXY(lines).buffer(buffer_distance, BUFFER_SEGMENTS)
+    if geom is None or geom.isEmpty():
+        return None
+    return geom
+
+
+def isochrone_polygon(kind=HULL_CONVEX, points=None, segments=None,
+                      concave_ratio=DEFAULT_CONCAVE_RATIO, buffer_distance=DEFAULT_EDGE_BUFFER):
+    """
+    Полигон изохроны выбранного вида.
+
+    Для convex/concave нужны points, для edges — segments
+    (ServiceAreaInterval.segments); при их отсутствии берётся выпуклая оболочка.
+
+    Returns:
+    --------
+    QgsGeometry или None
+    """
+    if kind == HULL_EDGES and segments is not None:
+        return edges_polygon(segments, buffer_distance)
+    if points is None and segments is not None:
+        points = segments.reshape(-1, 2)
+    if points is None or len(points) < 3:
+        return None
+    if kind == HULL_CONCAVE:
+        return concave_hull(points, concave_ratio)
+    return convex_hull(points)
+
+
+def batch_polygons(point_sets=None, segment_sets=None, kind=HULL_CONVEX, **options):
+    """
+    Полигоны для набора изохрон (например, всех порогов или всех стартов).
+
+    point_sets / segment_sets — списки одинаковой длины (любой может быть None).
+
+    Returns:
+    --------
+    list: QgsGeometry или None для каждого набора
+    """
+    count = len(point_sets if point_sets is not None else segment_sets)
+    point_sets = point_sets if point_sets is not None else [None] * count
+    segment_sets = segment_sets if segment_sets is not None else [None] * count
+    return [isochrone_polygon(kind, points, segments, **options)
+            for points, segments in zip(point_sets, segment_sets)]
@@ -0,0 +1,201 @@
+"""
+Замеры этапов расчёта: именованные интервалы, счётчики, пиковая память.
+
+    recorder = Recorder(memory=True, profile_stage='граф')
+    with activate(recorder):
+        with recorder.span('граф'):
+            ...
+            count('nodes', graph.num_nodes)
+    recorder.write_json('run.json')
+
+Модули пакета вызывают count() — счётчик попадает в текущий интервал
+активного Recorder; без активного Recorder вызов ничего не делает.
+Интервалы вкладываются: счётчики и память вложенного учитываются и в
+объемлющем. Память — пик tracemalloc внутри интервала (замедляет расчёт,
+поэтому включается отдельно). Для одного выбранного интервала можно
+снять cProfile: статистика пишется в файл .prof рядом с JSON.
+"""
+import cProfile
+import json
+import os
+import time
+import tracemalloc
+from collections import defaultdict
+from contextlib import contextmanager
+
+_ACTIVE = None
+
+
+def count(name, value=1):
+    """Прибавляет value к счётчику текущего интервала активного Recorder."""
+    if _ACTIVE is not None:
+        _ACTIVE.count(name, value)
+
+
+def span(name):
+    """Интервал активного Recorder (или пустой контекст, если его нет)."""
+    if _ACTIVE is not None:
+        return _ACTIVE.span(name)
+    return _null_span()
+
+
+@contextmanager
+def _null_span():
+    yield None
+
+
+@contextmanager
+def activate(recorder):
+    """Делает recorder активным на время блока."""
+    global _ACTIVE
+    previous = _ACTIVE
+    _ACTIVE = recorder
+    try:
+        yield recorder
+    finally:
+        _ACTIVE = previous
+
+
+class Recorder:
+    """
+    Журнал интервалов одного запуска.
+
+    Parameters:
+    -----------
+    memory : bool
+        Замерять пиковую память каждого интервала (tracemalloc)
+    profile_stage : str
+        Имя интервала, для которого снимается cProfile
+    """
+
+    def __init__(self, memory=False, profile_stage=None):
+        self.memory = memory
+        self.profile_stage = profile_stage
+        self.profile = None
+        self.spans = []
+        self.totals = defaultdict(float)
+        self._stack = []
+        self._t0 = time.perf_counter()
+        self._own_tracing = False
+        self._stage = None
+
+    def count(self, name, value=1):
+        self.totals[name] += value
+        for record in self._stack:
+            record['counters'][name] = record['counters'].get(name, 0) + value
+
+    @contextmanager
+    def span(self, name):
+        parent = self._stack[-1] if self._stack else None
+        record = {
+            'name': name,
+            'path': f"{parent['path']}/{name}" if parent else name,
+            'start': round(time.perf_counter() - self._t0, 6),
+            'seconds': None,
+            'counters': {},
+        }
+        if self.memory:
+            if not tracemalloc.is_tracing():
+                tracemalloc.start()
+                self._own_tracing = True
+            if parent is not None:
+                parent['_peak'] = max(parent['_peak'], tracemalloc.get_traced_memory()[1])
+            tracemalloc.reset_peak()
+            record['_base'] = tracemalloc.get_traced_memory()[0]
+            record['_peak'] = 0
+        profiler = None
+        if name == self.profile_stage and self.profile is None:
+            profiler = cProfile.Profile()
+        self._stack.append(record)
+        t0 = time.perf_counter()
+        if profiler is not None:
+            profiler.enable()
+        try:
+            yield record
+        finally:
+            if profiler is not None:
+                profiler.disable()
+                self.profile = profiler
+            record['seconds'] = round(time.perf_counter() - t0, 6)
+            self._stack.pop()
+            if self.memory:
+                peak = max(record.pop('_peak'), tracemalloc.get_traced_memory()[1])
+                record['peak_mb'] = round((peak - record.pop('_base')) / 1e6, 3)
+                if parent is not None:
+                    parent['_peak'] = max(parent['_peak'], peak)
+                if not self._stack and self._own_tracing:
+                    tracemalloc.stop()
+                    self._own_tracing = False
+            self.spans.append(record)
+
+    def stage(self, name):
+        """
+        Закрывает предыдущий этап, начатый stage(), и открывает следующий.
+
+        Для длинных линейных процедур, где этапы идут подряд (шаги Task4).
+        """
+        self.finish()
+        self._stage = self.span(name)
+        self._stage.__enter__()
+
+    def finish(self):
+        """Закрывает этап, начатый stage()."""
+        if self._stage is not None:
+            stage, self._stage = self._stage, None
+            stage.__exit__(None, None, None)
+
+    def merged_spans(self):
+        """
+        Интервалы, сгруппированные по пути (повторные — например, население
+        для каждой изохроны — складываются): calls, seconds, counters, peak_mb.
+        """
+        merged = {}
+        for record in sorted(self.spans, key=lambda r: r['start']):
+            item = merged.get(record['path'])
+            if item is None:
+                item = merged[record['path']] = dict(record, counters=dict(record['counters']), calls=0,
+                                                     seconds=0.0)
+            item['calls'] += 1
+            item['seconds'] = round(item['seconds'] + record['seconds'], 6)
+            if 'peak_mb' in record:
+                item['peak_mb'] = max(item['peak_mb'], record['peak_mb'])
+            if item['calls'] > 1:
+                for name, value in record['counters'].items():
+                    item['counters'][name] = item['counters'].get(name, 0) + value
+        return list(merged.values())
+
+    def to_dict(self):
+        spans = self.merged_spans()
+        return {
+            'created': time.strftime('%Y-%m-%d %H:%M:%S'),
+            'total_seconds': round(time.perf_counter() - self._t0, 6),
+            'spans': spans,
+            'counters': dict(self.totals),
+            'profile_stage': self.profile_stage if self.profile is not None else None,
+        }
+
+    def write_json(self, path):
+        """Пишет журнал в JSON; cProfile выбранного этапа — в тот же путь с расширением .prof."""
+        data = self.to_dict()
+        if self.profile is not None:
+            profile_path = os.path.splitext(path)[0] + '.prof'
+            self.profile.dump_stats(profile_path)
+            data['profile_path'] = profile_path
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(data, f, ensure_ascii=False, indent=2)
+        return path
+
+    def summary_lines(self):
+        """Строки для журнала: время и счётчики по интервалам в порядке начала."""
+        lines = []
+        for record in self.merged_spans():
+            depth = record['path'].count('/')
+            text = f"{'  ' * depth}{record['name']}: {record['seconds']:.3f} с"
+            if record['calls'] > 1:
+                text += f" (вызовов: {record['calls']})"
+            if 'peak_mb' in record:
+                text += f", пик {record['peak_mb']:.1f} МБ"
+            if record['counters']:
+                text += ", " + ", ".join(f"{k}={v:g}" for k, v in record['counters'].items())
+            lines.append(text)
+        return lines
@@ -0,0 +1,51 @@
+"""
+Выбор способа запуска пулов процессов (сопоставление треков, пакетный режим).
+
+Внутри QGIS Desktop пул не запускается: fork копирует процесс вместе
+с потоками Qt и GDAL, а spawn на Windows запускает заново qgis-bin вместо
+интерпретатора. Поэтому в GUI расчёт всегда идёт в одном процессе,
+а параллельно — только в headless и qgis_process.
+"""
+import multiprocessing
+import os
+import sys
+
+
+def in_qgis_gui():
+    """Запущены ли мы внутри QGIS Desktop (модуль qgis.utils загружен и iface задан)."""
+    return getattr(sys.modules.get('qgis.utils'), 'iface', None) is not None
+
+
+def python_executable():
+    """
+    Интерпретатор для дочерних процессов spawn.
+
+    В qgis-bin и qgis_process sys.executable — сам QGIS, поэтому ищется
+    python из его поставки; None — если найти не удалось.
+    """
+    if os.path.basename(sys.executable or '').lower().startswith('python'):
+        return sys.executable
+    for path in (os.path.join(sys.exec_prefix, 'python.exe'), os.path.join(sys.exec_prefix, 'bin', 'python3')):
+        if os.path.isfile(path):
+            return path
+    return None
+
+
+def mp_context():
+    """
+    Контекст multiprocessing для пулов процессов или None, если пул здесь небезопасен.
+
+    При None вызывающий код считает в текущем процессе.
+    """
+    if in_qgis_gui():
+        return None
+    if 'fork' in multiprocessing.get_all_start_methods():
+        # fork не требует повторного импорта модулей QGIS в дочерних процессах
+        return multiprocessing.get_context('fork')
+    executable = python_executable()
+    if executable is None:
+        return None
+    context = multiprocessing.get_context('spawn')
+    if executable != sys.executable:
+        context.set_executable(executable)
+    return context
@@ -0,0 +1,98 @@
+"""
+Население по сети: здания привязаны к ближайшим узлам графа.
+
+Привязка считается один раз на пару (граф, слой зданий). После поиска
+население в пределах любого порога — векторная сумма по зданиям, чьё
+время (время до узла + подход от узла к зданию) не превышает порог.
+"""
+import numpy as np
+
+DEFAULT_MAX_ACCESS = 500.0  # м; здания дальше от сети считаются недостижимыми
+
+
+class NodePopulation:
+    """
+    Привязка зданий к узлам: node_ids, access (расстояние подхода),
+    population — массивы по привязанным зданиям.
+    """
+
+    def __init__(self, num_nodes, node_ids, access, population, unassigned_population=0.0):
+        self.num_nodes = int(num_nodes)
+        self.node_ids = node_ids
+        self.access = access
+        self.population = population
+        self.unassigned_population = float(unassigned_population)
+
+    @classmethod
+    def assign(cls, grid, xy, population, max_access=DEFAULT_MAX_ACCESS):
+        """
+        Parameters:
+        -----------
+        grid : NodeGrid
+            Индекс узлов графа
+        xy : ndarray (B, 2)
+            Точки зданий (центроиды) в CRS графа
+        population : ndarray (B,)
+            Население зданий
+        max_access : float
+            Здания дальше этого расстояния от ближайшего узла не привязываются
+        """
+        population = np.asarray(population, dtype=np.float64)
+        node_ids, access = grid.nearest_many(xy, max_access)
+        ok = node_ids >= 0
+        return cls(len(grid.node_xy), node_ids[ok], access[ok], population[ok],
+                   population[~ok].sum())
+
+    def __len__(self):
+        return len(self.node_ids)
+
+    def per_node(self):
+        """Суммарное население, привязанное к каждому узлу графа."""
+        return np.bincount(self.node_ids, weights=self.population, minlength=self.num_nodes)
+
+    def building_times(self, result, access_cost_per_unit=1.0):
+        """Время до каждого привязанного здания (inf — не достигнуто)."""
+        dense = result.to_dense(self.num_nodes)
+        return dense[self.node_ids] + self.access * access_cost_per_unit
+
+    def within(self, result, cutoffs=None, access_cost_per_unit=1.0):
+        """
+        Население и число зданий в пределах каждого порога.
+
+        Parameters:
+        -----------
+        result : SearchResult
+            Результат поиска по тому же графу
+        cutoffs : iterable
+            Пороги (по умолчанию — пороги поиска)
+        access_cost_per_unit : float
+            Стоимость единицы расстояния подхода (1 для метров, 1/скорость для секунд)
+
+        Returns:
+        --------
+        tuple: (population, buildings) — массивы по порогам
+        """
+        cutoffs = result.cutoffs if cutoffs is None else np.asarray(cutoffs, dtype=np.float64)
+        times = self.building_times(result, access_cost_per_unit)
+        reached = np.isfinite(times)
+        times = times[reached]
+        order = np.argsort(times, kind='stable')
+        times = times[order]
+        cum_pop = np.concatenate(([0.0], np.cumsum(self.population[reached][order])))
+        idx = np.searchsorted(times, cutoffs, side='right')
+        return cum_pop[idx], idx
+
+
+def node_population(store, key, grid, max_access=DEFAULT_MAX_ACCESS):
+    """
+    Привязка зданий хранилища к узлам графа с кэшем в самом хранилище.
+
+    key — отпечаток графа; при смене графа или слоя зданий привязка
+    пересчитывается (хранилище сбрасывается вместе с привязками).
+    """
+    cache_key = (key, max_access)
+    assignment = store.node_assignments.get(cache_key)
+    if assignment is None:
+        assignment = NodePopulation.assign(grid, store.centroids, store.population, max_access)
+        store.node_assignments[cache_key] = assignment
+    return assignment
@@ -0,0 +1,90 @@
+"""
+Мост между слоями QGIS и массивами пакета accessibility.
+
+Здесь слои превращаются в RoadNetwork, а результаты поиска — обратно в слои.
+"""
+from qgis.core import QgsFeature, QgsField, QgsGeometry, QgsPointXY, QgsVectorLayer
+from qgis.PyQt.QtCore import QVariant
+
+from .graph_cache import layer_fingerprint
+from .service_area import RoadNetwork
+
+
+def layer_polylines(layer, request=None):
+    """Части линий слоя как списки точек (мультилинии раскладываются на части)."""
+    features = layer.getFeatures(request) if request is not None else layer.getFeatures()
+    for feature in features:
+        geom = feature.geometry()
+        if not geom or geom.isEmpty():
+            continue
+        if geom.isMultipart():
+            for part in geom.asMultiPolyline():
+                yield part
+        else:
+            yield geom.asPolyline()
+
+
+def network_from_layer(layer, speed_mps=None, request=None, key=None):
+    """
+    RoadNetwork по линейному слою; стоимость — метры или секунды при заданной скорости.
+
+    key — отпечаток сети; по умолчанию отпечаток слоя.
+    """
+    if key is None:
+        key = layer_fingerprint(layer)
+    return RoadNetwork.from_polylines(
+        ([(p.x(), p.y()) for p in part] for part in layer_polylines(layer, request)),
+        speed_mps, key=key)
+
+
+def points_from_array(xy):
+    """Массив (K, 2) → список QgsPointXY."""
+    return [QgsPointXY(x, y) for x, y in xy.tolist()]
+
+
+def lines_layer_from_interval(interval, crs, name):
+    """
+    Слой линий одного интервала: один объект MultiLineString,
+    как OUTPUT_LINES алгоритма native:serviceareafromlayer.
+    """
+    layer = QgsVectorLayer(f"MultiLineString?crs={crs.authid()}", name, "memory")
+    parts = [[QgsPointXY(ax, ay), QgsPointXY(bx, by)]
+             for (ax, ay), (bx, by) in interval.segments.tolist()]
+    if parts:
+        feat = QgsFeature()
+        feat.setGeometry(QgsGeometry.fromMultiPolylineXY(parts))
+        layer.dataProvider().addFeatures([feat])
+    layer.updateExtents()
+    return layer
+
+
+def surface_isochrones_layer(surface, thresholds, crs, name, store=None):
+    """
+    Слой изохрон-контуров растра времени (TimeSurface): объект на каждый порог.
+
+    thresholds — пороги в секундах; store — BuildingStore для населения
+    (без него population и buildings_count нулевые). Пороги без ячеек
+    пропускаются.
+    """
+    layer = QgsVectorLayer(f"MultiPolygon?crs={crs.authid()}", name, "memory")
+    provider = layer.dataProvider()
+    provider.addAttributes([
+        QgsField("time_min", QVariant.Double),
+        QgsField("area_m2", QVariant.Double),
+        QgsField("buildings_count", QVariant.Double),
+        QgsField("population", QVariant.Double)
+    ])
+    layer.updateFields()
+    features = []
+    for threshold, geom in zip(thresholds, surface.polygons(thresholds, min_area=surface.cell_size ** 2)):
+        if geom is None or geom.isEmpty():
+            continue
+        population, buildings_count = store.population_in_polygon(geom)[:2] if store is not None else (0.0, 0.0)
+        geom.convertToMultiType()
+        feat = QgsFeature(layer.fields())
+        feat.setGeometry(geom)
+        feat.setAttributes([threshold / 60.0, geom.area(), buildings_count, population])
+        features.append(feat)
+    provider.addFeatures(features)
+    layer.updateExtents()
+    return layer
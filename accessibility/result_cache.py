@@ -0,0 +1,191 @@
+"""
+Кэш готовых результатов изохрон для повторных запросов.
+
+Одни и те же остановки, центры районов и точку ИрНИТУ считают снова и
+снова с теми же параметрами. Результат (геометрии оболочек, отрезки
+линий, население) кладётся под ключ из привязанного узла старта, режима,
+скоростей, интервалов, флага рельефа, фильтра маршрутов и отпечатков
+входных слоёв — повторный запрос пропускает поиск, оболочки и подсчёт
+населения.
+
+Два уровня: в памяти — LRU с ограничением по объёму, на диске — артефакты
+graph_cache в подкаталоге results/ (переживают перезапуск QGIS; старые
+удаляются, когда записей больше max_disk_entries). Запись — словарь:
+arrays (имя → numpy-массив) и values (числа, списки — всё, что пишется
+в JSON). Геометрии хранятся как WKB в массивах uint8.
+"""
+import json
+import os
+import shutil
+from collections import OrderedDict
+
+import numpy as np
+
+from . import graph_cache, instrument
+
+DEFAULT_MEMORY_MB = 64.0      # объём записей в памяти
+DEFAULT_DISK_ENTRIES = 500    # записей на диске, дальше удаляются самые давние
+
+_CACHE = None
+
+
+def result_key(**parts):
+    """Ключ результата из параметров расчёта (как graph_fingerprint)."""
+    return graph_cache.graph_fingerprint(kind='isochrone_result', **parts)
+
+
+def origin_part(node_xy):
+    """
+    Часть ключа для старта: округлённые координаты (x, y).
+
+    Для привязанного узла координаты, в отличие от номера, одинаковы
+    в графе по окну и по всему слою.
+    """
+    return [round(float(node_xy[0]), 3), round(float(node_xy[1]), 3)]
+
+
+def geometry_array(geom):
+    """QgsGeometry → WKB в массиве uint8 (пустой массив для пустой геометрии)."""
+    if geom is None or geom.isEmpty():
+        return np.zeros(0, dtype=np.uint8)
+    return np.frombuffer(bytes(geom.asWkb()), dtype=np.uint8)
+
+
+def array_geometry(arr):
+    """WKB из массива uint8 → QgsGeometry или None."""
+    if arr is None or len(arr) == 0:
+        return None
+    from qgis.core import QgsGeometry
+    geom = QgsGeometry()
+    geom.fromWkb(np.asarray(arr, dtype=np.uint8).tobytes())
+    return geom
+
+
+def _entry_size(entry):
+    values = json.dumps(entry['values'], ensure_ascii=False, default=str)
+    return sum(arr.nbytes for arr in entry['arrays'].values()) + len(values)
+
+
+class ResultCache:
+    """
+    LRU в памяти + каталог на диске.
+
+    Parameters:
+    -----------
+    max_memory_mb : float
+        Объём записей в памяти; при превышении вытесняются давно не нужные
+    root : str
+        Каталог дискового уровня (по умолчанию <кэш графов>/results)
+    max_disk_entries : int
+        Записей на диске; 0 — дисковый уровень не используется
+    """
+
+    def __init__(self, max_memory_mb=DEFAULT_MEMORY_MB, root=None, max_disk_entries=DEFAULT_DISK_ENTRIES):
+        self.max_bytes = int(max_memory_mb * 1e6)
+        self.root = root
+        self.max_disk_entries = max_disk_entries
+        self.nbytes = 0
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()  # ключ → (запись, размер)
+
+    @property
+    def disk_root(self):
+        return self.root or os.path.join(graph_cache.cache_root(), 'results')
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, key):
+        return key in self._entries
+
+    def get(self, key):
+        """Запись по ключу или None; найденная на диске поднимается в память."""
+        item = self._entries.get(key)
+        if item is not None:
+            self._entries.move_to_end(key)
+            self.hits += 1
+            instrument.count('result_cache_hits')
+            return item[0]
+        entry = self._load(key)
+        if entry is None:
+            self.misses += 1
+            instrument.count('result_cache_misses')
+            return None
+        self.disk_hits += 1
+        instrument.count('result_cache_disk_hits')
+        self._remember(key, entry)
+        return entry
+
+    def put(self, key, arrays=None, values=None):
+        """Кладёт запись в память и на диск."""
+        entry = {
+            'arrays': {name: np.ascontiguousarray(arr) for name, arr in (arrays or {}).items()},
+            'values': dict(values or {}),
+        }
+        self._remember(key, entry)
+        if self.max_disk_entries:
+            try:
+                graph_cache.save_graph(key, entry['arrays'], meta={'kind': 'isochrone_result',
+                                                                   'values': entry['values']},
+                                       root=self.disk_root)
+                self._prune_disk()
+            except OSError:
+                pass  # дисковый уровень необязателен: запись остаётся в памяти
+        return entry
+
+    def clear(self, disk=False):
+        """Очищает память (и дисковый уровень при disk=True)."""
+        self._entries.clear()
+        self.nbytes = 0
+        if disk:
+            shutil.rmtree(self.disk_root, ignore_errors=True)
+
+    def _remember(self, key, entry):
+        size = _entry_size(entry)
+        old = self._entries.pop(key, None)
+        if old is not None:
+            self.nbytes -= old[1]
+        if size > self.max_bytes:
+            return
+        self._entries[key] = (entry, size)
+        self.nbytes += size
+        while self.nbytes > self.max_bytes:
+            _, (_, evicted) = self._entries.popitem(last=False)
+            self.nbytes -= evicted
+
+    def _load(self, key):
+        if not self.max_disk_entries:
+            return None
+        loaded = graph_cache.load_graph(key, self.disk_root)
+        if loaded is None:
+            return None
+        arrays, meta = loaded
+        try:
+            # Время изменения meta.json — порядок вытеснения на диске
+            os.utime(os.path.join(graph_cache.artifact_path(key, self.disk_root), 'meta.json'))
+        except OSError:
+            pass
+        return {'arrays': arrays, 'values': meta.get('values', {})}
+
+    def _prune_disk(self):
+        root = self.disk_root
+        stamps = []
+        for name in os.listdir(root):
+            meta_path = os.path.join(root, name, 'meta.json')
+            if not name.startswith('.') and os.path.isfile(meta_path):
+                stamps.append((os.path.getmtime(meta_path), name))
+        if len(stamps) <= self.max_disk_entries:
+            return
+        stamps.sort()
+        for _, name in stamps[:len(stamps) - self.max_disk_entries]:
+            shutil.rmtree(os.path.join(root, name), ignore_errors=True)
+
+
+def get_cache():
+    """Кэш результатов на время сессии (общий для всех скриптов)."""
+    global _CACHE
+    if _CACHE is None:
+        _CACHE = ResultCache()
+    return _CACHE
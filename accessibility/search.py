@@ -0,0 +1,132 @@
+"""
+Поиск кратчайших путей (Dijkstra) по графу WalkGraph.
+
+bounded_search — основной движок изохрон: останавливается на максимальном
+пороге времени и сразу раскладывает достигнутые узлы по порогам. По
+сжатому графу (graph.chains) поиск идёт только по развилкам, а времена
+промежуточных узлов цепочек восстанавливаются после него.
+"""
+import heapq
+import math
+from array import array
+
+import numpy as np
+
+from . import instrument
+
+
+class SearchResult:
+    """
+    Результат ограниченного поиска.
+
+    nodes/times — достигнутые узлы в порядке неубывания времени, поэтому
+    узлы в пределах любого порога — это префикс массива.
+    """
+
+    def __init__(self, nodes, times, cutoffs):
+        self.nodes = nodes
+        self.times = times
+        self.cutoffs = cutoffs
+        self._time_by_node = None
+
+    def __len__(self):
+        return len(self.nodes)
+
+    def count_within(self, cutoff, strict=False):
+        """Число узлов со временем <= cutoff (< cutoff при strict)."""
+        return int(np.searchsorted(self.times, cutoff, side='left' if strict else 'right'))
+
+    def nodes_within(self, cutoff, strict=False):
+        return self.nodes[:self.count_within(cutoff, strict)]
+
+    def buckets(self):
+        """Индекс первого порога из cutoffs, в который попадает каждый узел."""
+        return np.searchsorted(self.cutoffs, self.times, side='left')
+
+    def bounds(self, strict=False):
+        """Длины префиксов nodes для каждого порога cutoffs."""
+        return np.searchsorted(self.times, self.cutoffs, side='left' if strict else 'right')
+
+    def time_of(self, node):
+        """Время до узла или inf, если он дальше максимального порога."""
+        if self._time_by_node is None:
+            self._time_by_node = dict(zip(self.nodes.tolist(), self.times.tolist()))
+        return self._time_by_node.get(node, math.inf)
+
+    def to_dense(self, num_nodes):
+        """Массив времён по всем узлам графа (inf для недостигнутых)."""
+        dense = np.full(num_nodes, np.inf)
+        dense[self.nodes] = self.times
+        return dense
+
+
+def bounded_search(graph, sources, cutoffs):
+    """
+    Dijkstra с ранней остановкой на максимальном пороге.
+
+    Затрагиваются только узлы в пределах max(cutoffs): рабочие структуры —
+    словари, а не массивы на весь граф.
+
+    Parameters:
+    -----------
+    graph : WalkGraph
+    sources : int или iterable
+        Узел старта либо пары (узел, начальное время) для многоисточникового поиска
+    cutoffs : float или iterable
+        Пороги времени (в единицах стоимости рёбер, обычно секунды)
+
+    Returns:
+    --------
+    SearchResult
+    """
+    cutoffs = np.sort(np.atleast_1d(np.asarray(cutoffs, dtype=np.float64)))
+    limit = float(cutoffs[-1])
+    if isinstance(sources, (int, np.integer)):
+        sources = [(int(sources), 0.0)]
+
+    if graph.chains is None:
+        nodes, times = _search(graph, sources, limit)
+    else:
+        sources, on_chains = graph.chains.map_sources(sources)
+        nodes, times = graph.chains.expand(*_search(graph, sources, limit), limit, on_chains)
+    return SearchResult(nodes, times, cutoffs)
+
+
+def _search(graph, sources, limit):
+    """Dijkstra до limit: (узлы, времена) в порядке извлечения."""
+    best = {}
+    heap = []
+    for node, cost in sources:
+        if cost <= limit and cost < best.get(node, math.inf):
+            best[node] = cost
+            heap.append((cost, node))
+    heapq.heapify(heap)
+
+    offsets, targets, weights = graph.offsets, graph.targets, graph.weights
+    settled = set()
+    out_nodes = array('i')
+    out_times = array('d')
+    pops = 0
+    scanned = 0
+    while heap:
+        d, u = heapq.heappop(heap)
+        pops += 1
+        if u in settled:
+            continue
+        settled.add(u)
+        out_nodes.append(u)
+        out_times.append(d)
+        a, b = offsets[u], offsets[u + 1]
+        scanned += b - a
+        for v, w in zip(targets[a:b].tolist(), weights[a:b].tolist()):
+            nd = d + w
+            if nd <= limit and nd < best.get(v, math.inf):
+                best[v] = nd
+                heapq.heappush(heap, (nd, v))
+
+    instrument.count('searches')
+    instrument.count('heap_pops', pops)
+    instrument.count('edges_scanned', int(scanned))
+    instrument.count('nodes_settled', len(out_nodes))
+    return (np.frombuffer(out_nodes, dtype=np.int32).copy(),
+            np.frombuffer(out_times, dtype=np.float64).copy())
@@ -0,0 +1,233 @@
+"""
+Зона обслуживания по дорожной сети сразу для нескольких порогов.
+
+Граф строится один раз на слой дорог, поиск от старта выполняется один
+раз до максимального порога; линии и крайние точки каждого интервала
+получаются из одного массива расстояний, поэтому дополнительные
+интервалы почти ничего не стоят.
+"""
+import math
+
+import numpy as np
+
+from .graph import EdgeListBuilder, WalkGraph
+from .search import bounded_search
+from .snapping import NodeGrid
+from .surface import DEFAULT_MAX_WALK_OFF, DEFAULT_SURFACE_CELL, RULE_EDGE, RULE_NODE, TimeSurface
+
+
+class ServiceAreaInterval:
+    """
+    Результат для одного порога.
+
+    segments — массив (K, 2, 2): начало и конец каждой достигнутой части ребра,
+    конец — дальняя от старта точка (как последняя точка линии в выходе
+    native:serviceareafromlayer). end_points — массив (K, 2) этих концов.
+    """
+
+    def __init__(self, cutoff, segments):
+        self.cutoff = cutoff
+        self.segments = segments
+
+    @property
+    def end_points(self):
+        return self.segments[:, 1, :]
+
+    def total_length(self):
+        """Суммарная длина достигнутых частей рёбер (в единицах CRS)."""
+        d = self.segments[:, 1, :] - self.segments[:, 0, :]
+        return float(np.hypot(d[:, 0], d[:, 1]).sum())
+
+    def __len__(self):
+        return len(self.segments)
+
+
+class RoadNetwork:
+    """
+    Дорожная сеть в виде WalkGraph с сохранёнными записями рёбер.
+
+    Стоимость ребра — длина (speed_mps=None) или время в секундах.
+    Граф поиска сжат по цепочкам степени 2 (contract=False — без сжатия);
+    записи рёбер хранятся исходные, по ним строятся линии интервалов.
+    """
+
+    def __init__(self, builder, speed_mps=None, key=None, contract=True):
+        self.speed_mps = speed_mps
+        self.key = key  # отпечаток источника сети (для кэшей, зависящих от графа)
+        src, dst, cost, length = builder.records()
+        self.rec_src = src.copy()
+        self.rec_dst = dst.copy()
+        self.rec_cost = cost.copy()
+        self.rec_length = length.copy()
+        self.rec_both_ways = np.frombuffer(builder.both_ways, dtype=np.int8).astype(bool)
+        self.graph = builder.build(contract=contract)
+        self.node_xy = self.graph.node_xy
+        self.grid = NodeGrid.build(self.node_xy) if self.graph.num_nodes else None
+
+    @classmethod
+    def from_polylines(cls, polylines, speed_mps=None, precision=3, key=None, contract=True):
+        """
+        Parameters:
+        -----------
+        polylines : iterable
+            Последовательности точек (x, y) — части линий дорожного слоя
+        speed_mps : float
+            Скорость для перевода длины в секунды; None — стоимость в метрах
+        """
+        builder = EdgeListBuilder(precision)
+        for pts in polylines:
+            prev = None
+            for p in pts:
+                x, y = float(p[0]), float(p[1])
+                cur = builder.node(x, y)
+                if prev is not None and cur != prev:
+                    px, py = builder.xs[prev], builder.ys[prev]
+                    length = math.hypot(x - px, y - py)
+                    cost = length / speed_mps if speed_mps else length
+                    builder.add_edge(prev, cur, cost, length)
+                prev = cur
+        return cls(builder, speed_mps, key, contract)
+
+    def to_arrays(self):
+        """Массивы для graph_cache: записи рёбер, CSR-граф и сетка узлов."""
+        arrays = self.graph.to_arrays()
+        arrays.update({
+            'rec_src': self.rec_src,
+            'rec_dst': self.rec_dst,
+            'rec_cost': self.rec_cost,
+            'rec_length': self.rec_length,
+            'rec_both_ways': self.rec_both_ways,
+            'speed_mps': np.array([self.speed_mps if self.speed_mps else np.nan]),
+        })
+        if self.grid is not None:
+            arrays.update(self.grid.to_arrays())
+        return arrays
+
+    @classmethod
+    def from_arrays(cls, arrays, key=None):
+        """Сеть из массивов to_arrays (в том числе открытых через memory-map)."""
+        network = cls.__new__(cls)
+        speed = float(arrays['speed_mps'][0])
+        network.speed_mps = None if math.isnan(speed) else speed
+        network.key = key
+        network.rec_src = arrays['rec_src']
+        network.rec_dst = arrays['rec_dst']
+        network.rec_cost = arrays['rec_cost']
+        network.rec_length = arrays['rec_length']
+        network.rec_both_ways = arrays['rec_both_ways']
+        network.graph = WalkGraph.from_arrays(arrays)
+        network.node_xy = network.graph.node_xy
+        network.grid = NodeGrid.from_arrays(network.node_xy, arrays) if 'grid_params' in arrays else None
+        return network
+
+    @property
+    def num_nodes(self):
+        return self.graph.num_nodes
+
+    def snap(self, x, y, max_dist=math.inf):
+        """Ближайший узел сети: (node_id, distance) или (None, inf)."""
+        if self.grid is None:
+            return None, math.inf
+        return self.grid.nearest(x, y, max_dist)
+
+    def snap_many(self, xy, max_dist=math.inf):
+        """Ближайшие узлы для массива точек (N, 2): (node_ids, distances), -1 / inf — не привязана."""
+        xy = np.asarray(xy, dtype=np.float64).reshape(-1, 2)
+        if self.grid is None:
+            return np.full(len(xy), -1, dtype=np.int32), np.full(len(xy), np.inf)
+        return self.grid.nearest_many(xy, max_dist)
+
+    def search(self, origin, cutoffs):
+        """
+        Поиск от старта до максимального порога.
+
+        Parameters:
+        -----------
+        origin : int или iterable
+            Узел старта или пары (узел, начальная стоимость)
+        cutoffs : iterable
+            Пороги в единицах стоимости (метры или секунды)
+
+        Returns:
+        --------
+        SearchResult
+        """
+        return bounded_search(self.graph, origin, cutoffs)
+
+    def service_area(self, origin, cutoffs):
+        """Достигнутые части рёбер для каждого порога за один поиск (см. search)."""
+        return self.intervals(self.search(origin, cutoffs))
+
+    def time_surface(self, result, speed_mps, access_speed_mps=None, cell_size=DEFAULT_SURFACE_CELL,
+                     rule=RULE_NODE, max_walk_off=DEFAULT_MAX_WALK_OFF):
+        """
+        Растр времени пути (секунды) по результату поиска, до его максимального порога.
+
+        Parameters:
+        -----------
+        speed_mps : float
+            Скорость по сети, если стоимость в метрах (speed_mps сети не задана)
+        access_speed_mps : float
+            Скорость подхода от сети к ячейке; по умолчанию speed_mps
+
+        Returns:
+        --------
+        TimeSurface
+        """
+        scale = 1.0 if self.speed_mps else 1.0 / speed_mps
+        links = None
+        if rule == RULE_EDGE:
+            u, v, cost = self.graph.links()
+            links = (u, v, cost * scale)
+        return TimeSurface.build(self.node_xy, result.to_dense(self.num_nodes) * scale,
+                                 float(result.cutoffs[-1]) * scale, access_speed_mps or speed_mps,
+                                 cell_size, rule, links, max_walk_off)
+
+    def intervals(self, result):
+        """
+        Достигнутые части рёбер для каждого порога результата поиска.
+
+        Returns:
+        --------
+        list: ServiceAreaInterval в порядке возрастания порога
+        """
+        dist = result.to_dense(self.num_nodes)
+
+        # Рёбра, которых поиск коснулся хотя бы одним концом
+        du = dist[self.rec_src]
+        dv = np.where(self.rec_both_ways, dist[self.rec_dst], np.inf)
+        touched = np.isfinite(du) | np.isfinite(dv)
+        du, dv = du[touched], dv[touched]
+        cost = self.rec_cost[touched]
+        a = self.node_xy[self.rec_src[touched]]
+        b = self.node_xy[self.rec_dst[touched]]
+
+        intervals = []
+        for cutoff in result.cutoffs.tolist():
+            with np.errstate(invalid='ignore'):
+                reach_u = np.clip(cutoff - du, 0.0, cost)
+                reach_v = np.clip(cutoff - dv, 0.0, cost)
+            reach_u[~np.isfinite(reach_u)] = 0.0
+            reach_v[~np.isfinite(reach_v)] = 0.0
+            full = (reach_u + reach_v >= cost) & ((du <= cutoff) | (dv <= cutoff))
+            part_u = ~full & (reach_u > 0)
+            part_v = ~full & (reach_v > 0)
+
+            # Полностью пройденное ребро идёт от ближнего конца к дальнему
+            u_first = du[full] <= dv[full]
+            fa, fb = a[full], b[full]
+            full_start = np.where(u_first[:, None], fa, fb)
+            full_end = np.where(u_first[:, None], fb, fa)
+
+            with np.errstate(invalid='ignore', divide='ignore'):
+                tu = np.where(cost[part_u] > 0, reach_u[part_u] / cost[part_u], 1.0)
+                tv = np.where(cost[part_v] > 0, reach_v[part_v] / cost[part_v], 1.0)
+            pu_start = a[part_u]
+            pu_end = pu_start + (b[part_u] - pu_start) * tu[:, None]
+            pv_start = b[part_v]
+            pv_end = pv_start + (a[part_v] - pv_start) * tv[:, None]
+
+            starts = np.concatenate((full_start, pu_start, pv_start))
+            ends = np.concatenate((full_end, pu_end, pv_end))
+            intervals.append(ServiceAreaInterval(cutoff, np.stack((starts, ends), axis=1)))
+        return intervals
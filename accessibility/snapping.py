@@ -0,0 +1,325 @@
+"""
+Привязка точек к графу: равномерные сетки по узлам и по отрезкам.
+
+Сетки хранятся массивами numpy, поэтому сохраняются на диск вместе
+со скомпилированным графом (см. graph_cache) и не требуют QgsSpatialIndex.
+Запросы пачкой (nearest_many) обрабатывают все точки сразу: для каждого
+кольца ячеек вокруг точек кандидаты собираются одним массивом, и точка
+считается привязанной, как только следующее кольцо заведомо дальше
+найденного. Так привязываются старты, остановки, здания и центроиды треков.
+"""
+import math
+
+import numpy as np
+
+QUERY_CHUNK = 50_000  # точек в одной пачке запроса (ограничивает память под кандидатов)
+
+
+def csr_ranges(starts, counts):
+    """Склеенные диапазоны starts[i]..starts[i] + counts[i] (индексы для массивов CSR)."""
+    counts = np.asarray(counts, dtype=np.int64)
+    total = int(counts.sum())
+    if total == 0:
+        return np.zeros(0, dtype=np.int64)
+    shift = np.repeat(np.asarray(starts, dtype=np.int64) - (np.cumsum(counts) - counts), counts)
+    return shift + np.arange(total, dtype=np.int64)
+
+
+class _CellIndex:
+    """Общая часть сеток: ячейки (nx × ny) размера cell_size, объекты ячеек в CSR-виде."""
+
+    def _item_d2(self, items, xy):
+        """Квадраты расстояний от точек xy (K, 2) до объектов items (K,)."""
+        raise NotImplementedError
+
+    def _query(self, xy, max_dist):
+        """
+        Ближайший объект для каждой точки: (ids, d2), -1 и inf — нет в радиусе max_dist.
+
+        Кольца ячеек растут удвоением; точка готова, когда непросмотренные
+        ячейки (дальше кольца ring) не ближе ring * cell_size, чем найденный
+        объект. Для точек вне сетки учитывается расстояние до её границы.
+        """
+        xy = np.asarray(xy, dtype=np.float64).reshape(-1, 2)
+        best = np.full(len(xy), -1, dtype=np.int64)
+        best_d2 = np.full(len(xy), np.inf)
+        cs = self.cell_size
+        lim2 = max_dist * max_dist
+        ex = np.maximum(np.maximum(self.x0 - xy[:, 0], xy[:, 0] - (self.x0 + self.nx * cs)), 0.0)
+        ey = np.maximum(np.maximum(self.y0 - xy[:, 1], xy[:, 1] - (self.y0 + self.ny * cs)), 0.0)
+        edge2 = ex * ex + ey * ey
+        cx = np.clip(((xy[:, 0] - self.x0) // cs), 0, self.nx - 1).astype(np.int64)
+        cy = np.clip(((xy[:, 1] - self.y0) // cs), 0, self.ny - 1).astype(np.int64)
+
+        pending = np.nonzero(edge2 <= lim2)[0]
+        prev, ring = -1, 1
+        max_ring = max(self.nx, self.ny)
+        while len(pending):
+            # Новые ячейки кольца: смещения дальше предыдущего кольца
+            dx, dy = np.meshgrid(np.arange(-ring, ring + 1), np.arange(-ring, ring + 1), indexing='ij')
+            shell = np.maximum(np.abs(dx), np.abs(dy)).ravel() > prev
+            self._scan(xy, pending, cx[pending, None] + dx.ravel()[shell],
+                       cy[pending, None] + dy.ravel()[shell], best, best_d2)
+            reach2 = edge2[pending] + (ring * cs) ** 2
+            done = (best_d2[pending] < reach2) | (reach2 >= lim2) | (ring >= max_ring)
+            pending = pending[~done]
+            prev, ring = ring, ring * 2
+
+        best[best_d2 > lim2] = -1
+        best_d2[best < 0] = np.inf
+        return best, best_d2
+
+    def _scan(self, xy, points, ix, iy, best, best_d2):
+        """Кандидаты из ячеек (ix, iy) — массивы (точки × смещения) — улучшают best."""
+        ok = (ix >= 0) & (ix < self.nx) & (iy >= 0) & (iy < self.ny)
+        cells = np.where(ok, ix * self.ny + iy, 0)
+        starts = self.offsets[cells]
+        cell_counts = np.where(ok, self.offsets[cells + 1] - starts, 0)
+        counts = cell_counts.sum(axis=1)
+        has = counts > 0
+        if not has.any():
+            return
+        # Кандидаты идут подряд по точкам: минимум по группе — reduceat
+        items = self.order[csr_ranges(starts[has].ravel(), cell_counts[has].ravel())].astype(np.int64)
+        points, counts = points[has], counts[has]
+        d2 = self._item_d2(items, xy[np.repeat(points, counts)])
+        group_start = np.cumsum(counts) - counts
+        group_min = np.minimum.reduceat(d2, group_start)
+        # Первый кандидат с минимальным расстоянием в каждой группе
+        hits = np.flatnonzero(d2 == np.repeat(group_min, counts))
+        group = np.searchsorted(group_start, hits, side='right') - 1
+        first = np.ones(len(hits), dtype=bool)
+        first[1:] = group[1:] != group[:-1]
+        hits, group = hits[first], group[first]
+        better = group_min[group] < best_d2[points[group]]
+        owner = points[group[better]]
+        best_d2[owner] = group_min[group[better]]
+        best[owner] = items[hits[better]]
+
+    def _chunked(self, xy, max_dist):
+        xy = np.asarray(xy, dtype=np.float64).reshape(-1, 2)
+        ids = np.empty(len(xy), dtype=np.int64)
+        d2 = np.empty(len(xy))
+        for i0 in range(0, len(xy), QUERY_CHUNK):
+            ids[i0:i0 + QUERY_CHUNK], d2[i0:i0 + QUERY_CHUNK] = self._query(xy[i0:i0 + QUERY_CHUNK], max_dist)
+        return xy, ids, d2
+
+
+class NodeGrid(_CellIndex):
+    """Индекс узлов на равномерной сетке (ячейки в CSR-виде)."""
+
+    def __init__(self, node_xy, x0, y0, cell_size, nx, ny, order, offsets):
+        self.node_xy = node_xy
+        self.x0 = float(x0)
+        self.y0 = float(y0)
+        self.cell_size = float(cell_size)
+        self.nx = int(nx)
+        self.ny = int(ny)
+        self.order = order      # id узлов, отсортированные по ячейке
+        self.offsets = offsets  # начало ячейки c в order: offsets[c]..offsets[c + 1]
+
+    @classmethod
+    def build(cls, node_xy, nodes_per_cell=4.0):
+        """Строит сетку так, чтобы в среднем в ячейке было nodes_per_cell узлов."""
+        node_xy = np.asarray(node_xy, dtype=np.float64)
+        n = len(node_xy)
+        if n == 0:
+            raise Exception("Нельзя построить индекс по пустому набору узлов")
+        x0, y0 = node_xy.min(axis=0)
+        x1, y1 = node_xy.max(axis=0)
+        width = max(x1 - x0, 1.0)
+        height = max(y1 - y0, 1.0)
+        cell_size = math.sqrt(width * height * nodes_per_cell / n)
+        cell_size = max(cell_size, 1.0)
+        nx = int(width // cell_size) + 1
+        ny = int(height // cell_size) + 1
+        cells = cls._cell_ids(node_xy, x0, y0, cell_size, nx, ny)
+        order = np.argsort(cells, kind='stable').astype(np.int32)
+        counts = np.bincount(cells, minlength=nx * ny)
+        offsets = np.zeros(nx * ny + 1, dtype=np.int64)
+        np.cumsum(counts, out=offsets[1:])
+        return cls(node_xy, x0, y0, cell_size, nx, ny, order, offsets)
+
+    @staticmethod
+    def _cell_ids(xy, x0, y0, cell_size, nx, ny):
+        ix = np.clip(((xy[:, 0] - x0) // cell_size).astype(np.int64), 0, nx - 1)
+        iy = np.clip(((xy[:, 1] - y0) // cell_size).astype(np.int64), 0, ny - 1)
+        return ix * ny + iy
+
+    def _cell_nodes(self, ix, iy):
+        c = ix * self.ny + iy
+        return self.order[self.offsets[c]:self.offsets[c + 1]]
+
+    def nearest(self, x, y, max_dist=math.inf):
+        """
+        Ближайший узел к точке (x, y).
+
+        Returns:
+        --------
+        tuple: (node_id, distance) или (None, inf), если в радиусе max_dist узлов нет
+        """
+        cs = self.cell_size
+        cx = int((x - self.x0) // cs)
+        cy = int((y - self.y0) // cs)
+        best_id = None
+        best_d2 = math.inf
+        # Точка может лежать за пределами сетки — добавляем отступ до неё
+        outside = max(0, -cx, cx - (self.nx - 1), -cy, cy - (self.ny - 1))
+        max_ring = outside + max(self.nx, self.ny)
+        if math.isfinite(max_dist):
+            max_ring = min(max_ring, int(max_dist // cs) + 1)
+        # Кольца ячеек вокруг точки; выходим, когда кольцо заведомо дальше лучшего узла
+        for ring in range(0, max_ring + 1):
+            if best_id is not None and (ring - 1) * cs > math.sqrt(best_d2):
+                break
+            for ix in range(cx - ring, cx + ring + 1):
+                if ix < 0 or ix >= self.nx:
+                    continue
+                if ring == 0 or ix in (cx - ring, cx + ring):
+                    iys = range(cy - ring, cy + ring + 1)
+                else:
+                    iys = (cy - ring, cy + ring)
+                for iy in iys:
+                    if iy < 0 or iy >= self.ny:
+                        continue
+                    ids = self._cell_nodes(ix, iy)
+                    if len(ids) == 0:
+                        continue
+                    d = self.node_xy[ids] - (x, y)
+                    d2 = np.einsum('ij,ij->i', d, d)
+                    k = int(np.argmin(d2))
+                    if d2[k] < best_d2:
+                        best_d2 = float(d2[k])
+                        best_id = int(ids[k])
+        if best_id is None or best_d2 > max_dist * max_dist:
+            return None, math.inf
+        return best_id, math.sqrt(best_d2)
+
+    def _item_d2(self, items, xy):
+        d = self.node_xy[items] - xy
+        return np.einsum('ij,ij->i', d, d)
+
+    def nearest_many(self, xy, max_dist=math.inf):
+        """
+        Ближайшие узлы для массива точек одним запросом.
+
+        Parameters:
+        -----------
+        xy : ndarray (K, 2)
+            Точки в CRS графа
+        max_dist : float
+            Дальше этого расстояния узел не ищется
+
+        Returns:
+        --------
+        tuple: (node_ids, distances) — массивы (K,), -1 и inf для точек без узла в радиусе
+        """
+        _, ids, d2 = self._chunked(xy, max_dist)
+        return ids.astype(np.int32), np.sqrt(d2)
+
+    def to_arrays(self):
+        """Массивы для сохранения в кэш графа."""
+        return {
+            'grid_params': np.array([self.x0, self.y0, self.cell_size, self.nx, self.ny], dtype=np.float64),
+            'grid_order': self.order,
+            'grid_offsets': self.offsets,
+        }
+
+    @classmethod
+    def from_arrays(cls, node_xy, arrays):
+        x0, y0, cell_size, nx, ny = arrays['grid_params']
+        return cls(node_xy, x0, y0, cell_size, int(nx), int(ny),
+                   arrays['grid_order'], arrays['grid_offsets'])
+
+
+class SegmentGrid(_CellIndex):
+    """
+    Индекс отрезков (рёбер графа, звеньев маршрутов) на равномерной сетке.
+
+    Отрезок записан во все ячейки, которые задевает его охват, поэтому
+    ближайший к точке отрезок находится тем же поиском по кольцам ячеек.
+    """
+
+    def __init__(self, seg_a, seg_b, x0, y0, cell_size, nx, ny, order, offsets):
+        self.seg_a = seg_a
+        self.seg_b = seg_b
+        self.x0 = float(x0)
+        self.y0 = float(y0)
+        self.cell_size = float(cell_size)
+        self.nx = int(nx)
+        self.ny = int(ny)
+        self.order = order      # номера отрезков по ячейкам (отрезок — во всех ячейках охвата)
+        self.offsets = offsets
+
+    @classmethod
+    def build(cls, seg_a, seg_b, segments_per_cell=2.0):
+        """
+        Parameters:
+        -----------
+        seg_a, seg_b : ndarray (S, 2)
+            Начала и концы отрезков
+        segments_per_cell : float
+            Среднее число отрезков в ячейке (ячейка не меньше медианной длины отрезка)
+        """
+        seg_a = np.asarray(seg_a, dtype=np.float64).reshape(-1, 2)
+        seg_b = np.asarray(seg_b, dtype=np.float64).reshape(-1, 2)
+        if len(seg_a) == 0:
+            raise Exception("Нельзя построить индекс по пустому набору отрезков")
+        lo = np.minimum(seg_a, seg_b)
+        hi = np.maximum(seg_a, seg_b)
+        x0, y0 = lo.min(axis=0)
+        x1, y1 = hi.max(axis=0)
+        width = max(x1 - x0, 1.0)
+        height = max(y1 - y0, 1.0)
+        median_length = float(np.median(np.hypot(*(seg_b - seg_a).T)))
+        cell_size = max(math.sqrt(width * height * segments_per_cell / len(seg_a)), median_length, 1.0)
+        nx = int(width // cell_size) + 1
+        ny = int(height // cell_size) + 1
+
+        ix0 = np.clip(((lo[:, 0] - x0) // cell_size).astype(np.int64), 0, nx - 1)
+        ix1 = np.clip(((hi[:, 0] - x0) // cell_size).astype(np.int64), 0, nx - 1)
+        iy0 = np.clip(((lo[:, 1] - y0) // cell_size).astype(np.int64), 0, ny - 1)
+        iy1 = np.clip(((hi[:, 1] - y0) // cell_size).astype(np.int64), 0, ny - 1)
+        rows = iy1 - iy0 + 1
+        counts = (ix1 - ix0 + 1) * rows
+        k = csr_ranges(np.zeros(len(counts), dtype=np.int64), counts)
+        cells = (np.repeat(ix0, counts) + k // np.repeat(rows, counts)) * ny + np.repeat(iy0, counts) \
+            + k % np.repeat(rows, counts)
+        segs = np.repeat(np.arange(len(seg_a), dtype=np.int32), counts)
+        order = segs[np.argsort(cells, kind='stable')]
+        offsets = np.zeros(nx * ny + 1, dtype=np.int64)
+        np.cumsum(np.bincount(cells, minlength=nx * ny), out=offsets[1:])
+        return cls(seg_a, seg_b, x0, y0, cell_size, nx, ny, order, offsets)
+
+    def _project(self, segs, xy):
+        a = self.seg_a[segs]
+        ab = self.seg_b[segs] - a
+        len2 = np.einsum('ij,ij->i', ab, ab)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            t = np.where(len2 > 0, np.einsum('ij,ij->i', xy - a, ab) / len2, 0.0)
+        t = np.clip(t, 0.0, 1.0)
+        d = a + ab * t[:, None] - xy
+        return t, np.einsum('ij,ij->i', d, d)
+
+    def _item_d2(self, items, xy):
+        return self._project(items, xy)[1]
+
+    def nearest_many(self, xy, max_dist=math.inf):
+        """
+        Ближайшие отрезки для массива точек одним запросом.
+
+        Returns:
+        --------
+        tuple: (segment_ids, distances, t) — массивы (K,); t — доля длины отрезка
+               от seg_a до проекции точки; -1, inf и nan для точек без отрезка в радиусе
+        """
+        xy, ids, d2 = self._chunked(xy, max_dist)
+        t = np.full(len(xy), np.nan)
+        found = ids >= 0
+        t[found] = self._project(ids[found], xy[found])[0]
+        return ids, np.sqrt(d2), t
+
+    def points_at(self, segment_ids, t):
+        """Точки на отрезках по доле длины t (проекции из nearest_many)."""
+        a = self.seg_a[segment_ids]
+        return a + (self.seg_b[segment_ids] - a) * np.asarray(t)[:, None]
@@ -0,0 +1,480 @@
+"""
+Профиль скоростей маршрутов ОТ по GPS-трекам.
+
+Каждый трек (часть линии со скоростью) привязывается к ближайшему маршруту
+и превращается в интервал мер вдоль маршрута [начало, конец] со скоростью.
+Сопоставление идёт в чистом numpy, поэтому его можно раздать по процессам
+пачками; результат — компактный профиль (CSR по маршрутам), который
+сохраняется в graph_cache и при следующих запусках читается с диска.
+"""
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+
+import numpy as np
+
+from .pool import mp_context
+from .snapping import SegmentGrid, csr_ranges
+
+MAX_MATCH_DIST = 50.0    # м, дальше трек считается чужим
+MIN_TRACK_LENGTH = 5.0   # м, короче — шум
+MIN_INTERVAL = 5.0       # м, минимальная длина интервала вдоль маршрута
+ROUTE_CANDIDATES = 5     # маршрутов-кандидатов по охвату, как nearestNeighbor(…, 5)
+DEFAULT_CHUNK_SIZE = 20000
+MIN_OVERLAP = 0.5        # м, перекрытие интервала с отрезком, начиная с которого интервал учитывается
+MIN_SEGMENT = 1.0        # м, более короткие отрезки между остановками не оцениваются
+
+_ROUTES = None  # RouteLines процесса-исполнителя (см. _init_worker)
+
+
+class RouteLines:
+    """
+    Отрезки всех маршрутов плоскими массивами.
+
+    Отрезки маршрута r — seg_a/seg_b[offsets[r]:offsets[r + 1]];
+    seg_m0 — мера (расстояние вдоль маршрута) в начале отрезка,
+    части мультилинии идут подряд, как в QgsGeometry.lineLocatePoint.
+    """
+
+    def __init__(self, route_ids, offsets, seg_a, seg_b, seg_m0, bbox):
+        self.route_ids = route_ids
+        self.offsets = offsets
+        self.seg_a = seg_a
+        self.seg_b = seg_b
+        self.seg_m0 = seg_m0
+        self.bbox = bbox  # (R, 4): xmin, ymin, xmax, ymax
+        self._grid = None
+
+    @classmethod
+    def from_parts(cls, routes):
+        """
+        Parameters:
+        -----------
+        routes : iterable
+            Пары (rid, [часть, ...]), часть — последовательность точек (x, y)
+        """
+        route_ids, offsets, bbox = [], [0], []
+        seg_a, seg_b, seg_m0 = [], [], []
+        for rid, parts in routes:
+            measure = 0.0
+            count = 0
+            lo = np.full(2, np.inf)
+            hi = np.full(2, -np.inf)
+            for part in parts:
+                xy = np.asarray(part, dtype=np.float64).reshape(-1, 2)
+                if len(xy) < 2:
+                    continue
+                lengths = np.hypot(*(xy[1:] - xy[:-1]).T)
+                seg_a.append(xy[:-1])
+                seg_b.append(xy[1:])
+                seg_m0.append(measure + np.concatenate(([0.0], np.cumsum(lengths)[:-1])))
+                measure += float(lengths.sum())
+                count += len(lengths)
+                lo = np.minimum(lo, xy.min(axis=0))
+                hi = np.maximum(hi, xy.max(axis=0))
+            if count == 0:
+                continue
+            route_ids.append(rid)
+            offsets.append(offsets[-1] + count)
+            bbox.append((lo[0], lo[1], hi[0], hi[1]))
+        empty = np.zeros((0, 2), dtype=np.float64)
+        return cls(
+            np.array(route_ids, dtype=np.int64),
+            np.array(offsets, dtype=np.int64),
+            np.concatenate(seg_a) if seg_a else empty,
+            np.concatenate(seg_b) if seg_b else empty,
+            np.concatenate(seg_m0) if seg_m0 else np.zeros(0),
+            np.array(bbox, dtype=np.float64).reshape(-1, 4),
+        )
+
+    def __len__(self):
+        return len(self.route_ids)
+
+    def segments(self, r):
+        s0, s1 = self.offsets[r], self.offsets[r + 1]
+        return self.seg_a[s0:s1], self.seg_b[s0:s1], self.seg_m0[s0:s1]
+
+    def segment_grid(self):
+        """SegmentGrid по звеньям всех маршрутов (строится при первом обращении)."""
+        if self._grid is None and len(self.seg_a):
+            self._grid = SegmentGrid.build(self.seg_a, self.seg_b)
+        return self._grid
+
+    def nearest_routes(self, xy, max_dist=MAX_MATCH_DIST):
+        """Маршрут (позиция) с ближайшим к каждой точке звеном в радиусе; -1 — нет такого."""
+        return self.bind_points(xy, max_dist)[0]
+
+    def bind_points(self, xy, max_dist):
+        """
+        Линейная привязка точек (остановок) к ближайшему маршруту.
+
+        Ищутся только звенья в ячейках сетки у точки; мера — seg_m0 звена
+        плюс расстояние до проекции вдоль него (как lineLocatePoint).
+
+        Returns:
+        --------
+        tuple: (позиции маршрутов, расстояния, меры) — массивы (N,);
+               -1, inf и nan для точек без маршрута в радиусе max_dist
+        """
+        xy = np.asarray(xy, dtype=np.float64).reshape(-1, 2)
+        route_pos = np.full(len(xy), -1, dtype=np.int64)
+        measures = np.full(len(xy), np.nan)
+        grid = self.segment_grid()
+        if grid is None:
+            return route_pos, np.full(len(xy), np.inf), measures
+        segs, dists, t = grid.nearest_many(xy, max_dist)
+        found = segs >= 0
+        s = segs[found]
+        route_pos[found] = np.searchsorted(self.offsets, s, side='right') - 1
+        measures[found] = self.seg_m0[s] + t[found] * np.hypot(*(self.seg_b[s] - self.seg_a[s]).T)
+        return route_pos, dists, measures
+
+    def candidates(self, x, y, k=ROUTE_CANDIDATES):
+        """k маршрутов с ближайшим к точке охватом (позиции, не rid)."""
+        dx = np.maximum(np.maximum(self.bbox[:, 0] - x, x - self.bbox[:, 2]), 0.0)
+        dy = np.maximum(np.maximum(self.bbox[:, 1] - y, y - self.bbox[:, 3]), 0.0)
+        d = np.hypot(dx, dy)
+        if len(d) <= k:
+            return np.argsort(d, kind='stable')
+        nearest = np.argpartition(d, k)[:k]
+        return nearest[np.argsort(d[nearest], kind='stable')]
+
+    def locate(self, r, points):
+        """Меры проекций точек (K, 2) на маршрут r (аналог lineLocatePoint)."""
+        a, b, m0 = self.segments(r)
+        d, t, seg_len = _point_segment(points, a, b)
+        best = np.argmin(d, axis=1)
+        rows = np.arange(len(points))
+        return m0[best] + t[rows, best] * seg_len[best]
+
+
+def _point_segment(points, a, b):
+    """
+    Расстояния от точек (P, 2) до отрезков a→b (S, 2).
+
+    Returns:
+    --------
+    tuple: (расстояния (P, S), доля t вдоль отрезка (P, S), длины отрезков (S,))
+    """
+    ab = b - a
+    seg_len2 = (ab * ab).sum(axis=1)
+    rel = points[:, None, :] - a[None, :, :]
+    with np.errstate(invalid='ignore', divide='ignore'):
+        t = np.where(seg_len2 > 0, (rel * ab[None]).sum(axis=2) / seg_len2, 0.0)
+    t = np.clip(t, 0.0, 1.0)
+    proj = a[None] + t[..., None] * ab[None]
+    d = np.hypot(*(points[:, None, :] - proj).transpose(2, 0, 1))
+    return d, t, np.sqrt(seg_len2)
+
+
+def _segments_cross(a1, b1, a2, b2):
+    """
+    Есть ли собственное пересечение хотя бы одной пары отрезков из двух наборов.
+
+    Касания и наложения не проверяются: их даёт нулевое расстояние до вершины.
+    """
+    def orient(p, q, r):
+        return ((q[..., 0] - p[..., 0]) * (r[..., 1] - p[..., 1])
+                - (q[..., 1] - p[..., 1]) * (r[..., 0] - p[..., 0]))
+    p1, q1 = a1[:, None], b1[:, None]
+    p2, q2 = a2[None], b2[None]
+    o1 = orient(p1, q1, p2)
+    o2 = orient(p1, q1, q2)
+    o3 = orient(p2, q2, p1)
+    o4 = orient(p2, q2, q1)
+    return bool(np.any((o1 * o2 < 0) & (o3 * o4 < 0)))
+
+
+def polyline_distance(track, a, b, max_dist=MAX_MATCH_DIST):
+    """
+    Расстояние от линии трека (K, 2) до отрезков маршрута a→b.
+
+    Учитываются только отрезки маршрута у охвата трека (+max_dist);
+    если таких нет — inf.
+    """
+    lo = track.min(axis=0) - max_dist
+    hi = track.max(axis=0) + max_dist
+    near = ((np.maximum(a, b) >= lo).all(axis=1) & (np.minimum(a, b) <= hi).all(axis=1))
+    if not near.any():
+        return np.inf
+    a = a[near]
+    b = b[near]
+    if _segments_cross(track[:-1], track[1:], a, b):
+        return 0.0
+    d_track = _point_segment(track, a, b)[0].min()
+    d_route = _point_segment(np.concatenate((a, b)), track[:-1], track[1:])[0].min()
+    return float(min(d_track, d_route))
+
+
+def match_tracks(routes, track_xy, track_offsets, speeds,
+                 max_dist=MAX_MATCH_DIST, min_length=MIN_TRACK_LENGTH):
+    """
+    Привязка треков к маршрутам.
+
+    Parameters:
+    -----------
+    routes : RouteLines
+    track_xy : ndarray (P, 2)
+        Вершины всех треков подряд
+    track_offsets : ndarray (T + 1,)
+        Вершины трека i — track_xy[track_offsets[i]:track_offsets[i + 1]]
+    speeds : ndarray (T,)
+        Скорость трека, м/с
+
+    Returns:
+    --------
+    tuple: (позиции маршрутов, начала, концы, скорости) — массивы одной длины
+    """
+    # Длины и центроиды всех треков пачки разом: центроид линии — середины
+    # звеньев, взвешенные длиной
+    count = len(track_offsets) - 1
+    links = np.maximum(np.diff(track_offsets) - 1, 0)
+    link = csr_ranges(track_offsets[:-1], links)
+    link_track = np.repeat(np.arange(count), links)
+    link_len = np.hypot(*(track_xy[link + 1] - track_xy[link]).T)
+    track_len = np.bincount(link_track, weights=link_len, minlength=count)
+    mid = (track_xy[link + 1] + track_xy[link]) * 0.5 * link_len[:, None]
+    with np.errstate(invalid='ignore', divide='ignore'):
+        centroids = np.column_stack((np.bincount(link_track, weights=mid[:, 0], minlength=count),
+                                     np.bincount(link_track, weights=mid[:, 1], minlength=count))) \
+            / track_len[:, None]
+    usable = (speeds > 0) & (links > 0) & (track_len >= min_length)
+    # Маршрут с ближайшим к центроиду звеном — дополнительный кандидат к охватам
+    # (длинный маршрут с большим охватом может не попасть в первые k)
+    near_route = np.full(count, -1, dtype=np.int64)
+    near_route[usable] = routes.nearest_routes(centroids[usable], max_dist)
+
+    out_route, out_start, out_end, out_speed = [], [], [], []
+    for i in np.flatnonzero(usable).tolist():
+        speed = speeds[i]
+        track = track_xy[track_offsets[i]:track_offsets[i + 1]]
+        cx, cy = centroids[i]
+
+        candidates = routes.candidates(cx, cy).tolist()
+        if near_route[i] >= 0 and near_route[i] not in candidates:
+            candidates.append(int(near_route[i]))
+        best_r = -1
+        best_dist = np.inf
+        for r in candidates:
+            a, b, _ = routes.segments(r)
+            d = polyline_distance(track, a, b, max_dist)
+            if d < best_dist:
+                best_dist = d
+                best_r = r
+        if best_r < 0 or best_dist > max_dist:
+            continue
+        m_start, m_end = routes.locate(best_r, track[[0, -1]]).tolist()
+        seg_start = min(m_start, m_end)
+        seg_end = max(m_start, m_end)
+        if seg_end - seg_start < MIN_INTERVAL:
+            continue
+        out_route.append(best_r)
+        out_start.append(seg_start)
+        out_end.append(seg_end)
+        out_speed.append(speed)
+    return (np.array(out_route, dtype=np.int64), np.array(out_start, dtype=np.float64),
+            np.array(out_end, dtype=np.float64), np.array(out_speed, dtype=np.float64))
+
+
+def _init_worker(routes):
+    global _ROUTES
+    _ROUTES = routes
+
+
+def _match_chunk(track_xy, track_offsets, speeds):
+    return match_tracks(_ROUTES, track_xy, track_offsets, speeds)
+
+
+def _chunks(track_xy, track_offsets, speeds, chunk_size):
+    count = len(track_offsets) - 1
+    for i0 in range(0, count, chunk_size):
+        i1 = min(i0 + chunk_size, count)
+        p0, p1 = track_offsets[i0], track_offsets[i1]
+        yield track_xy[p0:p1], track_offsets[i0:i1 + 1] - p0, speeds[i0:i1]
+
+
+def build_speed_profile(routes, track_xy, track_offsets, speeds, workers=None,
+                        chunk_size=DEFAULT_CHUNK_SIZE, progress=None):
+    """
+    Профиль скоростей: треки пачками по chunk_size сопоставляются в пуле процессов.
+
+    workers — число процессов (по умолчанию число ядер); при 1, одной пачке,
+    недоступном пуле или внутри QGIS Desktop (см. pool.mp_context)
+    сопоставление идёт в текущем процессе.
+    progress — функция (готово_пачек, всего_пачек).
+
+    Returns:
+    --------
+    RouteSpeedProfile
+    """
+    track_xy = np.ascontiguousarray(track_xy, dtype=np.float64).reshape(-1, 2)
+    track_offsets = np.asarray(track_offsets, dtype=np.int64)
+    speeds = np.asarray(speeds, dtype=np.float64)
+    chunks = list(_chunks(track_xy, track_offsets, speeds, max(int(chunk_size), 1)))
+    workers = workers or os.cpu_count() or 1
+    workers = min(workers, len(chunks))
+
+    results = None
+    context = mp_context() if workers > 1 else None
+    if context is not None:
+        try:
+            results = [None] * len(chunks)
+            with ProcessPoolExecutor(max_workers=workers, mp_context=context,
+                                     initializer=_init_worker, initargs=(routes,)) as pool:
+                futures = {pool.submit(_match_chunk, *chunk): i for i, chunk in enumerate(chunks)}
+                for done, future in enumerate(as_completed(futures), 1):
+                    # Порядок пачек сохраняется — профиль не зависит от расписания процессов
+                    results[futures[future]] = future.result()
+                    if progress:
+                        progress(done, len(chunks))
+        except (OSError, BrokenProcessPool):
+            results = None
+    if results is None:
+        results = []
+        for done, chunk in enumerate(chunks, 1):
+            results.append(match_tracks(routes, *chunk))
+            if progress:
+                progress(done, len(chunks))
+
+    if results:
+        route_pos, starts, ends, seg_speeds = (np.concatenate(parts) for parts in zip(*results))
+    else:
+        route_pos = np.zeros(0, dtype=np.int64)
+        starts = ends = seg_speeds = np.zeros(0, dtype=np.float64)
+    return RouteSpeedProfile.from_intervals(routes.route_ids[route_pos], starts, ends, seg_speeds)
+
+
+class RouteSpeedProfile:
+    """
+    Интервалы скоростей по маршрутам в CSR-виде.
+
+    Интервалы маршрута route_ids[k] — starts/ends/speeds[offsets[k]:offsets[k + 1]],
+    отсортированные по началу.
+
+    Средняя скорость на отрезке [a, b], взвешенная перекрытием, считается
+    через префиксные суммы по началам и по концам интервалов: перекрытие
+    интервала с (-inf, x] равно x - start для начавшихся и минус x - end
+    для закончившихся, поэтому сумма по любому диапазону — два бинарных
+    поиска. Интервалы короче MIN_OVERLAP не поддерживаются (в профиле
+    все интервалы не короче MIN_INTERVAL).
+    """
+
+    def __init__(self, route_ids, offsets, starts, ends, speeds):
+        self.route_ids = route_ids
+        self.offsets = offsets
+        self.starts = starts
+        self.ends = ends
+        self.speeds = speeds
+        self._pos = {rid: k for k, rid in enumerate(route_ids.tolist())}
+        self._index = None
+
+    @classmethod
+    def from_intervals(cls, rids, starts, ends, speeds):
+        rids = np.asarray(rids, dtype=np.int64)
+        order = np.lexsort((starts, rids))  # lexsort устойчив: равные начала — в порядке треков
+        rids = rids[order]
+        route_ids, counts = np.unique(rids, return_counts=True)
+        offsets = np.zeros(len(route_ids) + 1, dtype=np.int64)
+        np.cumsum(counts, out=offsets[1:])
+        return cls(route_ids, offsets, np.asarray(starts, dtype=np.float64)[order],
+                   np.asarray(ends, dtype=np.float64)[order],
+                   np.asarray(speeds, dtype=np.float64)[order])
+
+    def __len__(self):
+        return len(self.starts)
+
+    @property
+    def num_routes(self):
+        return len(self.route_ids)
+
+    def intervals(self, rid):
+        """Список (начало, конец, скорость) маршрута; пустой, если треков нет."""
+        k = self._pos.get(rid)
+        if k is None:
+            return []
+        s0, s1 = self.offsets[k], self.offsets[k + 1]
+        return list(zip(self.starts[s0:s1].tolist(), self.ends[s0:s1].tolist(),
+                        self.speeds[s0:s1].tolist()))
+
+    def _build_index(self):
+        """Концы, отсортированные внутри маршрута, и префиксные суммы [1, x, v, v·x]."""
+        route_of = np.repeat(np.arange(self.num_routes), np.diff(self.offsets))
+        by_end = np.lexsort((self.ends, route_of))
+        ends_sorted = self.ends[by_end]
+
+        def prefix(values, speeds):
+            columns = np.column_stack((np.ones_like(values), values, speeds, speeds * values))
+            out = np.zeros((len(values) + 1, 4), dtype=np.float64)
+            np.cumsum(columns, axis=0, out=out[1:])
+            return out
+
+        self._index = (ends_sorted, prefix(self.starts, self.speeds),
+                       prefix(ends_sorted, self.speeds[by_end]))
+
+    def segment_speeds(self, rid, measures_a, measures_b):
+        """
+        Средние скорости трека на отрезках маршрута [a, b] (взвешены длиной перекрытия).
+
+        Учитываются интервалы с перекрытием больше MIN_OVERLAP; отрезки
+        короче MIN_SEGMENT и отрезки без треков — nan. Все отрезки маршрута
+        оцениваются одним вызовом за O(m log n).
+
+        Returns:
+        --------
+        ndarray (m,) скоростей, м/с
+        """
+        a = np.asarray(measures_a, dtype=np.float64)
+        b = np.asarray(measures_b, dtype=np.float64)
+        a, b = np.minimum(a, b), np.maximum(a, b)
+        out = np.full(len(a), np.nan)
+        k = self._pos.get(rid)
+        if k is None or len(a) == 0:
+            return out
+        if self._index is None:
+            self._build_index()
+        ends_sorted, pre_start, pre_end = self._index
+        s0, s1 = self.offsets[k], self.offsets[k + 1]
+        starts = self.starts[s0:s1]
+        ends = ends_sorted[s0:s1]
+
+        def sums(values, prefix, x, side):
+            return prefix[s0 + np.searchsorted(values, x, side)] - prefix[s0]
+
+        def covered(x):
+            # Σ w·|интервал ∩ (-inf, x]| для w = 1 (столбец 0) и w = скорость (столбец 1)
+            started = sums(starts, pre_start, x, 'right')
+            ended = sums(ends, pre_end, x, 'right')
+            return np.column_stack((
+                x * (started[:, 0] - ended[:, 0]) - started[:, 1] + ended[:, 1],
+                x * (started[:, 2] - ended[:, 2]) - started[:, 3] + ended[:, 3],
+            ))
+
+        overlap = covered(b) - covered(a)
+        # Интервалы с перекрытием не больше MIN_OVERLAP: кончаются в (a, a + h] или начинаются в [b - h, b)
+        tail = sums(ends, pre_end, a + MIN_OVERLAP, 'right') - sums(ends, pre_end, a, 'right')
+        head = sums(starts, pre_start, b, 'left') - sums(starts, pre_start, b - MIN_OVERLAP, 'left')
+        overlap[:, 0] -= tail[:, 1] - a * tail[:, 0] + b * head[:, 0] - head[:, 1]
+        overlap[:, 1] -= tail[:, 3] - a * tail[:, 2] + b * head[:, 2] - head[:, 3]
+
+        # Любой учтённый интервал даёт вес больше MIN_OVERLAP; меньшее — ошибка округления
+        ok = (b - a >= MIN_SEGMENT) & (overlap[:, 0] > MIN_OVERLAP / 2)
+        out[ok] = overlap[ok, 1] / overlap[ok, 0]
+        return out
+
+    def get(self, rid, default=None):
+        return self.intervals(rid) or default
+
+    def to_arrays(self):
+        return {
+            'profile_route_ids': self.route_ids,
+            'profile_offsets': self.offsets,
+            'profile_starts': self.starts,
+            'profile_ends': self.ends,
+            'profile_speeds': self.speeds,
+        }
+
+    @classmethod
+    def from_arrays(cls, arrays):
+        return cls(np.asarray(arrays['profile_route_ids']), np.asarray(arrays['profile_offsets']),
+                   np.asarray(arrays['profile_starts']), np.asarray(arrays['profile_ends']),
+                   np.asarray(arrays['profile_speeds']))
@@ -0,0 +1,310 @@
+"""
+Поверхность времени пути: растр времён по одному поиску и изохроны по ней.
+
+Времена узлов из одного поиска переносятся на регулярную сетку:
+    node — время ближайшего достигнутого узла плюс подход от него;
+    edge — время на ближайшем звене графа в точке проекции (по меньшему
+           из двух концов) плюс подход от звена.
+Подход — по прямой с заданной скоростью не дальше max_walk_off.
+Растр пишется в GeoTIFF (GDAL) и режется на полигоны изохрон для любого
+списка порогов без повторного поиска: порог — маска ячеек, контур маски
+обходится в numpy, полигоны собираются в QgsGeometry.
+"""
+import math
+
+import numpy as np
+
+from .elevation import MAX_GRID_CELLS
+from .snapping import QUERY_CHUNK, NodeGrid, SegmentGrid
+
+RULE_NODE = 'node'
+RULE_EDGE = 'edge'
+SURFACE_RULES = (RULE_NODE, RULE_EDGE)
+
+DEFAULT_SURFACE_CELL = 25.0   # м
+DEFAULT_MAX_WALK_OFF = 150.0  # м, дальше от сети ячейка считается недостижимой
+NODATA = -1.0                 # значение «нет данных» в GeoTIFF
+
+# Направления звеньев контура: восток, север, запад, юг (против часовой стрелки)
+_STEP_ROW = np.array([0, -1, 0, 1])
+_STEP_COL = np.array([1, 0, -1, 0])
+
+
+class TimeSurface:
+    """
+    Растр времён пути (секунды, float32); строка 0 — верхний край (y_top), NaN — недостижимо.
+
+    Та же раскладка, что у ElevationGrid.
+    """
+
+    def __init__(self, values, x0, y_top, cell_size):
+        self.values = values
+        self.x0 = float(x0)
+        self.y_top = float(y_top)
+        self.cell_size = float(cell_size)
+
+    @property
+    def shape(self):
+        return self.values.shape
+
+    @property
+    def extent(self):
+        rows, cols = self.values.shape
+        return (self.x0, self.y_top - rows * self.cell_size, self.x0 + cols * self.cell_size, self.y_top)
+
+    @classmethod
+    def build(cls, node_xy, node_times, max_time, walk_speed_mps, cell_size=DEFAULT_SURFACE_CELL,
+              rule=RULE_NODE, links=None, max_walk_off=DEFAULT_MAX_WALK_OFF):
+        """
+        Parameters:
+        -----------
+        node_xy : ndarray (N, 2)
+            Координаты узлов графа
+        node_times : ndarray (N,)
+            Время до узла, с (inf — не достигнут), например SearchResult.to_dense
+        max_time : float
+            Наибольшее время поверхности, с; дальше — NaN
+        walk_speed_mps : float
+            Скорость подхода от сети к центру ячейки
+        rule : str
+            'node' или 'edge' (нужны links)
+        links : tuple
+            (u, v, cost) звеньев графа, стоимость в секундах (WalkGraph.links)
+        max_walk_off : float
+            Наибольшее расстояние подхода от сети, м
+        """
+        node_xy = np.asarray(node_xy, dtype=np.float64).reshape(-1, 2)
+        node_times = np.asarray(node_times, dtype=np.float64)
+        if rule not in SURFACE_RULES:
+            raise Exception(f"Неизвестное правило поверхности: {rule}")
+        reached = np.flatnonzero(node_times <= max_time)
+        if len(reached) == 0:
+            raise Exception("Нет достигнутых узлов для поверхности времени")
+
+        if rule == RULE_EDGE:
+            if links is None:
+                raise Exception("Для правила 'edge' нужны звенья графа (links)")
+            u, v, cost = (np.asarray(a) for a in links)
+            near = np.minimum(node_times[u], node_times[v]) <= max_time
+            u, v, cost = u[near], v[near], np.asarray(cost, dtype=np.float64)[near]
+            if len(u) == 0:
+                # Достигнуты только узлы без звеньев (например, один старт) — время по узлам
+                rule = RULE_NODE
+        if rule == RULE_EDGE:
+            index = SegmentGrid.build(node_xy[u], node_xy[v])
+            lo = np.minimum(node_xy[u].min(axis=0), node_xy[v].min(axis=0))
+            hi = np.maximum(node_xy[u].max(axis=0), node_xy[v].max(axis=0))
+        else:
+            index = NodeGrid.build(node_xy[reached])
+            lo = node_xy[reached].min(axis=0)
+            hi = node_xy[reached].max(axis=0)
+
+        lo = lo - max_walk_off
+        hi = hi + max_walk_off
+        width, height = hi - lo
+        if (width / cell_size) * (height / cell_size) > MAX_GRID_CELLS:
+            cell_size = math.sqrt(width * height / MAX_GRID_CELLS)
+        nx = int(math.ceil(width / cell_size))
+        ny = int(math.ceil(height / cell_size))
+        surface = cls(np.full((ny, nx), np.nan, dtype=np.float32), lo[0], hi[1], cell_size)
+
+        # Центры ячеек — полосами строк, чтобы не держать в памяти все сразу
+        xs = lo[0] + (np.arange(nx) + 0.5) * cell_size
+        rows_per_block = max(1, QUERY_CHUNK // nx)
+        for r0 in range(0, ny, rows_per_block):
+            rows = np.arange(r0, min(ny, r0 + rows_per_block))
+            ys = hi[1] - (rows + 0.5) * cell_size
+            xy = np.column_stack((np.tile(xs, len(rows)), np.repeat(ys, nx)))
+            if rule == RULE_EDGE:
+                seg, dist, t = index.nearest_many(xy, max_walk_off)
+                ok = seg >= 0
+                s = seg[ok]
+                at_link = np.minimum(node_times[u[s]] + t[ok] * cost[s], node_times[v[s]] + (1.0 - t[ok]) * cost[s])
+            else:
+                node, dist = index.nearest_many(xy, max_walk_off)
+                ok = node >= 0
+                at_link = node_times[reached[node[ok]]]
+            times = np.full(len(xy), np.nan)
+            times[ok] = at_link + dist[ok] / walk_speed_mps
+            times[times > max_time] = np.nan
+            surface.values[rows] = times.reshape(len(rows), nx)
+        return surface
+
+    def sample(self, xs, ys):
+        """Время в точках; вне растра и недостижимые — NaN."""
+        xs = np.asarray(xs, dtype=np.float64)
+        ys = np.asarray(ys, dtype=np.float64)
+        rows, cols = self.values.shape
+        col = np.floor((xs - self.x0) / self.cell_size).astype(np.int64)
+        row = np.floor((self.y_top - ys) / self.cell_size).astype(np.int64)
+        inside = (col >= 0) & (col < cols) & (row >= 0) & (row < rows)
+        out = np.full(xs.shape, np.nan, dtype=np.float64)
+        out[inside] = self.values[row[inside], col[inside]]
+        return out
+
+    def write_geotiff(self, path, crs_wkt=None, minutes=True):
+        """
+        Пишет растр в GeoTIFF через GDAL (в минутах или секундах; недостижимо — NODATA).
+
+        Returns:
+        --------
+        str: путь к файлу
+        """
+        from osgeo import gdal
+
+        rows, cols = self.values.shape
+        ds = gdal.GetDriverByName('GTiff').Create(path, cols, rows, 1, gdal.GDT_Float32,
+                                                  options=['COMPRESS=DEFLATE', 'TILED=YES'])
+        if ds is None:
+            raise Exception(f"Не удалось создать GeoTIFF: {path}")
+        ds.SetGeoTransform((self.x0, self.cell_size, 0.0, self.y_top, 0.0, -self.cell_size))
+        if crs_wkt:
+            ds.SetProjection(crs_wkt)
+        band = ds.GetRasterBand(1)
+        values = self.values / 60.0 if minutes else self.values
+        band.WriteArray(np.where(np.isnan(values), NODATA, values).astype(np.float32))
+        band.SetNoDataValue(NODATA)
+        band.FlushCache()
+        ds = None
+        return path
+
+    @classmethod
+    def from_geotiff(cls, path, minutes=True):
+        """Читает растр, записанный write_geotiff (для новых порогов без поиска)."""
+        from .elevation import ElevationGrid
+
+        grid = ElevationGrid.from_raster_file(path)
+        values = grid.values * 60.0 if minutes else grid.values
+        return cls(values.astype(np.float32), grid.x0, grid.y_top, grid.cell_w)
+
+    def rings(self, threshold):
+        """
+        Контуры области «время ≤ threshold» в координатах CRS.
+
+        Returns:
+        --------
+        list: массивы (K + 1, 2) замкнутых колец; внешние — против часовой
+              стрелки, дыры — по часовой
+        """
+        with np.errstate(invalid='ignore'):
+            mask = self.values <= threshold
+        return [np.column_stack((self.x0 + ring[:, 1] * self.cell_size, self.y_top - ring[:, 0] * self.cell_size))
+                for ring in mask_rings(mask)]
+
+    def polygon(self, threshold, min_area=0.0):
+        """
+        Полигон изохроны порога threshold (QgsGeometry или None).
+
+        Кольца площадью меньше min_area (островки и дыры из отдельных
+        ячеек) отбрасываются.
+        """
+        from qgis.core import QgsGeometry, QgsPointXY
+
+        rings = [(ring_area(r), r) for r in self.rings(threshold)]
+        rings = [(a, r) for a, r in rings if abs(a) > min_area]
+        # От больших колец к меньшим: внешние добавляются, дыры вырезаются — вложенные
+        # островки обрабатываются после дыр, в которых лежат
+        rings.sort(key=lambda item: -abs(item[0]))
+        result = None
+        for area, ring in rings:
+            geom = QgsGeometry.fromPolygonXY([[QgsPointXY(x, y) for x, y in ring.tolist()]])
+            if area > 0:
+                result = geom if result is None else result.combine(geom)
+            elif result is not None:
+                result = result.difference(geom)
+        return result
+
+    def polygons(self, thresholds, min_area=0.0):
+        """Полигоны изохрон для списка порогов (секунды) из одного растра."""
+        return [self.polygon(threshold, min_area) for threshold in thresholds]
+
+
+def ring_area(ring):
+    """Площадь кольца со знаком (против часовой стрелки — положительная)."""
+    x, y = ring[:, 0], ring[:, 1]
+    return 0.5 * float(np.dot(x[:-1], y[1:]) - np.dot(x[1:], y[:-1]))
+
+
+def mask_rings(mask):
+    """
+    Контуры булевой маски (ny, nx) по границам ячеек.
+
+    Каждая граница ячейки маски с ячейкой вне её — звено, направленное так,
+    что маска слева (в координатах карты, строки идут вниз). В вершине,
+    где маска касается себя по диагонали, выбирается поворот налево —
+    диагональные ячейки остаются в разных кольцах. В кольце остаются
+    только вершины поворотов.
+
+    Returns:
+    --------
+    list: массивы (K + 1, 2) вершин (строка, столбец) замкнутых колец
+    """
+    mask = np.asarray(mask, dtype=bool)
+    ny, nx = mask.shape
+    padded = np.zeros((ny + 2, nx + 2), dtype=bool)
+    padded[1:-1, 1:-1] = mask
+    width = nx + 1
+
+    starts, dirs = [], []
+    # Звено задаётся начальной вершиной (строка, столбец) и направлением
+    for direction, outside, d_row, d_col in (
+            (2, ~padded[:-2, 1:-1], 0, 1),   # верх ячейки: на запад из правого верхнего угла
+            (0, ~padded[2:, 1:-1], 1, 0),    # низ: на восток из левого нижнего
+            (3, ~padded[1:-1, :-2], 0, 0),   # левый край: на юг из левого верхнего
+            (1, ~padded[1:-1, 2:], 1, 1)):   # правый край: на север из правого нижнего
+        r, c = np.nonzero(mask & outside)
+        starts.append((r + d_row) * width + c + d_col)
+        dirs.append(np.full(len(r), direction))
+    start = np.concatenate(starts)
+    direction = np.concatenate(dirs)
+    if len(start) == 0:
+        return []
+    end = start + _STEP_ROW[direction] * width + _STEP_COL[direction]
+
+    # Следующее звено: выходящее из конца; из двух (касание по диагонали) — поворот налево
+    order = np.lexsort((direction, start))
+    start_sorted = start[order]
+    first_out = np.searchsorted(start_sorted, end, side='left')
+    n_out = np.searchsorted(start_sorted, end, side='right') - first_out
+    nxt = order[np.minimum(first_out, len(order) - 1)]
+    two = np.flatnonzero(n_out == 2)
+    if len(two):
+        left = (direction[two] + 1) % 4
+        second = order[first_out[two] + 1]
+        nxt[two] = np.where(direction[second] == left, second, nxt[two])
+
+    nxt_l = nxt.tolist()
+    dir_l = direction.tolist()
+    start_l = start.tolist()
+    visited = bytearray(len(start_l))
+    rings = []
+    for e0 in range(len(start_l)):
+        if visited[e0]:
+            continue
+        vertices = []
+        e = e0
+        while not visited[e]:
+            visited[e] = 1
+            nxt_e = nxt_l[e]
+            if dir_l[nxt_e] != dir_l[e]:
+                vertices.append(start_l[nxt_e])  # поворот — в начале следующего звена
+            e = nxt_e
+        if len(vertices) < 3:
+            continue
+        vertices.append(vertices[0])
+        v = np.array(vertices, dtype=np.int64)
+        rings.append(np.column_stack((v // width, v % width)).astype(np.float64))
+    return rings
+
+
+def parse_thresholds(text):
+    """Пороги в минутах из строки '5, 7.5, 12' → список секунд по возрастанию."""
+    values = []
+    for part in str(text or '').replace(';', ',').split(','):
+        part = part.strip().replace(' ', '')
+        if part:
+            try:
+                values.append(float(part.replace(',', '.')) * 60.0)
+            except ValueError:
+                raise Exception(f"Порог изохроны должен быть числом минут: '{part}'")
+    return sorted(set(v for v in values if v > 0))
@@ -0,0 +1,340 @@
+"""
+Синтетический город для замеров производительности без слоёв проекта.
+
+Все данные строятся в метровой CRS и воспроизводимы по seed:
+    улицы      — регулярная сетка или «органическая» (искривлённая, с
+                 выброшенными отрезками и диагоналями); линиями или, как
+                 тоже принимает Task4, полигонами кварталов;
+    ОТ         — маршруты вдоль части улиц с HEADWAY/TRAVELTIME/LENGTH/
+                 TSYSCODE, остановки на них и GPS-треки с шумом;
+    рельеф     — квадратные полигоны интервалов высот (поля MIN/MAX, как
+                 у слоя SRTM_Irkutsk_Poligon_Interval_1);
+    здания     — квадраты внутри кварталов с населением (поле 'Насел');
+    районы     — крупные квадраты с полем NO (для Task5).
+
+Генерация — только numpy; запись в GeoPackage (write_geopackage) требует
+QGIS и импортирует его при вызове.
+"""
+import math
+
+import numpy as np
+
+DEFAULT_SPACING = 100.0        # м между перекрёстками
+DEFAULT_ROUTE_EVERY = 6        # маршрут по каждой 6-й улице
+DEFAULT_STOP_EVERY = 4         # остановка на каждом 4-м перекрёстке маршрута
+DEFAULT_TRACKS_PER_ROUTE = 3
+DEFAULT_BUILDINGS_PER_BLOCK = 2
+DEFAULT_DISTRICTS = 8          # районов по стороне
+STOP_OFFSET = 8.0              # м от оси маршрута до остановки
+TRACK_STEP = 30.0              # м между точками трека
+TRACK_NOISE = 5.0              # м, СКО шума GPS
+MAX_ELEVATION_POLYGONS = 40000
+
+CITY_KINDS = ('grid', 'organic')
+
+
+class SyntheticCity:
+    """
+    Набор входных данных одного синтетического города.
+
+    roads — список массивов (K, 2) (для полигонов — замкнутые кольца кварталов);
+    routes — список словарей rid, xy, HEADWAY, TRAVELTIME, LENGTH, TSYSCODE;
+    stops_route_map — rid → [(stop_id, measure, (x, y)), ...] по порядку вдоль маршрута.
+    """
+
+    def __init__(self, kind, spacing, roads, road_polygons, stop_xy, routes, stops_route_map,
+                 track_xy, track_offsets, track_speeds, elevation, building_rings,
+                 building_population, districts, extent):
+        self.kind = kind
+        self.spacing = spacing
+        self.roads = roads
+        self.road_polygons = road_polygons
+        self.stop_xy = stop_xy
+        self.routes = routes
+        self.stops_route_map = stops_route_map
+        self.track_xy = track_xy
+        self.track_offsets = track_offsets
+        self.track_speeds = track_speeds
+        self.elevation = elevation
+        self.building_rings = building_rings
+        self.building_population = building_population
+        self.districts = districts
+        self.extent = extent
+
+    @property
+    def num_segments(self):
+        return int(sum(len(part) - 1 for part in self.roads))
+
+    @property
+    def building_centroids(self):
+        return self.building_rings.mean(axis=1)
+
+    def center(self):
+        xmin, ymin, xmax, ymax = self.extent
+        return (xmin + xmax) / 2.0, (ymin + ymax) / 2.0
+
+    def summary(self):
+        return {
+            'kind': self.kind,
+            'road_polygons': self.road_polygons,
+            'segments': self.num_segments,
+            'stops': len(self.stop_xy),
+            'routes': len(self.routes),
+            'tracks': len(self.track_speeds),
+            'elevation_polygons': len(self.elevation),
+            'buildings': len(self.building_rings),
+            'population': float(self.building_population.sum()),
+            'extent_km': round((self.extent[2] - self.extent[0]) / 1000.0, 2),
+        }
+
+
+def _grid_nodes(n, spacing, kind, rng):
+    """Координаты перекрёстков (n, n, 2); для organic — искривление и шум."""
+    base = np.arange(n) * spacing
+    xs, ys = np.meshgrid(base, base)  # [строка j, столбец i]
+    if kind == 'organic':
+        wave = spacing * 8.0
+        xs = xs + 0.25 * spacing * np.sin(ys / wave) + rng.normal(0.0, 0.08 * spacing, xs.shape)
+        ys = ys + 0.25 * spacing * np.sin(xs / (wave * 1.3)) + rng.normal(0.0, 0.08 * spacing, ys.shape)
+    return np.stack((xs, ys), axis=-1)
+
+
+def _split_runs(line, keep):
+    """Части ломаной line (K, 2) по непрерывным участкам сохранённых отрезков keep (K-1,)."""
+    parts = []
+    start = None
+    for i, k in enumerate(keep.tolist()):
+        if k and start is None:
+            start = i
+        elif not k and start is not None:
+            parts.append(line[start:i + 1])
+            start = None
+    if start is not None:
+        parts.append(line[start:])
+    return parts
+
+
+def _street_lines(nodes, kind, rng):
+    n = nodes.shape[0]
+    lines = [nodes[j, :, :] for j in range(n)] + [nodes[:, i, :] for i in range(n)]
+    if kind != 'organic':
+        return lines
+    roads = []
+    for line in lines:
+        roads.extend(_split_runs(line, rng.random(n - 1) > 0.12))
+    # Диагональные проезды через часть кварталов
+    diag = rng.random((n - 1, n - 1)) < 0.05
+    for j, i in zip(*np.nonzero(diag)):
+        roads.append(np.array([nodes[j, i], nodes[j + 1, i + 1]]))
+    return roads
+
+
+def _block_rings(nodes):
+    """Кольца кварталов (n-1)^2 × (5, 2) — для улиц в виде полигонов."""
+    a = nodes[:-1, :-1]
+    b = nodes[:-1, 1:]
+    c = nodes[1:, 1:]
+    d = nodes[1:, :-1]
+    rings = np.stack((a, b, c, d, a), axis=2)
+    return list(rings.reshape(-1, 5, 2))
+
+
+def _routes(nodes, route_every, stop_every, rng):
+    """Маршруты по каждой route_every-й улице в обоих направлениях сетки и остановки на них."""
+    n = nodes.shape[0]
+    routes = []
+    stops_route_map = {}
+    stop_xy = []
+    lines = [nodes[j, :, :] for j in range(route_every // 2, n, route_every)]
+    lines += [nodes[:, i, :] for i in range(route_every // 2, n, route_every)]
+    for rid, xy in enumerate(lines):
+        seg = np.hypot(*(xy[1:] - xy[:-1]).T)
+        measures = np.concatenate(([0.0], np.cumsum(seg)))
+        length = float(measures[-1])
+        tsys = 'T' if rng.random() < 0.25 else 'A'
+        headway_min = int(rng.choice((5, 7, 10, 15, 20)))
+        speed = rng.uniform(5.0, 9.0)
+        routes.append({
+            'rid': rid,
+            'xy': xy,
+            # Как в реальных данных: интервал то числом (сек), то строкой с минутами
+            'HEADWAY': headway_min * 60 if rng.random() < 0.5 else f"{headway_min} мин",
+            'TRAVELTIME': round(length / speed, 1) if rng.random() < 0.7 else None,
+            'LENGTH': f"{length / 1000.0:.2f} km",
+            'TSYSCODE': tsys,
+        })
+        items = []
+        for k in range(0, len(xy), stop_every):
+            # Остановка сбоку от оси, по нормали к отрезку
+            a = xy[min(k, len(xy) - 2)]
+            b = xy[min(k, len(xy) - 2) + 1]
+            d = (b - a) / max(np.hypot(*(b - a)), 1e-9)
+            pt = xy[k] + STOP_OFFSET * np.array((-d[1], d[0]))
+            items.append((len(stop_xy), float(measures[k]), (float(pt[0]), float(pt[1]))))
+            stop_xy.append(pt)
+        stops_route_map[rid] = items
+    return routes, stops_route_map, np.array(stop_xy, dtype=np.float64).reshape(-1, 2)
+
+
+def _tracks(routes, tracks_per_route, rng):
+    """GPS-треки: случайный участок маршрута с шагом TRACK_STEP и шумом, скорость на трек."""
+    parts, offsets, speeds = [], [0], []
+    for route in routes:
+        xy = route['xy']
+        seg = np.hypot(*(xy[1:] - xy[:-1]).T)
+        measures = np.concatenate(([0.0], np.cumsum(seg)))
+        length = measures[-1]
+        for _ in range(tracks_per_route):
+            m0 = rng.uniform(0.0, 0.5) * length
+            m1 = m0 + rng.uniform(0.3, 0.5) * length
+            m = np.arange(m0, min(m1, length), TRACK_STEP)
+            if len(m) < 2:
+                continue
+            pts = np.column_stack((np.interp(m, measures, xy[:, 0]), np.interp(m, measures, xy[:, 1])))
+            parts.append(pts + rng.normal(0.0, TRACK_NOISE, pts.shape))
+            offsets.append(offsets[-1] + len(pts))
+            speeds.append(rng.uniform(4.0, 12.0))
+    track_xy = np.concatenate(parts) if parts else np.zeros((0, 2), dtype=np.float64)
+    return track_xy, np.array(offsets, dtype=np.int64), np.array(speeds, dtype=np.float64)
+
+
+def _elevation(extent, rng):
+    """Квадраты с интервалами высот 10 м по гладкому полю (холмы и долины)."""
+    xmin, ymin, xmax, ymax = extent
+    side = max(xmax - xmin, ymax - ymin)
+    cell = max(250.0, side / math.sqrt(MAX_ELEVATION_POLYGONS))
+    phase = rng.uniform(0.0, 2.0 * math.pi, 2)
+    polygons = []
+    for y0 in np.arange(ymin, ymax, cell):
+        for x0 in np.arange(xmin, xmax, cell):
+            cx, cy = x0 + cell / 2.0, y0 + cell / 2.0
+            h = (430.0 + 60.0 * math.sin(cx / 3000.0 + phase[0]) * math.cos(cy / 4000.0 + phase[1])
+                 + 20.0 * math.sin((cx + cy) / 900.0))
+            low = math.floor(h / 10.0) * 10.0
+            ring = np.array([(x0, y0), (x0 + cell, y0), (x0 + cell, y0 + cell), (x0, y0 + cell), (x0, y0)])
+            polygons.append(([ring], low, low + 10.0))
+    return polygons
+
+
+def _buildings(nodes, per_block, rng):
+    """Квадратные здания ближе к центру кварталов; у ~60% есть жители."""
+    n = nodes.shape[0]
+    spacing = float(np.median(np.hypot(*(nodes[0, 1:] - nodes[0, :-1]).T)))
+    centers = (nodes[:-1, :-1] + nodes[:-1, 1:] + nodes[1:, 1:] + nodes[1:, :-1]).reshape(-1, 2) / 4.0
+    centers = np.repeat(centers, per_block, axis=0)
+    centers = centers + rng.uniform(-0.2 * spacing, 0.2 * spacing, centers.shape)
+    half = rng.uniform(5.0, 12.5, len(centers))[:, None]
+    corners = np.array([(-1, -1), (1, -1), (1, 1), (-1, 1), (-1, -1)], dtype=np.float64)
+    rings = centers[:, None, :] + half[:, :, None] * corners[None, :, :]
+    residential = rng.random(len(centers)) < 0.6
+    population = np.where(residential, rng.integers(1, 150, len(centers)), 0).astype(np.float64)
+    return rings, population
+
+
+def _districts(extent, count):
+    xmin, ymin, xmax, ymax = extent
+    xs = np.linspace(xmin, xmax, count + 1)
+    ys = np.linspace(ymin, ymax, count + 1)
+    districts = []
+    for j in range(count):
+        for i in range(count):
+            ring = np.array([(xs[i], ys[j]), (xs[i + 1], ys[j]), (xs[i + 1], ys[j + 1]),
+                             (xs[i], ys[j + 1]), (xs[i], ys[j])])
+            districts.append((j * count + i + 1, ring))
+    return districts
+
+
+def generate_city(segments=10000, kind='grid', road_polygons=False, seed=0, spacing=DEFAULT_SPACING,
+                  route_every=DEFAULT_ROUTE_EVERY, stop_every=DEFAULT_STOP_EVERY,
+                  tracks_per_route=DEFAULT_TRACKS_PER_ROUTE,
+                  buildings_per_block=DEFAULT_BUILDINGS_PER_BLOCK, districts=DEFAULT_DISTRICTS):
+    """
+    Синтетический город примерно на segments отрезков улиц.
+
+    Parameters:
+    -----------
+    segments : int
+        Целевое число отрезков (сетка n×n даёт 2·n·(n-1))
+    kind : str
+        'grid' или 'organic'
+    road_polygons : bool
+        Улицы как кольца кварталов (Task4 берёт границы полигонов)
+
+    Returns:
+    --------
+    SyntheticCity
+    """
+    if kind not in CITY_KINDS:
+        raise Exception(f"Неизвестный вид города: {kind}")
+    rng = np.random.default_rng(seed)
+    n = max(int(math.ceil(math.sqrt(segments / 2.0))) + 1, 3)
+    nodes = _grid_nodes(n, spacing, kind, rng)
+    flat = nodes.reshape(-1, 2)
+    extent = (float(flat[:, 0].min()), float(flat[:, 1].min()),
+              float(flat[:, 0].max()), float(flat[:, 1].max()))
+
+    roads = _block_rings(nodes) if road_polygons else _street_lines(nodes, kind, rng)
+    routes, stops_route_map, stop_xy = _routes(nodes, route_every, stop_every, rng)
+    track_xy, track_offsets, track_speeds = _tracks(routes, tracks_per_route, rng)
+    building_rings, building_population = _buildings(nodes, buildings_per_block, rng)
+    return SyntheticCity(kind, spacing, roads, road_polygons, stop_xy, routes, stops_route_map,
+                         track_xy, track_offsets, track_speeds, _elevation(extent, rng),
+                         building_rings, building_population, _districts(extent, districts), extent)
+
+
+def write_geopackage(city, path, crs='EPSG:32648'):
+    """
+    Записывает город в GeoPackage слоями с именами, которые ищут Task4, Task5 и second.py.
+
+    Требует инициализированный QGIS (см. headless.start_qgis).
+    """
+    from qgis.core import QgsFeature, QgsField, QgsGeometry, QgsPointXY, QgsVectorLayer
+    from qgis.PyQt.QtCore import QVariant
+
+    from .headless import TASK4_LAYER_NAMES, write_layer
+
+    def polyline(xy):
+        return QgsGeometry.fromPolylineXY([QgsPointXY(x, y) for x, y in xy.tolist()])
+
+    def polygon(rings):
+        return QgsGeometry.fromPolygonXY([[QgsPointXY(x, y) for x, y in ring.tolist()] for ring in rings])
+
+    def layer(geometry, name, fields, rows):
+        lyr = QgsVectorLayer(f"{geometry}?crs={crs}", name, "memory")
+        lyr.dataProvider().addAttributes([QgsField(f, t) for f, t in fields])
+        lyr.updateFields()
+        features = []
+        for geom, attrs in rows:
+            feat = QgsFeature(lyr.fields())
+            feat.setGeometry(geom)
+            feat.setAttributes(list(attrs))
+            features.append(feat)
+        lyr.dataProvider().addFeatures(features)
+        write_layer(lyr, path, name)
+
+    road_geom = (lambda xy: polygon([xy])) if city.road_polygons else polyline
+    road_rows = [(road_geom(xy), []) for xy in city.roads]
+    layer('Polygon' if city.road_polygons else 'LineString', TASK4_LAYER_NAMES['roads'], [], road_rows)
+    # Task5 и second.py работают по линиям дорог
+    street_rows = road_rows if not city.road_polygons else [(polyline(xy), []) for xy in city.roads]
+    layer('LineString', 'ispravlenny_uds', [], street_rows)
+    layer('Point', TASK4_LAYER_NAMES['stops'], [('stop_no', QVariant.Int)],
+          ((QgsGeometry.fromPointXY(QgsPointXY(x, y)), [i]) for i, (x, y) in enumerate(city.stop_xy.tolist())))
+    layer('LineString', TASK4_LAYER_NAMES['routes'],
+          [('HEADWAY', QVariant.String), ('TRAVELTIME', QVariant.Double),
+           ('LENGTH', QVariant.String), ('TSYSCODE', QVariant.String)],
+          ((polyline(r['xy']), [str(r['HEADWAY']), r['TRAVELTIME'], r['LENGTH'], r['TSYSCODE']])
+           for r in city.routes))
+    lengths = [float(np.hypot(*(city.track_xy[a + 1:b] - city.track_xy[a:b - 1]).T).sum())
+               for a, b in zip(city.track_offsets[:-1].tolist(), city.track_offsets[1:].tolist())]
+    layer('LineString', TASK4_LAYER_NAMES['tracks'], [('duration', QVariant.Double)],
+          ((polyline(city.track_xy[a:b]), [length / speed])
+           for a, b, length, speed in zip(city.track_offsets[:-1].tolist(), city.track_offsets[1:].tolist(),
+                                          lengths, city.track_speeds.tolist())))
+    layer('Polygon', TASK4_LAYER_NAMES['elevation'], [('MIN', QVariant.Double), ('MAX', QVariant.Double)],
+          ((polygon(rings), [low, high]) for rings, low, high in city.elevation))
+    layer('Polygon', TASK4_LAYER_NAMES['buildings'], [('Насел', QVariant.Double)],
+          ((polygon([ring]), [pop]) for ring, pop in zip(city.building_rings, city.building_population.tolist())))
+    layer('Polygon', 'Укрупненные_mainzone', [('NO', QVariant.Int)],
+          ((polygon([ring]), [no]) for no, ring in city.districts))
+    return path
@@ -0,0 +1,367 @@
+"""
+Топология сети общественного транспорта.
+
+TransitIndex строится один раз из привязки остановок к маршрутам
+(stops_route_map) и отвечает за O(1) на вопросы «какие маршруты у
+остановки», «какие остановки у маршрута по порядку» и «сколько ждать».
+Пешие времена пересадок считаются пакетно и сохраняются в кэш графа.
+multigraph_search — Dijkstra по мультиграфу остановок; raptor_search —
+поиск по раундам (RAPTOR для частотного расписания) с ограничением числа
+пересадок и времени; StopTimeTable — предрасчитанные им времена
+остановка → остановка для мгновенных запросов от любого старта.
+"""
+import heapq
+import math
+from collections import defaultdict
+
+import numpy as np
+
+from .search import bounded_search
+
+DEFAULT_WAIT = 300.0  # сек, если ни у одного маршрута остановки нет HEADWAY
+DEFAULT_MAX_TRANSFERS = 3
+TABLE_THRESHOLD = 3600.0  # сек, дальше пары остановок в таблицу не попадают
+
+
+class TransitIndex:
+    """
+    Индексы stop → routes, route → упорядоченные остановки
+    и минимальный интервал движения по остановке.
+    """
+
+    def __init__(self, stops_route_map, route_headway, default_wait=DEFAULT_WAIT):
+        """
+        Parameters:
+        -----------
+        stops_route_map : dict
+            rid → [(stop_id, measure, point), ...], отсортированные по measure
+        route_headway : dict
+            rid → интервал движения в секундах (или None)
+        """
+        self.default_wait = default_wait
+        self.route_headway = dict(route_headway)
+        self.route_stops = {}
+        self.route_positions = {}
+        self.stop_routes = defaultdict(list)
+        self.stop_min_headway = {}
+        for rid, items in stops_route_map.items():
+            self.route_stops[rid] = [stop_id for stop_id, _, _ in items]
+            positions = {}
+            for i, (stop_id, _, _) in enumerate(items):
+                positions.setdefault(stop_id, i)
+            self.route_positions[rid] = positions
+            headway = route_headway.get(rid)
+            for stop_id, _, _ in items:
+                routes = self.stop_routes[stop_id]
+                if rid not in routes:
+                    routes.append(rid)
+                if headway:
+                    current = self.stop_min_headway.get(stop_id)
+                    if current is None or headway < current:
+                        self.stop_min_headway[stop_id] = headway
+
+    def routes_at(self, stop_id):
+        """Маршруты, к которым привязана остановка (пустой список, если ни одного)."""
+        return self.stop_routes.get(stop_id, [])
+
+    def stops_of(self, rid):
+        """Остановки маршрута в порядке следования."""
+        return self.route_stops.get(rid, [])
+
+    def wait_time(self, stop_id):
+        """Ожидание на остановке: половина минимального интервала движения."""
+        headway = self.stop_min_headway.get(stop_id)
+        return headway / 2.0 if headway else self.default_wait
+
+    def boarding_wait(self, rid, stop_id):
+        """Ожидание конкретного маршрута: половина его интервала (иначе — как wait_time)."""
+        headway = self.route_headway.get(rid)
+        return headway / 2.0 if headway else self.wait_time(stop_id)
+
+    @property
+    def num_route_stops(self):
+        return sum(len(v) for v in self.route_stops.values())
+
+
+def transfer_walk_times(graph, pairs, stop_nodes, walk_speed_mps, max_time):
+    """
+    Пешие времена пересадок: один ограниченный поиск на остановку-источник.
+
+    Parameters:
+    -----------
+    graph : WalkGraph
+        Пешеходный граф (стоимости в секундах)
+    pairs : iterable
+        Тройки (stop_a, stop_b, расстояние по прямой)
+    stop_nodes : dict
+        stop_id → (узел графа или None, расстояние от остановки до узла)
+    max_time : float
+        Граница поиска, сек; дальше — время по прямой
+
+    Returns:
+    --------
+    dict: (stop_a, stop_b) → секунды
+    """
+    by_source = defaultdict(list)
+    for stop_a, stop_b, direct in pairs:
+        by_source[stop_a].append((stop_b, direct))
+
+    speed = max(walk_speed_mps, 0.1)
+    times = {}
+    for stop_a, targets in by_source.items():
+        node_a, offset_a = stop_nodes.get(stop_a, (None, None))
+        result = bounded_search(graph, node_a, max_time) if node_a is not None else None
+        for stop_b, direct in targets:
+            node_b, offset_b = stop_nodes.get(stop_b, (None, None))
+            t = result.time_of(node_b) if result is not None and node_b is not None else math.inf
+            if math.isfinite(t):
+                t += (offset_a or 0.0) / speed + (offset_b or 0.0) / speed
+            else:
+                t = direct / walk_speed_mps
+            times[(stop_a, stop_b)] = t
+    return times
+
+
+def transfer_table_arrays(times):
+    """Словарь времён пересадок → массивы для graph_cache."""
+    keys = list(times.keys())
+    return {
+        'transfer_from': np.array([a for a, _ in keys], dtype=np.int64),
+        'transfer_to': np.array([b for _, b in keys], dtype=np.int64),
+        'transfer_sec': np.array([times[k] for k in keys], dtype=np.float64),
+    }
+
+
+def transfer_table_from_arrays(arrays):
+    return {(a, b): t for a, b, t in zip(arrays['transfer_from'].tolist(),
+                                          arrays['transfer_to'].tolist(),
+                                          arrays['transfer_sec'].tolist())}
+
+
+def multigraph_search(edges, num_nodes, source=0):
+    """
+    Dijkstra по мультиграфу остановок (узел 0 — старт).
+
+    Parameters:
+    -----------
+    edges : dict
+        узел → [(узел2, сек, тип ребра), ...]; типы: посадка, перегон, пересадка
+
+    Returns:
+    --------
+    tuple: (список времён по узлам, число извлечений из кучи)
+    """
+    dist = [math.inf] * num_nodes
+    dist[source] = 0.0
+    heap = [(0.0, source)]
+    visited = [False] * num_nodes
+    pops = 0
+    while heap:
+        d_u, u = heapq.heappop(heap)
+        pops += 1
+        if visited[u]:
+            continue
+        visited[u] = True
+        for v, w, _etype in edges.get(u, ()):
+            nd = d_u + w
+            if nd < dist[v]:
+                dist[v] = nd
+                heapq.heappush(heap, (nd, v))
+    return dist, pops
+
+
+def raptor_search(index, access_times, ride_times, footpaths, cutoff,
+                  max_transfers=DEFAULT_MAX_TRANSFERS):
+    """
+    Поиск по раундам (RAPTOR) для маршрутов с интервальным движением.
+
+    Раунд k — поездки не более чем на k маршрутах: маршруты, проходящие
+    через улучшенные в прошлом раунде остановки, просматриваются один раз
+    от самой ранней такой остановки; посадка стоит половину интервала
+    маршрута (TransitIndex.boarding_wait). После подхода и после каждого
+    раунда — пешие пересадки (одна на раунд). Всё, что позже cutoff,
+    отбрасывается.
+
+    Parameters:
+    -----------
+    index : TransitIndex
+    access_times : dict
+        stop_id → время подхода от старта пешком, сек
+    ride_times : dict
+        rid → список времён перегонов (len = число остановок маршрута - 1)
+    footpaths : dict
+        stop_id → [(stop_id2, сек пешком), ...]
+    cutoff : float
+        Граница времени, сек
+    max_transfers : int
+        Максимум пересадок (раундов — на один больше)
+
+    Returns:
+    --------
+    tuple: (dict stop_id → лучшее время прибытия, dict счётчиков)
+    """
+    best = {s: t for s, t in access_times.items() if t <= cutoff}
+    # Прибытия подходом или транспортом: пересадки пешком идут только от них,
+    # поэтому отдельная метка (пешком после пешей пересадки дальше не идём)
+    arrived = dict(best)
+    stats = {'rounds': 0, 'routes_scanned': 0, 'stops_scanned': 0}
+
+    def relax_footpaths(sources, improved):
+        for stop_id, t in sources.items():
+            for stop2, walk in footpaths.get(stop_id, ()):
+                t2 = t + walk
+                if t2 <= cutoff and t2 < best.get(stop2, math.inf):
+                    best[stop2] = t2
+                    improved[stop2] = t2
+
+    previous = dict(best)  # улучшенные в прошлом раунде прибытия
+    relax_footpaths(arrived, previous)
+    marked = set(previous)
+
+    for _ in range(max_transfers + 1):
+        if not marked:
+            break
+        stats['rounds'] += 1
+        # Маршрут → самая ранняя и самая поздняя отмеченные остановки на нём
+        queue = {}
+        for stop_id in marked:
+            for rid in index.routes_at(stop_id):
+                pos = index.route_positions[rid][stop_id]
+                first, last = queue.get(rid, (pos, pos))
+                queue[rid] = (min(first, pos), max(last, pos))
+
+        current = {}
+        alighted = {}
+        for rid, (start, last_board) in queue.items():
+            stops = index.stops_of(rid)
+            times = ride_times.get(rid)
+            if not times:
+                continue
+            stats['routes_scanned'] += 1
+            on_board = math.inf
+            for i in range(start, len(stops)):
+                stop_id = stops[i]
+                stats['stops_scanned'] += 1
+                if on_board <= cutoff and on_board < arrived.get(stop_id, math.inf):
+                    arrived[stop_id] = on_board
+                    alighted[stop_id] = on_board
+                    if on_board < best.get(stop_id, math.inf):
+                        best[stop_id] = on_board
+                        current[stop_id] = on_board
+                board = previous.get(stop_id)
+                if board is not None:
+                    board += index.boarding_wait(rid, stop_id)
+                    if board < on_board:
+                        on_board = board
+                if i == len(stops) - 1:
+                    break
+                on_board += times[i]
+                if on_board > cutoff and i >= last_board:
+                    break  # дальше по маршруту посадок этого раунда нет
+
+        relax_footpaths(alighted, current)  # пешие пересадки от мест высадки
+        previous = current
+        marked = set(current)
+    return best, stats
+
+
+class StopTimeTable:
+    """
+    Лучшие времена остановка → остановка по сети ОТ (разреженная CSR-таблица).
+
+    Строка остановки stop_ids[i] — targets/secs[offsets[i]:offsets[i + 1]]:
+    позиции достижимых остановок и время в секундах (uint16, точность 1 сек)
+    от прихода на остановку i до прибытия на остановку. Пары дальше
+    threshold не хранятся. Запрос от старта — min-plus подходов пешком
+    с таблицей, без поиска по сети ОТ.
+    """
+
+    def __init__(self, stop_ids, offsets, targets, secs, threshold):
+        self.stop_ids = stop_ids
+        self.offsets = offsets
+        self.targets = targets
+        self.secs = secs
+        self.threshold = float(threshold)
+        self._pos = {stop_id: i for i, stop_id in enumerate(stop_ids.tolist())}
+
+    @classmethod
+    def build(cls, index, ride_times, footpaths, stop_ids, threshold=TABLE_THRESHOLD,
+              max_transfers=DEFAULT_MAX_TRANSFERS, progress=None):
+        """
+        Таблица из raptor_search от каждой остановки.
+
+        progress — функция (готово, всего); если вернёт False, расчёт прерывается
+        и возвращается None.
+        """
+        stop_ids = np.asarray(stop_ids, dtype=np.int64)
+        pos = {stop_id: i for i, stop_id in enumerate(stop_ids.tolist())}
+        offsets = np.zeros(len(stop_ids) + 1, dtype=np.int64)
+        targets, secs = [], []
+        for i, stop_id in enumerate(stop_ids.tolist()):
+            reached, _ = raptor_search(index, {stop_id: 0.0}, ride_times, footpaths,
+                                       threshold, max_transfers)
+            row = sorted((pos[s], t) for s, t in reached.items() if s in pos)
+            targets.extend(p for p, _ in row)
+            secs.extend(t for _, t in row)
+            offsets[i + 1] = len(targets)
+            if progress is not None and progress(i + 1, len(stop_ids)) is False:
+                return None
+        return cls(stop_ids, offsets, np.array(targets, dtype=np.int32),
+                   np.round(np.array(secs, dtype=np.float64)).astype(np.uint16), threshold)
+
+    def __len__(self):
+        return len(self.targets)
+
+    @property
+    def nbytes(self):
+        return self.offsets.nbytes + self.targets.nbytes + self.secs.nbytes + self.stop_ids.nbytes
+
+    def query(self, access_times, cutoff=None):
+        """
+        Времена прибытия на остановки от старта.
+
+        Parameters:
+        -----------
+        access_times : dict
+            stop_id → время подхода пешком, сек
+        cutoff : float
+            Граница, сек (не больше threshold)
+
+        Returns:
+        --------
+        dict: stop_id → время, только для достигнутых не позже cutoff
+        """
+        cutoff = self.threshold if cutoff is None else min(cutoff, self.threshold)
+        rows, walk = [], []
+        for stop_id, t in access_times.items():
+            i = self._pos.get(stop_id)
+            if i is not None and t <= cutoff:
+                rows.append(i)
+                walk.append(t)
+        best = np.full(len(self.stop_ids), np.inf)
+        if rows:
+            rows = np.array(rows, dtype=np.int64)
+            walk = np.array(walk, dtype=np.float64)
+            starts = self.offsets[rows]
+            counts = self.offsets[rows + 1] - starts
+            # Элементы всех выбранных строк подряд: starts[k] .. starts[k] + counts[k]
+            before = np.cumsum(counts) - counts
+            flat = np.repeat(starts - before, counts) + np.arange(counts.sum())
+            np.minimum.at(best, self.targets[flat], np.repeat(walk, counts) + self.secs[flat])
+        reached = np.nonzero(best <= cutoff)[0]
+        return dict(zip(self.stop_ids[reached].tolist(), best[reached].tolist()))
+
+    def to_arrays(self):
+        return {
+            'table_stop_ids': self.stop_ids,
+            'table_offsets': self.offsets,
+            'table_targets': self.targets,
+            'table_secs': self.secs,
+            'table_threshold': np.array([self.threshold]),
+        }
+
+    @classmethod
+    def from_arrays(cls, arrays):
+        return cls(np.asarray(arrays['table_stop_ids']), np.asarray(arrays['table_offsets']),
+                   np.asarray(arrays['table_targets']), np.asarray(arrays['table_secs']),
+                   float(arrays['table_threshold'][0]))
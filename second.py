@@ -3,15 +3,62 @@ print("ПОЛНЫЙ ЦИКЛ: ЛИНИИ МАРШРУТОВ → ПОЛИГОНЫ
 print("=" * 80)
 
 from qgis.core import *
-import processing
 import math
+import os
+import sys
 from qgis.PyQt.QtCore import QVariant
 from qgis.PyQt.QtGui import QColor, QFont
 
+# Общий пакет accessibility лежит рядом со скриптом (или в ACCESSIBILITY_HOME)
+_SCRIPT_DIR = (os.path.dirname(os.path.abspath(__file__)) if '__file__' in globals()
+               else os.environ.get('ACCESSIBILITY_HOME', os.getcwd()))
+if _SCRIPT_DIR not in sys.path:
+    sys.path.insert(0, _SCRIPT_DIR)
+
+from accessibility import instrument
+from accessibility.buildings import get_store as get_building_store
+from accessibility.extent import distance_window, reach_radius, window_request
+from accessibility.graph_cache import graph_fingerprint, layer_fingerprint
+from accessibility.hulls import isochrone_polygon
+from accessibility.instrument import Recorder, activate
+from accessibility.population import DEFAULT_MAX_ACCESS, node_population
+from accessibility.qgis_layers import (
+    lines_layer_from_interval,
+    network_from_layer,
+    points_from_array,
+    surface_isochrones_layer,
+)
+from accessibility.result_cache import array_geometry, geometry_array, origin_part, result_key
+from accessibility.result_cache import get_cache as get_result_cache
+from accessibility.service_area import ServiceAreaInterval
+
 # Координаты ИрНИТУ
 LON = 104.261370
 LAT = 52.262468
 
+# Граф строится только из дорог в радиусе досягаемости от старта (скорость × время); False — весь слой
+CLIP_TO_REACH = True
+
+# Повторный запуск от той же точки с теми же параметрами берёт линии, оболочки и население
+# из кэша результатов (память сессии + диск); False — всегда считать заново
+USE_RESULT_CACHE = True
+
+# Замеры этапов: путь к JSON (None — только сводка в консоли), пиковая память, этап для cProfile
+METRICS_JSON = None
+METRICS_MEMORY = False
+PROFILE_STAGE = None
+
+# Вид полигона изохроны: 'convex', 'concave' или 'edges' (буфер достигнутых рёбер)
+HULL_TYPE = 'convex'
+
+# Поверхность времени пути: растр времён по поиску от старта (GeoTIFF, в минутах) и изохроны —
+# контуры растра на порогах SURFACE_THRESHOLDS (минуты; None — интервалы расчёта).
+# SURFACE_RASTER = None — растр не строится
+SURFACE_RASTER = None
+SURFACE_CELL = 25.0        # размер ячейки, м
+SURFACE_RULE = 'node'      # 'node' — время ближайшего узла, 'edge' — время на ближайшем ребре
+SURFACE_THRESHOLDS = None  # например [3, 7.5, 12]
+
 def find_roads_layer():
     """Находит слой с дорогами"""
     
@@ -222,7 +269,8 @@ def full_isochrone_pipeline():
     print(f"\n🗑️ Очистка старых данных...")
     layers_to_remove = []
     for layer in QgsProject.instance().mapLayers().values():
-        if any(keyword in layer.name() for keyword in ['Линии', 'Полигон', 'Изохрона', 'Точка', 'Все_крайние_точки']):
+        if any(keyword in layer.name() for keyword in ['Линии', 'Полигон', 'Изохрона', 'Точка', 'Все_крайние_точки',
+                                                        'Время_пути']):
             layers_to_remove.append(layer.id())
     
     for layer_id in layers_to_remove:
@@ -258,118 +306,139 @@ def full_isochrone_pipeline():
     end_points_five = []
     end_points_ten = []
     end_points_fiveteen = []
-    
-    for time_min in time_intervals:
-        print(f"\n⏱️  {time_min} минут:")
-        
-        distance_m = (speed_kmh * 1000 / 3600) * (time_min * 60)
-        print(f"   Расстояние: {distance_m:.0f} м")
-        
-        # Пробуем алгоритм
-        print(f"   Создание линий...")
-        
-        params = {
-            'INPUT': roads,
-            'START_POINTS': point_layer,
-            'TRAVEL_COST': distance_m,
-            'STRATEGY': 0,  # 0 = Shortest distance
-            'TOLERANCE': 100,  # Увеличил для надежности
-            'OUTPUT_LINES': 'memory:',
-            'OUTPUT': 'memory:'
-        }
-        
-        try:
-            # Пробуем разные алгоритмы
-            algorithms = ['qgis:serviceareafromlayer', 'native:serviceareafrompoint']
-            
-            lines_created = False
-            for algorithm in algorithms:
-                try:
-                    print(f"   Пробую алгоритм: {algorithm}")
-                    result = processing.run(algorithm, params)
-                    
-                    if 'OUTPUT_LINES' in result and result['OUTPUT_LINES']:
-                        lines = result['OUTPUT_LINES']
-                        if lines.featureCount() > 0:
-                            lines.setName(f"Линии_{time_min}мин")
-                            
-                            # Стиль
-                            if time_min == 5:
-                                line_color = "255,255,0"
-                            elif time_min == 10:
-                                line_color = "255,165,0"
-                            else:
-                                line_color = "255,0,0"
-                            
-                            line_symbol = QgsLineSymbol.createSimple({
-                                'color': line_color,
-                                'width': '0.8',
-                                'style': 'solid'
-                            })
-                            lines.renderer().setSymbol(line_symbol)
-                            
-                            QgsProject.instance().addMapLayer(lines)
-                            line_layers.append(lines)
-                            print(f"   ✅ Линии созданы: {lines.featureCount()} сегментов")
-                            
-                            # Счетчики для отладки
-                            total_segments = 0
-                            end_points_added = 0
-                            
-                            # ИЗВЛЕКАЕМ ТОЛЬКО КРАЙНИЕ ТОЧКИ
-                            print(f"   Извлечение КРАЙНИХ точек маршрутов...")
-                            
-                            for feature in lines.getFeatures():
-                                geom = feature.geometry()
-                                
-                                if geom and not geom.isEmpty():
-                                    # Для MultiLineString (несколько линий)
-                                    if geom.isMultipart():
-                                        multi_line = geom.asMultiPolyline()
-                                        total_segments += len(multi_line)
-                                        
-                                        # Для каждого сегмента берем ТОЛЬКО последнюю точку
-                                        for line in multi_line:
-                                            if len(line) >= 2:
-                                                # Берем ПОСЛЕДНЮЮ точку каждой линии
-                                                last_point = line[-1]
-                                                if time_min == 5:
-                                                    end_points_five.append(last_point)
-                                                elif time_min == 10:
-                                                    end_points_ten.append(last_point)
-                                                else:
-                                                    end_points_fiveteen.append(last_point)
-                                                end_points_added += 1
-                                    else:
-                                        # Для простой LineString
-                                        line_pts = geom.asPolyline()
-                                        total_segments += 1
-                                        
-                                        if len(line_pts) >= 2:
-                                            # Берем ПОСЛЕДНЮЮ точку линии
-                                            last_point = line_pts[-1]
-                                            if time_min == 5:
-                                                end_points_five.append(last_point)
-                                            elif time_min == 10:
-                                                end_points_ten.append(last_point)
-                                            else:
-                                                end_points_fiveteen.append(last_point)
-                                            end_points_added += 1
-                            
-                            print(f"   Сегментов: {total_segments}, КРАЙНИХ точек добавлено: {end_points_added}")
-                            
-                            lines_created = True
-                            break  # Выходим из цикла алгоритмов
-                            
-                except Exception as e:
-                    print(f"   ❌ Алгоритм {algorithm} не сработал: {str(e)[:100]}")
-                    continue
-            
-            if not lines_created:
+    net_population_by_time = {}
+    segments_by_time = {}
+    lines_cache_key = None
+
+    # Граф строится один раз, поиск от старта — один на все интервалы.
+    # Дороги читаются только в окне досягаемости: дальше за 15 минут не уйти
+    print(f"\n🕸️  Построение графа дорог...")
+    window = None
+    network_key = None
+    if CLIP_TO_REACH:
+        radius = reach_radius(speed_kmh, max(time_intervals), margin=100)  # запас — допуск привязки
+        window = distance_window(point.x(), point.y(), radius)
+        network_key = graph_fingerprint(roads=layer_fingerprint(roads), window=window)
+        print(f"   Окно загрузки дорог: {radius:.0f} м от старта")
+    with instrument.span('road_network'):
+        network = network_from_layer(roads, request=window_request(window), key=network_key)
+    print(f"   Узлов: {network.num_nodes}, рёбер: {len(network.rec_src)}")
+    if network.graph.chains is not None:
+        stats = network.graph.chains.summary()
+        print(f"   Сжатие цепочек степени 2: узлов {stats['nodes_before']} → {stats['nodes_after']}, "
+              f"рёбер {stats['edges_before']} → {stats['edges_after']}")
+
+    start_node, snap_dist = network.snap(point.x(), point.y(), 100)  # допуск как TOLERANCE
+    if start_node is None:
+        print(f"   ❌ Точка старта дальше 100 м от дорожной сети")
+    else:
+        print(f"   Привязка старта к графу: {snap_dist:.1f} м")
+
+        distances = [(speed_kmh * 1000 / 3600) * (time_min * 60) for time_min in time_intervals]
+        cached = None
+        if USE_RESULT_CACHE:
+            lines_cache_key = result_key(
+                mode='walk',
+                network=network.key,
+                origin=origin_part(network.node_xy[start_node]),
+                speed_kmh=speed_kmh,
+                time_intervals=time_intervals,
+                population=([layer_fingerprint(population_layer), population_field]
+                            if has_population_data else None)
+            )
+            cached = get_result_cache().get(lines_cache_key)
+
+        search = None
+        if cached is not None:
+            print(f"   ♻️  Линии и население по сети из кэша результатов")
+            intervals = [ServiceAreaInterval(distance_m, cached['arrays'][f"segments_{time_min}"])
+                         for time_min, distance_m in zip(time_intervals, distances)]
+            net_population_by_time = {int(t): pop for t, pop in cached['values']['net_population'].items()}
+        else:
+            with instrument.span('search'):
+                search = network.search(start_node, distances)
+                intervals = network.intervals(search)
+
+            # Население по сети: здания привязаны к узлам графа, суммы по всем интервалам сразу
+            if has_population_data:
+                store = get_building_store(population_layer, population_field, roads_crs)
+                assignment = node_population(store, network.key, network.grid)
+                net_population, net_buildings = assignment.within(search)
+                net_population_by_time = dict(zip(time_intervals, net_population.tolist()))
+                print(f"\n👥 Население по сети (здания в {DEFAULT_MAX_ACCESS:.0f} м от графа: {len(assignment)}):")
+                for time_min, pop, count in zip(time_intervals, net_population, net_buildings):
+                    print(f"   {time_min} мин: {pop:.0f} чел., {count} зданий")
+
+            if lines_cache_key is not None:
+                get_result_cache().put(
+                    lines_cache_key,
+                    {f"segments_{time_min}": interval.segments for time_min, interval in zip(time_intervals, intervals)},
+                    {'net_population': {str(t): pop for t, pop in net_population_by_time.items()}}
+                )
+
+        for time_min, distance_m, interval in zip(time_intervals, distances, intervals):
+            print(f"\n⏱️  {time_min} минут:")
+            print(f"   Расстояние: {distance_m:.0f} м")
+
+            if len(interval) == 0:
                 print(f"   ⚠️  Не удалось создать линии, пропускаю")
-                
-        except Exception as e:
-            print(f"   ❌ Ошибка: {e}")
+                continue
+
+            lines = lines_layer_from_interval(interval, roads_crs, f"Линии_{time_min}мин")
+            segments_by_time[time_min] = interval.segments
+
+            # Стиль
+            if time_min == 5:
+                line_color = "255,255,0"
+            elif time_min == 10:
+                line_color = "255,165,0"
+            else:
+                line_color = "255,0,0"
+
+            line_symbol = QgsLineSymbol.createSimple({
+                'color': line_color,
+                'width': '0.8',
+                'style': 'solid'
+            })
+            lines.renderer().setSymbol(line_symbol)
+
+            QgsProject.instance().addMapLayer(lines)
+            line_layers.append(lines)
+
+            # КРАЙНИЕ точки — дальние концы достигнутых частей рёбер
+            end_points = points_from_array(interval.end_points)
+            if time_min == 5:
+                end_points_five.extend(end_points)
+            elif time_min == 10:
+                end_points_ten.extend(end_points)
+            else:
+                end_points_fiveteen.extend(end_points)
+
+            print(f"   ✅ Линии созданы: {len(interval)} сегментов, КРАЙНИХ точек: {len(end_points)}")
+
+        # Растр времени и изохроны-контуры на любых порогах без повторного поиска
+        if SURFACE_RASTER:
+            speed_ms = speed_kmh * 1000 / 3600
+            thresholds = sorted(SURFACE_THRESHOLDS or time_intervals)
+            surface_distances = [speed_ms * (time_min * 60) for time_min in thresholds]
+            if search is None or surface_distances[-1] > distances[-1]:
+                with instrument.span('search'):
+                    search = network.search(start_node, surface_distances)
+            print(f"\n🗺️  Растр времени пути ({SURFACE_RULE}, ячейка {SURFACE_CELL:.0f} м)...")
+            with instrument.span('surface'):
+                surface = network.time_surface(search, speed_ms, cell_size=SURFACE_CELL, rule=SURFACE_RULE)
+                surface.write_geotiff(SURFACE_RASTER, roads_crs.toWkt())
+            QgsProject.instance().addMapLayer(QgsRasterLayer(SURFACE_RASTER, "Время_пути"))
+            print(f"   {surface.shape[1]}×{surface.shape[0]} ячеек → {SURFACE_RASTER}")
+
+            store = get_building_store(population_layer, population_field, roads_crs) if has_population_data else None
+            with instrument.span('contours'):
+                contours = surface_isochrones_layer(surface, [t * 60.0 for t in thresholds], roads_crs,
+                                                    "Изохрона_растр", store)
+            QgsProject.instance().addMapLayer(contours)
+            for feature in contours.getFeatures():
+                print(f"   {feature['time_min']:g} мин: площадь {feature['area_m2']:.0f} м², "
+                      f"население {feature['population']:.0f} чел.")
 
     print(f"\n📊 ИТОГО собрано КРАЙНИХ точек:")
     print(f"   5 минут: {len(end_points_five)} точек")
@@ -384,9 +453,6 @@ def full_isochrone_pipeline():
     def calculate_population_in_polygon(polygon_geom, polygon_layer_crs):
         """Оптимизированный расчет населения внутри полигона - БЕЗ изменения исходной геометрии"""
         
-        total_population = 0
-        buildings_count = 0
-        
         if not has_population_data or not population_layer:
             print("   ⚠️  Нет данных о населении для расчета")
             return 0, 0
@@ -406,206 +472,27 @@ def full_isochrone_pipeline():
             
             print(f"   Используемое поле: '{population_field}'")
             
-            # 2. СОЗДАЕМ КОПИЮ геометрии для преобразования CRS
+            # 2. Хранилище зданий: индекс, геометрии (уже в CRS полигона) и население
+            # читаются один раз за сессию
+            store = get_building_store(population_layer, population_field, polygon_layer_crs)
             polygon_geom_for_calculation = QgsGeometry(polygon_geom)
-            polygon_crs = polygon_layer_crs
-            buildings_crs = population_layer.crs()
-            
-            if polygon_crs.authid() != buildings_crs.authid():
-                print(f"   Преобразование CRS копии полигона...")
-                transform = QgsCoordinateTransform(polygon_crs, buildings_crs, QgsProject.instance())
-                polygon_geom_for_calculation.transform(transform)  # Преобразуем КОПИЮ
-            
-            # 3. СОЗДАЕМ ПРОСТРАНСТВЕННЫЙ ИНДЕКС
-            print(f"   Создание пространственного индекса зданий...")
-            
-            # ПРАВИЛЬНЫЙ способ создания индекса
-            spatial_index = QgsSpatialIndex()
-            
-            # Быстро добавляем все объекты в индекс
-            features_list = []
-            feature_ids = []
-            
-            print(f"   Индексация {population_layer.featureCount()} зданий...")
             
-            # Используем итератор с прогрессом
-            for i, feature in enumerate(population_layer.getFeatures()):
-                if feature.geometry():
-                    spatial_index.addFeature(feature)
-                    features_list.append(feature)
-                    feature_ids.append(feature.id())
-                
-                if i % 5000 == 0 and i > 0:
-                    print(f"   Проиндексировано {i} зданий...")
-            
-            print(f"   Индекс создан. Всего в индексе: {len(feature_ids)} зданий")
-            
-            # 4. Находим здания в bounding box полигона
-            print(f"   Поиск зданий в bounding box полигона...")
             bbox = polygon_geom_for_calculation.boundingBox()
-            
             print(f"   Bounding box полигона:")
             print(f"     Xmin: {bbox.xMinimum():.2f}, Ymin: {bbox.yMinimum():.2f}")
             print(f"     Xmax: {bbox.xMaximum():.2f}, Ymax: {bbox.yMaximum():.2f}")
             
-            # Добавляем буфер 5 метров для граничных случаев
-            buffer_distance = 5
-            bbox_buffered = QgsRectangle(
-                bbox.xMinimum() - buffer_distance,
-                bbox.yMinimum() - buffer_distance,
-                bbox.xMaximum() + buffer_distance,
-                bbox.yMaximum() + buffer_distance
-            )
-            
-            # Используем индекс для поиска
-            candidate_ids = spatial_index.intersects(bbox_buffered)
-            print(f"   Найдено кандидатов в BBox: {len(candidate_ids)} зданий")
-            
-            if len(candidate_ids) == 0:
-                print(f"   ⚠️  В BBox полигона нет зданий!")
-                
-                # Проверим центр полигона
-                center = polygon_geom_for_calculation.centroid().asPoint()
-                print(f"   Центр полигона: X={center.x():.2f}, Y={center.y():.2f}")
-                
-                # Создаем маленький bbox вокруг центра для проверки
-                test_bbox = QgsRectangle(
-                    center.x() - 100, center.y() - 100,
-                    center.x() + 100, center.y() + 100
-                )
-                
-                test_ids = spatial_index.intersects(test_bbox)
-                print(f"   Зданий в радиусе 100м от центра: {len(test_ids)}")
-                
-                if len(test_ids) > 0:
-                    # Проверим координаты найденных зданий
-                    print(f"   Проверка координат найденных зданий:")
-                    for i, fid in enumerate(test_ids[:3]):
-                        # Находим объект по ID
-                        request = QgsFeatureRequest().setFilterFid(fid)
-                        feature = next(population_layer.getFeatures(request))
-                        geom = feature.geometry()
-                        if geom:
-                            pt = geom.centroid().asPoint()
-                            print(f"     Здание {fid}: X={pt.x():.2f}, Y={pt.y():.2f}")
-                
-                return 0, 0
-            
-            # 5. ПРЕДВАРИТЕЛЬНАЯ ФИЛЬТРАЦИЯ: создаем словарь для быстрого доступа
-            print(f"   Подготовка данных для обработки...")
-            
-            # Создаем словарь объектов по ID для быстрого доступа
-            features_dict = {}
-            
-            # Используем QgsFeatureRequest для загрузки только нужных объектов
-            request = QgsFeatureRequest()
-            request.setFilterFids(list(candidate_ids))
-            request.setSubsetOfAttributes([population_field], population_layer.fields())
-            
-            for feature in population_layer.getFeatures(request):
-                features_dict[feature.id()] = feature
-            
-            print(f"   Загружено {len(features_dict)} объектов для обработки")
-            
-            # 6. ТОЧНАЯ ПРОВЕРКА пересечений
-            print(f"   Точная проверка пересечений...")
-            
-            inside_count = 0
-            partial_count = 0
-            processed = 0
-            
-            # Для отладки выведем первые несколько значений населения
-            print(f"   Примеры значений поля '{population_field}':")
-            sample_count = 0
-            for fid in list(candidate_ids)[:5]:
-                if fid in features_dict:
-                    feature = features_dict[fid]
-                    pop_value = feature[population_field]
-                    print(f"     Здание {fid}: {population_field} = {pop_value} (тип: {type(pop_value)})")
-                    sample_count += 1
-            
-            # Основной цикл обработки
-            for fid in candidate_ids:
-                if fid not in features_dict:
-                    continue
-                    
-                feature = features_dict[fid]
-                building_geom = feature.geometry()
-                
-                if building_geom is None or building_geom.isEmpty():
-                    continue
-                
-                # Проверяем пересечение
-                if building_geom.intersects(polygon_geom_for_calculation):
-                    # Получаем значение населения
-                    pop_value = feature[population_field]
-                    pop_num = 0
-                    
-                    # Преобразуем в число
-                    if pop_value is not None and str(pop_value).strip() != '':
-                        try:
-                            pop_str = str(pop_value).replace(',', '.').strip()
-                            pop_num = float(pop_str) if pop_str else 0
-                        except (ValueError, TypeError):
-                            pop_num = 0
-                    
-                    # Если есть население, считаем
-                    if pop_num > 0:
-                        processed += 1
-                        
-                        # Проверяем, полностью ли внутри
-                        if building_geom.within(polygon_geom_for_calculation):
-                            # Полностью внутри
-                            total_population += pop_num
-                            buildings_count += 1
-                            inside_count += 1
-                        else:
-                            # Частично внутри
-                            intersection = building_geom.intersection(polygon_geom_for_calculation)
-                            if intersection and not intersection.isEmpty():
-                                building_area = building_geom.area()
-                                if building_area > 0:
-                                    intersection_area = intersection.area()
-                                    proportion = intersection_area / building_area
-                                    
-                                    # Учитываем если больше 5%
-                                    if proportion > 0.05:
-                                        total_population += pop_num * proportion
-                                        buildings_count += proportion
-                                        partial_count += 1
-                        
-                        # Выводим прогресс
-                        if processed % 50 == 0:
-                            print(f"   Обработано {processed}/{len(candidate_ids)} зданий...")
+            # 4. Точная проверка пересечений по кэшированным геометриям
+            total_population, buildings_count, inside_count, partial_count = \
+                store.population_in_polygon(polygon_geom_for_calculation)
             
-            # 7. ВЫВОД РЕЗУЛЬТАТОВ
+            # 5. ВЫВОД РЕЗУЛЬТАТОВ
             print(f"\n   📊 РЕЗУЛЬТАТЫ РАСЧЕТА:")
-            print(f"     Всего кандидатов: {len(candidate_ids)}")
-            print(f"     Обработано с населением: {processed}")
+            print(f"     Зданий в хранилище: {len(store)}")
             print(f"     Полностью внутри: {inside_count} зданий")
             print(f"     Частично внутри: {partial_count} зданий")
             print(f"     Общее население: {total_population:.0f} чел.")
             
-            # Дополнительная диагностика если население = 0
-            if total_population == 0 and processed > 0:
-                print(f"\n   ⚠️  Диагностика: обработано {processed} зданий, но население = 0")
-                print(f"     Проверяю значения населения...")
-                
-                # Проверяем значения в первых 10 пересекающихся зданиях
-                check_count = 0
-                for fid in candidate_ids:
-                    if fid in features_dict:
-                        feature = features_dict[fid]
-                        building_geom = feature.geometry()
-                        
-                        if building_geom and building_geom.intersects(polygon_geom_for_calculation):
-                            pop_value = feature[population_field]
-                            print(f"       Здание {fid}: {population_field} = {pop_value}")
-                            check_count += 1
-                            
-                            if check_count >= 10:
-                                break
-            
             return total_population, buildings_count
         
         except Exception as e:
@@ -614,7 +501,7 @@ def full_isochrone_pipeline():
             traceback.print_exc()
             return 0, 0
 
-    def create_polygon_from_end_points(points, name, color, border_color):
+    def create_polygon_from_end_points(points, name, color, border_color, net_population=0.0, segments=None):
         """Создает ЕДИНЫЙ полигон из списка КРАЙНИХ точек с населением"""
         
         if len(points) < 3:
@@ -623,60 +510,51 @@ def full_isochrone_pipeline():
         
         print(f"\n   Создание полигона {name} из {len(points)} крайних точек...")
         
-        # 1. Создаем временный слой точек
-        temp_layer = QgsVectorLayer(f"Point?crs={roads_crs.authid()}", f"temp_{name}", "memory")
-        provider = temp_layer.dataProvider()
-        
-        features = []
-        for point in points:
-            feat = QgsFeature()
-            feat.setGeometry(QgsGeometry.fromPointXY(point))
-            features.append(feat)
-        
-        provider.addFeatures(features)
-        temp_layer.updateExtents()
-        
-        # 2. Создаем ЕДИНУЮ выпуклую оболочку всех точек
-        print(f"   Создание выпуклой оболочки...")
+        # Определяем время по имени
+        time_min = 5 if "5мин" in name else (10 if "10мин" in name else 15)
         
-        try:
-            # Используем dissolve, чтобы объединить все точки перед созданием оболочки
-            dissolve_params = {
-                'INPUT': temp_layer,
-                'FIELD': [],
-                'OUTPUT': 'memory:'
-            }
-            dissolved = processing.run("native:dissolve", dissolve_params)['OUTPUT']
+        # Тот же старт и параметры — оболочка и население из кэша результатов
+        polygon_key = (result_key(lines=lines_cache_key, hull=HULL_TYPE, time_min=time_min)
+                       if lines_cache_key else None)
+        cached = get_result_cache().get(polygon_key) if polygon_key else None
+        if cached is not None:
+            print(f"   ♻️  Оболочка и население из кэша результатов")
+            polygon_geom = array_geometry(cached['arrays']['polygon'])
+            total_population = cached['values']['population']
+            buildings_count = cached['values']['buildings_count']
+        else:
+            # 1-3. Полигон строится в памяти, без временных слоев и processing
+            print(f"   Создание оболочки ({HULL_TYPE})...")
             
-            # Создаем выпуклую оболочку из объединенного слоя
-            convex_params = {'INPUT': dissolved, 'OUTPUT': 'memory:'}
-            convex_layer = processing.run("native:convexhull", convex_params)['OUTPUT']
+            try:
+                polygon_geom = isochrone_polygon(HULL_TYPE, points, segments)
+            except Exception as e:
+                print(f"   ❌ Ошибка при создании оболочки: {e}")
+                return None
             
-            if convex_layer.featureCount() == 0:
-                print(f"   ❌ Не удалось создать выпуклой оболочки для {name}")
+            if polygon_geom is None or polygon_geom.isEmpty():
+                print(f"   ❌ Не удалось создать оболочку для {name}")
                 return None
             
-        except Exception as e:
-            print(f"   ❌ Ошибка при создании выпуклой оболочки: {e}")
-            return None
-        
-        # 3. Получаем геометрию полигона
-        convex_features = list(convex_layer.getFeatures())
-        polygon_geom = convex_features[0].geometry()
-        
-        # 4. СОЗДАЕМ КОПИЮ ГЕОМЕТРИИ для расчета населения
-        # Это критически важно, чтобы не изменять исходную геометрию!
-        polygon_geom_for_population = QgsGeometry(polygon_geom)  # Создаем копию
-        
-        # Проверяем и исправляем геометрию (для обеих копий)
-        if not polygon_geom.isGeosValid():
-            print(f"   Геометрия требует исправления...")
-            polygon_geom = polygon_geom.makeValid()
-            polygon_geom_for_population = QgsGeometry(polygon_geom)  # Копируем исправленную
-        
-        # 5. Рассчитываем население НА КОПИИ геометрии
-        print(f"   Расчет населения...")
-        total_population, buildings_count = calculate_population_in_polygon(polygon_geom_for_population, roads_crs)
+            # 4. СОЗДАЕМ КОПИЮ ГЕОМЕТРИИ для расчета населения
+            # Это критически важно, чтобы не изменять исходную геометрию!
+            polygon_geom_for_population = QgsGeometry(polygon_geom)  # Создаем копию
+            
+            # Проверяем и исправляем геометрию (для обеих копий)
+            if not polygon_geom.isGeosValid():
+                print(f"   Геометрия требует исправления...")
+                polygon_geom = polygon_geom.makeValid()
+                polygon_geom_for_population = QgsGeometry(polygon_geom)  # Копируем исправленную
+            
+            # 5. Рассчитываем население НА КОПИИ геометрии
+            print(f"   Расчет населения...")
+            with instrument.span('population'):
+                total_population, buildings_count = calculate_population_in_polygon(polygon_geom_for_population, roads_crs)
+            
+            if polygon_key:
+                get_result_cache().put(polygon_key, {'polygon': geometry_array(polygon_geom)},
+                                       {'population': float(total_population),
+                                        'buildings_count': float(buildings_count)})
         
         # 6. Создаем финальный полигонный слой с ИСХОДНОЙ геометрией
         polygon_layer = QgsVectorLayer(f"Polygon?crs={roads_crs.authid()}", name, "memory")
@@ -691,7 +569,8 @@ def full_isochrone_pipeline():
             QgsField("area_m2", QVariant.Double),
             QgsField("buildings_count", QVariant.Double),
             QgsField("population", QVariant.Double),
-            QgsField("density_ha", QVariant.Double)
+            QgsField("density_ha", QVariant.Double),
+            QgsField("net_population", QVariant.Double)
         ])
         polygon_layer.updateFields()
         
@@ -705,9 +584,6 @@ def full_isochrone_pipeline():
         area_ha = area_m2 / 10000
         density_ha = total_population / area_ha if area_ha > 0 else 0
         
-        # Определяем время по имени
-        time_min = 5 if "5мин" in name else (10 if "10мин" in name else 15)
-        
         # Создаем объект с ИСХОДНОЙ геометрией
         feat = QgsFeature()
         feat.setGeometry(polygon_geom)  # Используем ИСХОДНУЮ геометрию
@@ -719,7 +595,8 @@ def full_isochrone_pipeline():
             area_m2,
             buildings_count,
             total_population,
-            density_ha
+            density_ha,
+            net_population
         ])
         polygon_provider.addFeatures([feat])
         
@@ -795,7 +672,9 @@ def full_isochrone_pipeline():
             end_points_fiveteen,
             "Изохрона_15мин",
             "255,0,0,100",       # Красный с прозрачностью
-            "200,0,0"            # Темно-красная граница
+            "200,0,0",            # Темно-красная граница
+            net_population_by_time.get(15, 0.0),
+            segments_by_time.get(15)
         )
         if polygon_fifteen:
             QgsProject.instance().addMapLayer(polygon_fifteen)
@@ -822,7 +701,9 @@ def full_isochrone_pipeline():
             end_points_ten,
             "Изохрона_10мин",
             "255,165,0,80",    # Оранжевый с прозрачностью
-            "255,100,0"         # Темно-оранжевая граница
+            "255,100,0",         # Темно-оранжевая граница
+            net_population_by_time.get(10, 0.0),
+            segments_by_time.get(10)
         )
         if polygon_ten:
             QgsProject.instance().addMapLayer(polygon_ten)
@@ -849,7 +730,9 @@ def full_isochrone_pipeline():
             end_points_five,
             "Изохрона_5мин",
             "255,255,0,60",      # Желтый с прозрачностью
-            "255,200,0"         # Оранжевая граница
+            "255,200,0",         # Оранжевая граница
+            net_population_by_time.get(5, 0.0),
+            segments_by_time.get(5)
         )
         if polygon_five:
             QgsProject.instance().addMapLayer(polygon_five)
@@ -952,4 +835,12 @@ print("📝 Перед запуском убедитесь, что:")
 print("   1. Слой 'ispravlenny_uds' загружен (дороги)")
 print("   2. Слой '3дания_Hace_n_attract' загружен (здания с населением)")
 print("=" * 80)
-full_isochrone_pipeline()
+RECORDER = Recorder(memory=METRICS_MEMORY, profile_stage=PROFILE_STAGE)
+with activate(RECORDER):
+    full_isochrone_pipeline()
+
+print("\n⏱️  Этапы расчета:")
+for line in RECORDER.summary_lines():
+    print(f"   {line}")
+if METRICS_JSON:
+    print(f"   Замеры этапов: {RECORDER.write_json(METRICS_JSON)}")
@@ -0,0 +1,56 @@
+"""Пакетный расчёт по сети из кэша графов против поиска от каждого старта отдельно."""
+import pytest
+
+np = pytest.importorskip('numpy')
+
+from accessibility.batch import ServiceAreaJob, cache_network, run_batch  # noqa: E402
+from accessibility.hulls import convex_hull_xy  # noqa: E402
+from accessibility.service_area import RoadNetwork  # noqa: E402
+
+
+def _network(size=9, step=90.0):
+    lines = [[(0.0, j * step), ((size - 1) * step, j * step)] for j in range(size)]
+    lines += [[(i * step, 0.0), (i * step, (size - 1) * step)] for i in range(size)]
+    lines.append([(0.0, 0.0), ((size - 1) * step, (size - 1) * step)])
+    return RoadNetwork.from_polylines(lines, key='synthetic-grid')
+
+
+@pytest.mark.parametrize('hull_kind', ['convex', 'edges'])
+@pytest.mark.parametrize('workers', [1, 2])
+def test_two_origins_match_single_searches(tmp_path, workers, hull_kind):
+    network = _network()
+    root = str(tmp_path)
+    key = cache_network(network, root)
+    assert cache_network(network, root) == key
+
+    cutoffs = [150.0, 400.0]
+    origins = np.array([[95.0, 88.0], [610.0, 470.0]])
+    job = ServiceAreaJob(key, cutoffs, hull_kind=hull_kind, root=root)
+    done = []
+    results = dict(run_batch(job, origins, workers=workers, chunk_size=1,
+                             progress=lambda i, total: done.append((i, total))))
+    assert sorted(results) == [0, 1]
+    assert done[-1] == (2, 2)
+
+    for i, (x, y) in enumerate(origins.tolist()):
+        node, snap_dist = network.snap(x, y)
+        intervals = network.service_area(node, cutoffs)
+        got = results[i]
+        assert got['node'] == node
+        assert got['snap_dist'] == pytest.approx(snap_dist)
+        assert got['counts'] == [len(interval) for interval in intervals]
+        for shape, interval in zip(got['shapes'], intervals):
+            expected = interval.segments if hull_kind == 'edges' else convex_hull_xy(interval.end_points)
+            np.testing.assert_allclose(shape, expected)
+
+
+def test_job_reads_memory_mapped_network(tmp_path):
+    network = _network()
+    job = ServiceAreaJob(cache_network(network, str(tmp_path)), [200.0], root=str(tmp_path))
+    job.load()
+    assert isinstance(job.network.rec_src, np.memmap)
+    # В процессы пула задание уходит без сети — исполнитель открывает её сам
+    assert job.__getstate__()['network'] is None
+    assert job.run(-5000.0, -5000.0) is not None
+    job.snap_tolerance = 100.0
+    assert job.run(-5000.0, -5000.0) is None
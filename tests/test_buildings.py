@@ -0,0 +1,62 @@
+"""Наложение зданий пачкой (population_in_polygon) против эталона по одному зданию."""
+import pytest
+
+np = pytest.importorskip('numpy')
+pytest.importorskip('qgis.core')
+
+
+@pytest.fixture(scope='module')
+def store():
+    from qgis.core import QgsFeature, QgsField, QgsGeometry, QgsPointXY, QgsVectorLayer
+    from qgis.PyQt.QtCore import QVariant
+
+    from accessibility.buildings import BuildingStore
+    from accessibility.headless import start_qgis
+
+    start_qgis()
+    buildings = [
+        ([(10, 10), (20, 10), (20, 20), (10, 20)], 30.0),          # внутри
+        ([(95, 40), (105, 40), (105, 50), (95, 50)], 20.0),        # пересекает, доля 50%
+        ([(99.8, 60), (109.8, 60), (109.8, 70), (99.8, 70)], 8.0), # пересекает, доля 2% — не учитывается
+        ([(150, 150), (160, 150), (160, 160), (150, 160)], 12.0),  # снаружи
+        ([(40, 98), (50, 98), (50, 108), (40, 108)], 0.0),         # пересекает, без жителей
+        ([(90, 80), (110, 80), (100, 80)], 5.0),                   # нулевая площадь на границе
+        ([(45, 45), (55, 45), (55, 55), (45, 55)], 7.0),           # в дыре полигона
+        ([(60, 60), (70, 60), (70, 70), (60, 70)], 4.0),           # пересекает край дыры
+    ]
+    layer = QgsVectorLayer("Polygon?crs=EPSG:32648", "buildings", "memory")
+    layer.dataProvider().addAttributes([QgsField('Насел', QVariant.Double)])
+    layer.updateFields()
+    features = []
+    for ring, pop in buildings:
+        feat = QgsFeature(layer.fields())
+        feat.setGeometry(QgsGeometry.fromPolygonXY([[QgsPointXY(x, y) for x, y in ring]]))
+        feat.setAttributes([pop])
+        features.append(feat)
+    layer.dataProvider().addFeatures(features)
+    return BuildingStore(layer, 'Насел')
+
+
+def _polygon(with_hole):
+    from qgis.core import QgsGeometry, QgsPointXY
+    rings = [[(0, 0), (100, 0), (100, 100), (0, 100)]]
+    if with_hole:
+        rings.append([(40, 40), (65, 40), (65, 65), (40, 65)])
+    return QgsGeometry.fromPolygonXY([[QgsPointXY(x, y) for x, y in ring] for ring in rings])
+
+
+@pytest.mark.parametrize('proportional', [True, False])
+@pytest.mark.parametrize('with_hole', [False, True])
+def test_bulk_matches_loop(store, proportional, with_hole):
+    polygon = _polygon(with_hole)
+    bulk = store.population_in_polygon(polygon, proportional=proportional)
+    loop = store.population_in_polygon_loop(polygon, proportional=proportional)
+    assert np.allclose(bulk, loop)
+
+
+def test_proportional_shares(store):
+    total, count, inside, partial = store.population_in_polygon(_polygon(False))
+    # 30 + 7 + 4 целиком и 20 * 0.5; доля 2%, нулевая площадь и здание без жителей не учитываются
+    assert total == pytest.approx(51.0)
+    assert count == pytest.approx(3.5)
+    assert (inside, partial) == (3, 1)
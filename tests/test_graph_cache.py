@@ -0,0 +1,130 @@
+"""Сохранение и загрузка артефактов graph_cache."""
+import json
+import os
+
+import pytest
+
+np = pytest.importorskip('numpy')
+
+from accessibility import graph_cache  # noqa: E402
+from accessibility.graph import EdgeListBuilder, WalkGraph  # noqa: E402
+from accessibility.search import bounded_search  # noqa: E402
+from accessibility.snapping import NodeGrid  # noqa: E402
+
+
+@pytest.fixture
+def cache_dir(tmp_path, monkeypatch):
+    monkeypatch.setenv('ACCESSIBILITY_CACHE_DIR', str(tmp_path))
+    return tmp_path
+
+
+def _arrays():
+    rng = np.random.default_rng(0)
+    node_xy = rng.uniform(0.0, 500.0, (50, 2))
+    grid = NodeGrid.build(node_xy)
+    return dict(grid.to_arrays(), node_xy=node_xy,
+                edge_src=rng.integers(0, 50, 80).astype(np.int32),
+                edge_dst=rng.integers(0, 50, 80).astype(np.int32),
+                edge_cost=rng.uniform(1.0, 60.0, 80))
+
+
+def _contracted_graph():
+    builder = EdgeListBuilder()
+    for i in range(6):
+        for j in range(6):
+            here = builder.node(i * 50.0, j * 50.0)
+            if i < 5:
+                builder.add_edge(here, builder.node((i + 1) * 50.0, j * 50.0), 40.0 + i + j, 50.0)
+            if j < 5:
+                builder.add_edge(here, builder.node(i * 50.0, (j + 1) * 50.0), 45.0 + i * j, 50.0, j % 2 == 0)
+    # Хвост из узлов степени 2 — в сжатом графе это цепочка
+    tail = builder.node(250.0, 250.0)
+    for k in range(1, 5):
+        nxt = builder.node(250.0 + 20.0 * k, 250.0)
+        builder.add_edge(tail, nxt, 15.0, 20.0)
+        tail = nxt
+    return builder.build(contract=True)
+
+
+def test_fingerprint_is_stable():
+    key = graph_cache.graph_fingerprint(roads='abc', walk_speed_kmh=4.5, use_slope=True)
+    assert key == graph_cache.graph_fingerprint(use_slope=True, walk_speed_kmh=4.5, roads='abc')
+    assert key != graph_cache.graph_fingerprint(roads='abc', walk_speed_kmh=5.0, use_slope=True)
+
+
+@pytest.mark.parametrize('mmap', [False, True])
+def test_round_trip(cache_dir, mmap):
+    arrays = _arrays()
+    key = graph_cache.graph_fingerprint(roads='synthetic', mmap=mmap)
+    path = graph_cache.save_graph(key, arrays, {'nodes': 50})
+    assert path == os.path.join(str(cache_dir), key)
+    assert not [name for name in os.listdir(cache_dir) if name.startswith('.')]
+
+    out, meta = graph_cache.load_graph(key, mmap=mmap)
+    assert meta['nodes'] == 50
+    assert meta['key'] == key
+    assert sorted(out) == sorted(arrays)
+    for name, arr in arrays.items():
+        np.testing.assert_array_equal(out[name], arr)
+        assert out[name].dtype == arr.dtype
+
+    grid = NodeGrid.from_arrays(out['node_xy'], out)
+    expected = NodeGrid.build(arrays['node_xy'])
+    for x, y in ((12.0, 33.0), (260.0, 251.0), (-40.0, 0.0)):
+        assert grid.nearest(x, y) == expected.nearest(x, y)
+
+
+def test_existing_artifact_is_kept(cache_dir):
+    key = graph_cache.graph_fingerprint(roads='kept')
+    path = graph_cache.save_graph(key, {'a': np.arange(3)})
+    # Читатель держит файл артефакта через mmap, пока другой процесс сохраняет тот же ключ
+    held = graph_cache.load_graph(key, mmap=True)[0]['a']
+    stamp = os.stat(os.path.join(path, 'a.npy')).st_ino
+    assert graph_cache.save_graph(key, {'a': np.arange(3)}) == path
+    assert os.stat(os.path.join(path, 'a.npy')).st_ino == stamp
+    np.testing.assert_array_equal(held, np.arange(3))
+    assert not [name for name in os.listdir(cache_dir) if name.startswith('.')]
+
+
+def test_broken_artifact_is_replaced(cache_dir):
+    key = graph_cache.graph_fingerprint(roads='broken')
+    path = graph_cache.save_graph(key, {'a': np.arange(3)})
+    os.remove(os.path.join(path, 'a.npy'))
+    assert graph_cache.load_graph(key) is None
+
+    graph_cache.save_graph(key, {'a': np.arange(4)})
+    np.testing.assert_array_equal(graph_cache.load_graph(key)[0]['a'], np.arange(4))
+    assert not [name for name in os.listdir(cache_dir) if name.startswith('.')]
+
+
+def test_missing_or_stale_artifact(cache_dir):
+    assert graph_cache.load_graph('absent') is None
+
+    key = graph_cache.graph_fingerprint(roads='stale')
+    path = graph_cache.save_graph(key, {'a': np.arange(3)})
+    meta_path = os.path.join(path, 'meta.json')
+    with open(meta_path, encoding='utf-8') as fh:
+        meta = json.load(fh)
+    meta['version'] = graph_cache.CACHE_VERSION - 1
+    with open(meta_path, 'w', encoding='utf-8') as fh:
+        json.dump(meta, fh)
+    assert graph_cache.load_graph(key) is None
+    # Артефакт старой версии пересобирается под тем же ключом
+    graph_cache.save_graph(key, {'b': np.ones(2)})
+    arrays, meta = graph_cache.load_graph(key)
+    assert list(arrays) == ['b']
+
+
+@pytest.mark.parametrize('mmap', [False, True])
+def test_contracted_graph_round_trip(cache_dir, mmap):
+    graph = _contracted_graph()
+    assert graph.chains is not None
+    key = graph_cache.graph_fingerprint(roads='contracted', mmap=mmap)
+    graph_cache.save_graph(key, graph.to_arrays(), {'nodes': graph.num_nodes})
+    out, _ = graph_cache.load_graph(key, mmap=mmap)
+    restored = WalkGraph.from_arrays(out)
+    assert restored.chains is not None
+    for start in (0, 7, graph.num_nodes - 1):
+        expected = bounded_search(graph, start, [100.0, 300.0])
+        result = bounded_search(restored, start, [100.0, 300.0])
+        np.testing.assert_array_equal(result.to_dense(graph.num_nodes), expected.to_dense(graph.num_nodes))
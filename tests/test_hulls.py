@@ -0,0 +1,56 @@
+"""Выпуклая оболочка convex_hull_xy против перебора по парам точек."""
+import pytest
+
+np = pytest.importorskip('numpy')
+
+from accessibility.hulls import convex_hull_xy  # noqa: E402
+
+
+def _brute_force_hull(xy):
+    """Эталон: вершины, через которые проходит опорная прямая с остальными точками строго слева."""
+    pts = np.unique(xy, axis=0)
+    vertices = set()
+    for i in range(len(pts)):
+        for j in range(len(pts)):
+            if i == j:
+                continue
+            a, b = pts[i], pts[j]
+            cross = (b[0] - a[0]) * (pts[:, 1] - a[1]) - (b[1] - a[1]) * (pts[:, 0] - a[0])
+            on_line = cross == 0
+            if np.all(cross >= 0) and np.any(cross > 0):
+                # Из точек на опорной прямой вершины — только две крайние
+                line = pts[on_line]
+                t = (line - a) @ (b - a)
+                vertices.add(tuple(line[np.argmin(t)].tolist()))
+                vertices.add(tuple(line[np.argmax(t)].tolist()))
+    return vertices
+
+
+def _area(ring):
+    x, y = ring[:, 0], ring[:, 1]
+    return 0.5 * float(np.dot(x, np.roll(y, -1)) - np.dot(y, np.roll(x, -1)))
+
+
+@pytest.mark.parametrize('seed', [0, 1, 2])
+def test_matches_brute_force(seed):
+    rng = np.random.default_rng(seed)
+    # Целочисленная сетка даёт повторы и точки на одной прямой со сторонами оболочки
+    xy = rng.integers(0, 12, (80, 2)).astype(float)
+    hull = convex_hull_xy(xy)
+    assert set(map(tuple, hull.tolist())) == _brute_force_hull(xy)
+    assert len(hull) == len(set(map(tuple, hull.tolist())))
+    # Обход против часовой стрелки без повтора первой вершины, все точки внутри
+    assert _area(hull) > 0
+    for k in range(len(hull)):
+        a, b = hull[k], hull[(k + 1) % len(hull)]
+        cross = (b[0] - a[0]) * (xy[:, 1] - a[1]) - (b[1] - a[1]) * (xy[:, 0] - a[0])
+        assert np.all(cross >= 0)
+
+
+def test_degenerate_inputs():
+    assert len(convex_hull_xy(np.array([[1.0, 1.0], [1.0, 1.0]]))) == 1
+    line = np.array([[0.0, 0.0], [1.0, 1.0], [2.0, 2.0], [3.0, 3.0]])
+    assert len(convex_hull_xy(line)) < 3
+    square = np.array([[0.0, 0.0], [2.0, 0.0], [2.0, 2.0], [0.0, 2.0], [1.0, 1.0], [1.0, 0.0]])
+    assert _area(convex_hull_xy(square)) == pytest.approx(4.0)
+    assert len(convex_hull_xy(square)) == 4
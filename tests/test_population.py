@@ -0,0 +1,67 @@
+"""Население по привязке зданий к узлам против прямого суммирования."""
+import types
+
+import pytest
+
+np = pytest.importorskip('numpy')
+
+from accessibility.population import NodePopulation, node_population  # noqa: E402
+from accessibility.search import bounded_search  # noqa: E402
+from accessibility.service_area import RoadNetwork  # noqa: E402
+
+
+def _network(size=8, step=100.0):
+    lines = [[(0.0, j * step), ((size - 1) * step, j * step)] for j in range(size)]
+    lines += [[(i * step, 0.0), (i * step, (size - 1) * step)] for i in range(0, size, 2)]
+    return RoadNetwork.from_polylines(lines, speed_mps=1.25)
+
+
+def _brute_force(network, xy, population, dist, cutoff, max_access, speed_mps):
+    """Ближайший узел — перебором, время — до узла плюс подход пешком."""
+    total, count = 0.0, 0
+    for (x, y), pop in zip(xy.tolist(), population.tolist()):
+        d = np.hypot(network.node_xy[:, 0] - x, network.node_xy[:, 1] - y)
+        node = int(d.argmin())
+        if d[node] > max_access:
+            continue
+        if dist[node] + d[node] / speed_mps <= cutoff:
+            total += pop
+            count += 1
+    return total, count
+
+
+def test_within_matches_brute_force():
+    network = _network()
+    rng = np.random.default_rng(3)
+    xy = rng.uniform(-150.0, 850.0, (300, 2))
+    population = rng.integers(0, 40, 300).astype(float)
+    max_access = 60.0
+    assignment = NodePopulation.assign(network.grid, xy, population, max_access)
+
+    far = np.array([np.hypot(*(network.node_xy - p).T).min() > max_access for p in xy])
+    assert len(assignment) == int((~far).sum())
+    assert assignment.unassigned_population == pytest.approx(population[far].sum())
+    assert assignment.per_node().sum() == pytest.approx(population[~far].sum())
+
+    start, _ = network.snap(350.0, 350.0)
+    cutoffs = [120.0, 240.0, 480.0]
+    result = bounded_search(network.graph, start, cutoffs)
+    dist = result.to_dense(network.num_nodes)
+    pops, counts = assignment.within(result, access_cost_per_unit=1.0 / 1.25)
+    for cutoff, pop, count in zip(cutoffs, pops.tolist(), counts.tolist()):
+        expected_pop, expected_count = _brute_force(network, xy, population, dist, cutoff, max_access, 1.25)
+        assert pop == pytest.approx(expected_pop)
+        assert count == expected_count
+    # Пороги можно задать отдельно от порогов поиска (не дальше максимального)
+    pops_alone, _ = assignment.within(result, [240.0], access_cost_per_unit=1.0 / 1.25)
+    assert pops_alone[0] == pytest.approx(pops[1])
+
+
+def test_assignment_is_cached_in_store():
+    network = _network()
+    store = types.SimpleNamespace(centroids=np.array([[10.0, 5.0], [390.0, 210.0]]),
+                                  population=np.array([4.0, 6.0]), node_assignments={})
+    first = node_population(store, 'graph-a', network.grid)
+    assert node_population(store, 'graph-a', network.grid) is first
+    assert node_population(store, 'graph-b', network.grid) is not first
+    assert first.population.sum() == pytest.approx(10.0)
@@ -0,0 +1,69 @@
+"""Кэш результатов: вытеснение из памяти по объёму, подъём с диска, очистка дискового уровня."""
+import os
+
+import pytest
+
+np = pytest.importorskip('numpy')
+
+from accessibility import graph_cache  # noqa: E402
+from accessibility.result_cache import ResultCache, origin_part, result_key  # noqa: E402
+
+
+def _arrays(kb):
+    return {'segments': np.zeros(kb * 125, dtype=np.float64)}  # kb тысяч байт
+
+
+def test_key_parts():
+    key = result_key(mode='transit', origin=origin_part((10.00001, 20.0)), steps=3)
+    assert key == result_key(steps=3, origin=[10.0, 20.0], mode='transit')
+    assert key != result_key(mode='transit', origin=[10.0, 20.5], steps=3)
+
+
+def test_memory_lru_evicts_by_size(tmp_path):
+    cache = ResultCache(max_memory_mb=0.35, root=str(tmp_path), max_disk_entries=0)
+    for name in ('a', 'b', 'c'):
+        cache.put(name, _arrays(100), {'name': name})
+    assert len(cache) == 3
+    assert cache.get('a')['values'] == {'name': 'a'}  # 'a' — самая свежая
+
+    cache.put('d', _arrays(100))
+    assert 'b' not in cache
+    assert all(key in cache for key in ('a', 'c', 'd'))
+    assert cache.nbytes <= cache.max_bytes
+
+    # Запись больше всего объёма в память не кладётся и ничего не вытесняет
+    cache.put('huge', _arrays(400))
+    assert 'huge' not in cache and len(cache) == 3
+    assert cache.get('b') is None and cache.misses == 1
+
+
+def test_disk_hit_is_promoted_to_memory(tmp_path):
+    writer = ResultCache(root=str(tmp_path))
+    writer.put('k', {'polygon': np.arange(10, dtype=np.uint8)}, {'population': 12.5})
+
+    reader = ResultCache(root=str(tmp_path))
+    assert 'k' not in reader
+    entry = reader.get('k')
+    np.testing.assert_array_equal(entry['arrays']['polygon'], np.arange(10, dtype=np.uint8))
+    assert entry['values'] == {'population': 12.5}
+    assert reader.disk_hits == 1 and 'k' in reader
+    reader.get('k')
+    assert reader.hits == 1 and reader.disk_hits == 1
+
+    reader.clear(disk=True)
+    assert len(reader) == 0 and reader.nbytes == 0
+    assert ResultCache(root=str(tmp_path)).get('k') is None
+
+
+def test_prune_disk_keeps_recent_entries(tmp_path):
+    cache = ResultCache(root=str(tmp_path), max_disk_entries=100)
+    for i, name in enumerate(('old', 'used', 'mid', 'new')):
+        cache.put(name, _arrays(1))
+        stamp = 1_000_000 + i
+        os.utime(os.path.join(graph_cache.artifact_path(name, str(tmp_path)), 'meta.json'), (stamp, stamp))
+    # Чтение с диска обновляет отметку времени: 'used' становится самой свежей
+    assert ResultCache(root=str(tmp_path)).get('used') is not None
+
+    cache.max_disk_entries = 2
+    cache._prune_disk()
+    assert sorted(name for name in os.listdir(tmp_path) if not name.startswith('.')) == ['new', 'used']
@@ -0,0 +1,119 @@
+"""bounded_search против полного Dijkstra по тому же графу и по сжатому графу против несжатого."""
+import heapq
+import math
+
+import pytest
+
+np = pytest.importorskip('numpy')
+
+from accessibility.graph import EdgeListBuilder  # noqa: E402
+from accessibility.search import bounded_search  # noqa: E402
+
+
+def _builder(seed, size=12, step=100.0):
+    """Решётка с выброшенными улицами; улицы разбиты на 1–3 звена, часть — односторонние."""
+    rng = np.random.default_rng(seed)
+    builder = EdgeListBuilder()
+    for i in range(size):
+        for j in range(size):
+            for di, dj in ((1, 0), (0, 1)):
+                if i + di >= size or j + dj >= size or rng.random() < 0.2:
+                    continue
+                parts = int(rng.integers(1, 4))
+                both_ways = rng.random() > 0.1
+                xs = np.linspace(i * step, (i + di) * step, parts + 1)
+                ys = np.linspace(j * step, (j + dj) * step, parts + 1)
+                for k in range(parts):
+                    u = builder.node(xs[k], ys[k])
+                    v = builder.node(xs[k + 1], ys[k + 1])
+                    length = step / parts
+                    builder.add_edge(u, v, length * rng.uniform(0.8, 1.5), length, both_ways)
+    return builder
+
+
+def _full_dijkstra(graph, sources):
+    """Эталон: Dijkstra без ограничения по всему графу."""
+    dist = np.full(graph.num_nodes, np.inf)
+    heap = []
+    for node, cost in sources:
+        if cost < dist[node]:
+            dist[node] = cost
+            heap.append((cost, node))
+    heapq.heapify(heap)
+    while heap:
+        d, u = heapq.heappop(heap)
+        if d > dist[u]:
+            continue
+        for k in range(graph.offsets[u], graph.offsets[u + 1]):
+            v = graph.targets[k]
+            if d + graph.weights[k] < dist[v]:
+                dist[v] = d + graph.weights[k]
+                heapq.heappush(heap, (dist[v], v))
+    return dist
+
+
+@pytest.mark.parametrize('seed', [1, 2, 3])
+def test_bounded_matches_full_search(seed):
+    builder = _builder(seed)
+    graph = builder.build()
+    rng = np.random.default_rng(seed)
+    cutoffs = [400.0, 150.0, 900.0]  # порядок порогов не важен
+    for start in rng.choice(builder.num_nodes, 10, replace=False).tolist():
+        full = _full_dijkstra(graph, [(start, 0.0)])
+        result = bounded_search(graph, start, cutoffs)
+        expected = np.where(full <= 900.0, full, np.inf)
+        np.testing.assert_allclose(result.to_dense(graph.num_nodes), expected)
+
+        assert np.all(np.diff(result.times) >= 0)
+        np.testing.assert_array_equal(result.cutoffs, [150.0, 400.0, 900.0])
+        for cutoff, bound in zip(result.cutoffs, result.bounds()):
+            assert bound == result.count_within(cutoff) == np.count_nonzero(full <= cutoff)
+            assert set(result.nodes_within(cutoff).tolist()) == set(np.flatnonzero(full <= cutoff).tolist())
+        node = int(result.nodes[-1])
+        assert result.time_of(node) == pytest.approx(full[node])
+        far = np.flatnonzero(full > 900.0)
+        if len(far):
+            assert math.isinf(result.time_of(int(far[0])))
+
+
+def test_multi_source():
+    builder = _builder(4)
+    graph = builder.build()
+    sources = [(0, 30.0), (50, 0.0), (90, 120.0), (50, 10.0)]
+    full = _full_dijkstra(graph, sources)
+    result = bounded_search(graph, sources, 500.0)
+    np.testing.assert_allclose(result.to_dense(graph.num_nodes), np.where(full <= 500.0, full, np.inf))
+    # Старт дальше порога в поиск не попадает
+    assert len(bounded_search(graph, [(0, 600.0)], 500.0)) == 0
+
+
+@pytest.mark.parametrize('seed', [1, 2, 3])
+def test_contracted_matches_plain(seed):
+    builder = _builder(seed)
+    plain = builder.build()
+    contracted = builder.build(contract=True)
+    assert contracted.chains is not None and contracted.chains.num_chains > 0
+    assert contracted.num_edges < plain.num_edges
+
+    rng = np.random.default_rng(seed)
+    cutoffs = [150.0, 400.0, 900.0]
+    for start in rng.choice(builder.num_nodes, 20, replace=False).tolist():
+        expected = bounded_search(plain, start, cutoffs)
+        result = bounded_search(contracted, start, cutoffs)
+        np.testing.assert_allclose(result.to_dense(builder.num_nodes),
+                                   expected.to_dense(builder.num_nodes))
+        np.testing.assert_array_equal(result.bounds(), expected.bounds())
+        assert np.all(np.diff(result.times) >= 0)
+
+
+def test_contracted_multi_source():
+    builder = _builder(4)
+    plain = builder.build()
+    contracted = builder.build(contract=True)
+    # Промежуточные узлы цепочек и развилки вперемешку, с ненулевыми начальными временами
+    inner = np.flatnonzero(contracted.chains.node_chain >= 0)[:5].tolist()
+    junctions = np.flatnonzero(contracted.chains.node_chain < 0)[:3].tolist()
+    sources = [(node, 10.0 * k) for k, node in enumerate(inner + junctions)]
+    expected = bounded_search(plain, sources, 500.0)
+    result = bounded_search(contracted, sources, 500.0)
+    np.testing.assert_allclose(result.to_dense(builder.num_nodes), expected.to_dense(builder.num_nodes))
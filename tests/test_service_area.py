@@ -0,0 +1,60 @@
+"""Интервалы зоны обслуживания из одного поиска против отдельного поиска на каждый порог."""
+import pytest
+
+np = pytest.importorskip('numpy')
+
+from accessibility.search import bounded_search  # noqa: E402
+from accessibility.service_area import RoadNetwork  # noqa: E402
+
+
+def _network(seed, size=10, step=80.0):
+    """Решётка улиц с выброшенными кварталами и изломом на части улиц."""
+    rng = np.random.default_rng(seed)
+    lines = []
+    for i in range(size):
+        for j in range(size):
+            x, y = i * step, j * step
+            if i + 1 < size and rng.random() > 0.15:
+                lines.append([(x, y), (x + step / 2, y + rng.uniform(-10.0, 10.0)), (x + step, y)])
+            if j + 1 < size and rng.random() > 0.15:
+                lines.append([(x, y), (x, y + step)])
+    return RoadNetwork.from_polylines(lines)
+
+
+def _segment_key(segments):
+    return sorted(tuple(np.round(s.ravel(), 6).tolist()) for s in segments)
+
+
+def _reached_length(network, dist, cutoff):
+    """Длина достигнутых частей рёбер напрямую по расстояниям до концов."""
+    du = dist[network.rec_src]
+    dv = np.where(network.rec_both_ways, dist[network.rec_dst], np.inf)
+    reach = np.maximum(cutoff - du, 0.0) + np.maximum(cutoff - dv, 0.0)
+    return float(np.minimum(np.nan_to_num(reach, posinf=0.0), network.rec_cost).sum())
+
+
+@pytest.mark.parametrize('seed', [0, 1])
+def test_intervals_match_separate_searches(seed):
+    network = _network(seed)
+    cutoffs = [150.0, 300.0, 600.0]
+    start, _ = network.snap(360.0, 360.0)
+    together = network.service_area(start, cutoffs)
+    assert [interval.cutoff for interval in together] == cutoffs
+    dist = bounded_search(network.graph, start, np.inf).to_dense(network.num_nodes)
+
+    for interval, cutoff in zip(together, cutoffs):
+        alone = network.service_area(start, [cutoff])[0]
+        assert _segment_key(interval.segments) == _segment_key(alone.segments)
+        np.testing.assert_allclose(interval.end_points, interval.segments[:, 1, :])
+        assert interval.total_length() == pytest.approx(_reached_length(network, dist, cutoff))
+    assert together[0].total_length() < together[1].total_length() < together[2].total_length()
+
+
+def test_start_pairs_and_unreached():
+    network = _network(2)
+    start, _ = network.snap(0.0, 0.0)
+    # Начальная стоимость сдвигает все пороги
+    shifted = network.service_area([(start, 100.0)], [300.0])[0]
+    plain = network.service_area(start, [200.0])[0]
+    assert _segment_key(shifted.segments) == _segment_key(plain.segments)
+    assert len(network.service_area([(start, 500.0)], [300.0])[0]) == 0
@@ -0,0 +1,72 @@
+"""NodeGrid и SegmentGrid против полного перебора."""
+import pytest
+
+np = pytest.importorskip('numpy')
+
+from accessibility.snapping import NodeGrid, SegmentGrid  # noqa: E402
+
+
+def _brute_nodes(node_xy, xy, max_dist):
+    d = np.hypot(*(xy[:, None, :] - node_xy[None, :, :]).transpose(2, 0, 1))
+    ids = d.argmin(axis=1)
+    best = d[np.arange(len(xy)), ids]
+    far = best > max_dist
+    return np.where(far, -1, ids), np.where(far, np.inf, best)
+
+
+def _brute_segments(seg_a, seg_b, xy, max_dist):
+    ab = seg_b - seg_a
+    len2 = (ab * ab).sum(axis=1)
+    rel = xy[:, None, :] - seg_a[None]
+    t = np.clip((rel * ab[None]).sum(axis=2) / len2, 0.0, 1.0)
+    d = np.hypot(*(seg_a[None] + t[..., None] * ab[None] - xy[:, None, :]).transpose(2, 0, 1))
+    ids = d.argmin(axis=1)
+    rows = np.arange(len(xy))
+    best = d[rows, ids]
+    far = best > max_dist
+    return np.where(far, -1, ids), np.where(far, np.inf, best), np.where(far, np.nan, t[rows, ids])
+
+
+@pytest.mark.parametrize('max_dist', [np.inf, 40.0])
+def test_node_grid_nearest_many(max_dist):
+    rng = np.random.default_rng(7)
+    # Плотный центр и редкие узлы по краям — ячейки заполнены неравномерно
+    node_xy = np.concatenate((rng.normal(500.0, 60.0, (400, 2)), rng.uniform(0.0, 1000.0, (100, 2))))
+    xy = rng.uniform(-100.0, 1100.0, (300, 2))
+    grid = NodeGrid.build(node_xy)
+    ids, dist = grid.nearest_many(xy, max_dist)
+    expected_ids, expected_dist = _brute_nodes(node_xy, xy, max_dist)
+    np.testing.assert_array_equal(ids, expected_ids)
+    np.testing.assert_allclose(dist, expected_dist)
+    assert ids.dtype == np.int32
+    if np.isfinite(max_dist):
+        assert (ids < 0).any() and (ids >= 0).any()
+
+    for (x, y), node, d in list(zip(xy.tolist(), ids.tolist(), dist.tolist()))[:50]:
+        one, one_dist = grid.nearest(x, y, max_dist)
+        assert (one if one is not None else -1) == node
+        assert one_dist == pytest.approx(d)
+
+
+@pytest.mark.parametrize('max_dist', [np.inf, 25.0])
+def test_segment_grid_nearest_many(max_dist):
+    rng = np.random.default_rng(11)
+    # Короткие звенья улиц и несколько длинных, задевающих много ячеек
+    seg_a = rng.uniform(0.0, 1000.0, (300, 2))
+    seg_b = seg_a + rng.normal(0.0, 30.0, (300, 2))
+    long_a = rng.uniform(0.0, 1000.0, (5, 2))
+    long_b = rng.uniform(0.0, 1000.0, (5, 2))
+    seg_a = np.concatenate((seg_a, long_a))
+    seg_b = np.concatenate((seg_b, long_b))
+    xy = rng.uniform(-50.0, 1050.0, (400, 2))
+
+    grid = SegmentGrid.build(seg_a, seg_b)
+    ids, dist, t = grid.nearest_many(xy, max_dist)
+    expected_ids, expected_dist, expected_t = _brute_segments(seg_a, seg_b, xy, max_dist)
+    np.testing.assert_array_equal(ids, expected_ids)
+    np.testing.assert_allclose(dist, expected_dist)
+    np.testing.assert_allclose(t, expected_t)
+
+    found = ids >= 0
+    points = grid.points_at(ids[found], t[found])
+    np.testing.assert_allclose(np.hypot(*(points - xy[found]).T), dist[found])
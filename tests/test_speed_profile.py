@@ -0,0 +1,192 @@
+"""
+Профиль скоростей маршрутов: сопоставление треков в пуле процессов и в текущем
+процессе, segment_speeds против линейного перебора интервалов, привязка
+остановок к маршрутам против перебора всех звеньев.
+"""
+import sys
+import types
+
+import pytest
+
+np = pytest.importorskip('numpy')
+
+from accessibility import pool, speed_profile  # noqa: E402
+from accessibility.speed_profile import (  # noqa: E402
+    MIN_INTERVAL,
+    MIN_OVERLAP,
+    MIN_SEGMENT,
+    RouteLines,
+    RouteSpeedProfile,
+    build_speed_profile,
+)
+
+
+def _linear_speed(intervals, measure_a, measure_b):
+    """Прежний расчёт Task4: перебор всех интервалов маршрута."""
+    a = min(measure_a, measure_b)
+    b = max(measure_a, measure_b)
+    if b - a < MIN_SEGMENT:
+        return None
+    total = 0.0
+    weight = 0.0
+    for ts, te, speed in intervals:
+        overlap = min(b, te) - max(a, ts)
+        if overlap > MIN_OVERLAP:
+            total += speed * overlap
+            weight += overlap
+    return total / weight if weight > 0 else None
+
+
+def _profile(seed, routes=6, per_route=40, length=5000.0):
+    rng = np.random.default_rng(seed)
+    rids, starts, ends, speeds = [], [], [], []
+    for rid in range(10, 10 + routes):
+        start = rng.uniform(0.0, length, per_route)
+        # Интервалы не короче MIN_INTERVAL, в том числе почти минимальные
+        size = np.where(rng.random(per_route) < 0.2, rng.uniform(MIN_INTERVAL, MIN_INTERVAL + 2.0, per_route),
+                        rng.uniform(MIN_INTERVAL, 800.0, per_route))
+        rids.extend([rid] * per_route)
+        starts.extend(start.tolist())
+        ends.extend((start + size).tolist())
+        speeds.extend(rng.uniform(2.0, 15.0, per_route).tolist())
+    return RouteSpeedProfile.from_intervals(rids, np.array(starts), np.array(ends), np.array(speeds))
+
+
+@pytest.mark.parametrize('seed', [0, 1, 2])
+def test_segment_speeds_match_linear_scan(seed):
+    profile = _profile(seed)
+    rng = np.random.default_rng(100 + seed)
+    for rid in profile.route_ids.tolist():
+        intervals = profile.intervals(rid)
+        # Отрезки между остановками, в том числе короче MIN_SEGMENT и в обратном порядке мер
+        measures = np.sort(rng.uniform(-200.0, 6000.0, 60))
+        measures[5] = measures[4] + MIN_SEGMENT / 2
+        a, b = measures[:-1].copy(), measures[1:].copy()
+        a[::7], b[::7] = b[::7].copy(), a[::7].copy()
+        speeds = profile.segment_speeds(rid, a, b)
+        for x, y, got in zip(a.tolist(), b.tolist(), speeds.tolist()):
+            expected = _linear_speed(intervals, x, y)
+            if expected is None:
+                assert np.isnan(got)
+            else:
+                assert got == pytest.approx(expected, rel=1e-9)
+
+
+def test_segment_speeds_at_interval_edges():
+    # Перекрытие ровно около MIN_OVERLAP с обеих сторон отрезка
+    profile = RouteSpeedProfile.from_intervals(
+        [1, 1, 1], np.array([0.0, 99.6, 99.4]), np.array([100.4, 300.0, 300.0]), np.array([5.0, 10.0, 7.0]))
+    intervals = profile.intervals(1)
+    a = np.array([100.0, 0.0, 99.0, 100.2])
+    b = np.array([200.0, 100.0, 101.0, 100.3])
+    for x, y, got in zip(a.tolist(), b.tolist(), profile.segment_speeds(1, a, b).tolist()):
+        expected = _linear_speed(intervals, x, y)
+        if expected is None:
+            assert np.isnan(got)
+        else:
+            assert got == pytest.approx(expected, rel=1e-9)
+
+
+def test_unknown_route_and_round_trip():
+    profile = _profile(3)
+    assert np.isnan(profile.segment_speeds(999, [0.0], [100.0])).all()
+    restored = RouteSpeedProfile.from_arrays(profile.to_arrays())
+    a = np.arange(0.0, 5000.0, 250.0)
+    for rid in profile.route_ids.tolist():
+        np.testing.assert_array_equal(restored.segment_speeds(rid, a, a + 250.0),
+                                      profile.segment_speeds(rid, a, a + 250.0))
+
+
+def _bind_linear(parts_by_route, x, y, max_dist):
+    """Эталон привязки: перебор всех звеньев всех маршрутов, мера — как lineLocatePoint."""
+    best = (-1, np.inf, np.nan)
+    for pos, (_rid, parts) in enumerate(parts_by_route):
+        measure = 0.0
+        for part in parts:
+            for (ax, ay), (bx, by) in zip(part[:-1], part[1:]):
+                length = np.hypot(bx - ax, by - ay)
+                t = min(max(((x - ax) * (bx - ax) + (y - ay) * (by - ay)) / length ** 2, 0.0), 1.0)
+                d = np.hypot(ax + t * (bx - ax) - x, ay + t * (by - ay) - y)
+                if d <= max_dist and d < best[1]:
+                    best = (pos, d, measure + t * length)
+                measure += length
+    return best
+
+
+def test_bind_points_match_linear_scan():
+    rng = np.random.default_rng(5)
+    parts_by_route = []
+    for rid in range(20, 32):
+        # Ломаные из 1–2 частей: мера второй части продолжает первую
+        parts = []
+        for _ in range(int(rng.integers(1, 3))):
+            start = rng.uniform(0.0, 3000.0, 2)
+            steps = rng.uniform(-300.0, 300.0, (int(rng.integers(2, 8)), 2))
+            parts.append([tuple(p) for p in np.vstack([start, start + np.cumsum(steps, axis=0)]).tolist()])
+        parts_by_route.append((rid, parts))
+    routes = RouteLines.from_parts(parts_by_route)
+    xy = rng.uniform(-200.0, 3200.0, (400, 2))
+    snap_dist = 150.0
+
+    route_pos, dists, measures = routes.bind_points(xy, snap_dist)
+    bound = 0
+    for (x, y), pos, d, m in zip(xy.tolist(), route_pos.tolist(), dists.tolist(), measures.tolist()):
+        expected_pos, expected_d, expected_m = _bind_linear(parts_by_route, x, y, snap_dist)
+        assert pos == expected_pos
+        if expected_pos < 0:
+            assert np.isinf(d) and np.isnan(m)
+            continue
+        bound += 1
+        assert d == pytest.approx(expected_d, abs=1e-9)
+        assert m == pytest.approx(expected_m, abs=1e-6)
+    assert 0 < bound < len(xy)
+    np.testing.assert_array_equal(routes.route_ids, [rid for rid, _ in parts_by_route])
+
+
+def test_bind_points_without_routes():
+    route_pos, dists, measures = RouteLines.from_parts([]).bind_points([(0.0, 0.0)], 100.0)
+    assert route_pos.tolist() == [-1] and np.isinf(dists).all() and np.isnan(measures).all()
+
+
+def _tracks():
+    routes = RouteLines.from_parts([(7, [[(0.0, 0.0), (1000.0, 0.0)]]), (8, [[(0.0, 500.0), (1000.0, 500.0)]])])
+    track_xy = np.array([[100.0, 5.0], [300.0, 5.0], [600.0, 495.0], [900.0, 495.0],
+                         [400.0, -3.0], [700.0, -3.0], [200.0, 250.0], [400.0, 250.0]])
+    track_offsets = np.array([0, 2, 4, 6, 8])
+    speeds = np.array([5.0, 8.0, 6.0, 9.0])
+    return routes, track_xy, track_offsets, speeds
+
+
+def test_pool_matches_single_process():
+    routes, track_xy, track_offsets, speeds = _tracks()
+    expected = build_speed_profile(routes, track_xy, track_offsets, speeds, workers=1)
+    assert expected.intervals(7) == [(100.0, 300.0, 5.0), (400.0, 700.0, 6.0)]
+    assert expected.intervals(8) == [(600.0, 900.0, 8.0)]
+    # Трек посередине между маршрутами дальше MAX_MATCH_DIST и отбрасывается
+    assert len(expected) == 3
+
+    done = []
+    profile = build_speed_profile(routes, track_xy, track_offsets, speeds, workers=2, chunk_size=1,
+                                  progress=lambda i, total: done.append((i, total)))
+    assert done[-1] == (4, 4)
+    for rid in (7, 8):
+        assert profile.intervals(rid) == expected.intervals(rid)
+
+    restored = RouteSpeedProfile.from_arrays(profile.to_arrays())
+    assert restored.intervals(7) == expected.intervals(7)
+
+
+def test_no_process_pool_inside_qgis_gui(monkeypatch):
+    routes, track_xy, track_offsets, speeds = _tracks()
+    expected = build_speed_profile(routes, track_xy, track_offsets, speeds, workers=1)
+
+    monkeypatch.setitem(sys.modules, 'qgis.utils', types.SimpleNamespace(iface=object()))
+    assert pool.mp_context() is None
+
+    def no_pool(*args, **kwargs):
+        raise AssertionError("пул процессов внутри QGIS Desktop")
+
+    monkeypatch.setattr(speed_profile, 'ProcessPoolExecutor', no_pool)
+    profile = build_speed_profile(routes, track_xy, track_offsets, speeds, workers=2, chunk_size=1)
+    assert profile.intervals(7) == expected.intervals(7)
+    assert profile.intervals(8) == expected.intervals(8)
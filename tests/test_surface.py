@@ -0,0 +1,148 @@
+"""Растр времени пути: правила node и edge против перебора, контуры порогов."""
+import math
+
+import pytest
+
+np = pytest.importorskip('numpy')
+
+from accessibility.graph import EdgeListBuilder  # noqa: E402
+from accessibility.surface import (  # noqa: E402
+    RULE_EDGE,
+    RULE_NODE,
+    TimeSurface,
+    mask_rings,
+    parse_thresholds,
+    ring_area,
+)
+
+# Два звена углом: (0, 0) — (100, 0) — (100, 100), стоимость в секундах
+NODE_XY = np.array([[0.0, 0.0], [100.0, 0.0], [100.0, 100.0]])
+LINKS = (np.array([0, 1]), np.array([1, 2]), np.array([100.0, 100.0]))
+WALK_OFF = 30.0
+# Центры ячеек не лежат на биссектрисе угла — у каждой ячейки одно ближайшее звено
+CELL = 7.0
+
+
+def _cell_centers(surface):
+    rows, cols = surface.shape
+    xs = surface.x0 + (np.arange(cols) + 0.5) * surface.cell_size
+    ys = surface.y_top - (np.arange(rows) + 0.5) * surface.cell_size
+    return [(r, c, x, y) for r, y in enumerate(ys.tolist()) for c, x in enumerate(xs.tolist())]
+
+
+def _node_rule(node_times, max_time, x, y):
+    """Эталон node: ближайший достигнутый узел в радиусе подхода."""
+    reached = np.flatnonzero(node_times <= max_time)
+    d = np.hypot(NODE_XY[reached, 0] - x, NODE_XY[reached, 1] - y)
+    k = int(d.argmin())
+    if d[k] > WALK_OFF:
+        return math.nan
+    t = node_times[reached[k]] + d[k]
+    return t if t <= max_time else math.nan
+
+
+def _edge_rule(node_times, max_time, x, y):
+    """Эталон edge: ближайшее звено с достигнутым концом, время в точке проекции."""
+    best = None
+    for u, v, cost in zip(*(a.tolist() for a in LINKS)):
+        if min(node_times[u], node_times[v]) > max_time:
+            continue
+        (ax, ay), (bx, by) = NODE_XY[u], NODE_XY[v]
+        length2 = (bx - ax) ** 2 + (by - ay) ** 2
+        t = min(max(((x - ax) * (bx - ax) + (y - ay) * (by - ay)) / length2, 0.0), 1.0)
+        d = math.hypot(ax + t * (bx - ax) - x, ay + t * (by - ay) - y)
+        if best is None or d < best[0]:
+            best = (d, min(node_times[u] + t * cost, node_times[v] + (1.0 - t) * cost))
+    if best is None or best[0] > WALK_OFF:
+        return math.nan
+    t = best[1] + best[0]
+    return t if t <= max_time else math.nan
+
+
+def _check(surface, expected_fn, node_times, max_time):
+    covered = 0
+    for r, c, x, y in _cell_centers(surface):
+        expected = expected_fn(node_times, max_time, x, y)
+        got = float(surface.values[r, c])
+        if math.isnan(expected):
+            assert math.isnan(got), (x, y)
+        else:
+            assert got == pytest.approx(expected, rel=1e-5), (x, y)
+            covered += 1
+    return covered
+
+
+@pytest.mark.parametrize('max_time', [250.0, 150.0])
+def test_node_and_edge_rules_match_brute_force(max_time):
+    node_times = np.array([0.0, 100.0, 200.0])
+    node = TimeSurface.build(NODE_XY, node_times, max_time, 1.0, CELL, RULE_NODE, max_walk_off=WALK_OFF)
+    edge = TimeSurface.build(NODE_XY, node_times, max_time, 1.0, CELL, RULE_EDGE, links=LINKS,
+                             max_walk_off=WALK_OFF)
+    assert node.cell_size == edge.cell_size == CELL
+    node_cells = _check(node, _node_rule, node_times, max_time)
+    edge_cells = _check(edge, _edge_rule, node_times, max_time)
+    # Вдоль звеньев ячеек больше, чем вокруг узлов
+    assert 0 < node_cells < edge_cells
+
+    # sample берёт значение ячейки, вне растра — NaN
+    r, c, x, y = _cell_centers(edge)[edge.shape[1] * (edge.shape[0] // 2) + edge.shape[1] // 2]
+    assert edge.sample([x, -1e6], [y, 0.0])[0] == pytest.approx(edge.values[r, c], nan_ok=True)
+    assert math.isnan(edge.sample([-1e6], [0.0])[0])
+
+
+def test_edge_rule_without_reached_links():
+    # Достигнут только отдельный узел без звеньев: правило edge сводится к node
+    node_xy = np.vstack((NODE_XY, [[300.0, 300.0]]))
+    node_times = np.array([np.inf, np.inf, np.inf, 0.0])
+    edge = TimeSurface.build(node_xy, node_times, 60.0, 1.0, CELL, RULE_EDGE, links=LINKS, max_walk_off=WALK_OFF)
+    node = TimeSurface.build(node_xy, node_times, 60.0, 1.0, CELL, RULE_NODE, max_walk_off=WALK_OFF)
+    np.testing.assert_array_equal(edge.values, node.values)
+    assert edge.extent == node.extent
+    assert np.nanmax(edge.values) <= WALK_OFF
+
+    with pytest.raises(Exception):
+        TimeSurface.build(node_xy, np.full(4, np.inf), 60.0, 1.0, CELL, RULE_EDGE, links=LINKS)
+
+
+def test_links_of_contracted_graph():
+    builder = EdgeListBuilder()
+    # Квадрат с хвостом из узлов степени 2 и кратным ребром
+    corners = [builder.node(x, y) for x, y in ((0.0, 0.0), (100.0, 0.0), (100.0, 100.0), (0.0, 100.0))]
+    for k in range(4):
+        builder.add_edge(corners[k], corners[(k + 1) % 4], 100.0 + k, 100.0)
+    builder.add_edge(corners[0], corners[1], 90.0, 100.0)
+    tail = corners[2]
+    for k in range(1, 4):
+        nxt = builder.node(100.0 + 30.0 * k, 100.0)
+        builder.add_edge(tail, nxt, 30.0, 30.0, k != 2)
+        tail = nxt
+
+    def as_set(links):
+        return sorted(zip(*(a.tolist() for a in links)))
+
+    plain = as_set(builder.build().links())
+    contracted = builder.build(contract=True)
+    assert contracted.chains is not None
+    assert as_set(contracted.links()) == plain
+    assert (corners[0], corners[1], 90.0) in plain and len(plain) == 7
+
+
+def test_mask_rings_with_hole():
+    mask = np.ones((3, 3), dtype=bool)
+    mask[1, 1] = False
+    mask = np.pad(mask, 1)
+    mask[0, 0] = True  # касание по диагонали — отдельное кольцо
+    # В координатах (строка, столбец) направления обхода зеркальны карте — сравниваются модули
+    assert sorted(abs(ring_area(ring)) for ring in mask_rings(mask)) == [1.0, 1.0, 9.0]
+
+    surface = TimeSurface(np.where(mask, 10.0, np.nan).astype(np.float32), 0.0, 50.0, 10.0)
+    map_areas = sorted(ring_area(ring) for ring in surface.rings(10.0))
+    assert map_areas == [-100.0, 100.0, 900.0]
+    assert surface.rings(5.0) == []
+
+
+def test_parse_thresholds():
+    assert parse_thresholds('12; 5, 7.5 ,5') == [300.0, 450.0, 720.0]
+    assert parse_thresholds('') == []
+    with pytest.raises(Exception):
+        parse_thresholds('5, десять')
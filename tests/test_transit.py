@@ -0,0 +1,135 @@
+"""
+raptor_search против Dijkstra по мультиграфу остановок из тех же данных,
+StopTimeTable.query против raptor_search от тех же подходов.
+"""
+import math
+from collections import defaultdict
+
+import pytest
+
+np = pytest.importorskip('numpy')
+
+from accessibility.transit import StopTimeTable, TransitIndex, multigraph_search, raptor_search  # noqa: E402
+
+# Маршруты A: 1→2→3, B: 4→5→6, C: 7→8; пешие пересадки 3→4 и 6→7.
+# До 8 — три маршрута, то есть две пересадки.
+ROUTES = {'A': [1, 2, 3], 'B': [4, 5, 6], 'C': [7, 8]}
+HEADWAY = {'A': 600.0, 'B': 400.0, 'C': 200.0}
+RIDE_TIMES = {'A': [120.0, 180.0], 'B': [200.0, 100.0], 'C': [300.0]}
+FOOTPATHS = {3: [(4, 60.0)], 6: [(7, 60.0)]}
+ACCESS = {1: 100.0}
+RIDDEN = [2, 3, 5, 6, 8]  # остановки, куда приезжают (а не приходят пешком)
+
+
+def _index():
+    stops_route_map = {rid: [(stop_id, 100.0 * i, None) for i, stop_id in enumerate(stops)]
+                       for rid, stops in ROUTES.items()}
+    return TransitIndex(stops_route_map, HEADWAY)
+
+
+def _multigraph(index):
+    """Мультиграф по правилам Task4: посадка и пересадка включают ожидание на остановке."""
+    node_index = {stop_id: i + 1 for i, stop_id in enumerate(sorted({s for v in ROUTES.values() for s in v}))}
+    edges = defaultdict(list)
+    for stop_id, walk in ACCESS.items():
+        edges[0].append((node_index[stop_id], walk + index.wait_time(stop_id), 'board'))
+    for rid, stops in ROUTES.items():
+        for a, b, ride in zip(stops[:-1], stops[1:], RIDE_TIMES[rid]):
+            edges[node_index[a]].append((node_index[b], ride, 'bus'))
+    for stop_id, paths in FOOTPATHS.items():
+        for stop2, walk in paths:
+            edges[node_index[stop_id]].append((node_index[stop2], walk + index.wait_time(stop2), 'transfer'))
+    dist, _ = multigraph_search(edges, len(node_index) + 1)
+    return {stop_id: dist[node] for stop_id, node in node_index.items()}
+
+
+def test_raptor_matches_multigraph_when_transfers_suffice():
+    index = _index()
+    expected = _multigraph(index)
+    assert expected[8] == pytest.approx(1720.0)
+    arrival, stats = raptor_search(index, ACCESS, RIDE_TIMES, FOOTPATHS, 10000.0, max_transfers=2)
+    assert stats['rounds'] == 3
+    for stop_id in RIDDEN:
+        assert arrival[stop_id] == pytest.approx(expected[stop_id])
+    # До пересадочных остановок RAPTOR считает приход пешком, без ожидания посадки
+    assert arrival[4] == pytest.approx(expected[4] - index.wait_time(4))
+
+
+@pytest.mark.parametrize('max_transfers, reached', [(1, [2, 3, 5, 6]), (0, [2, 3])])
+def test_transfer_cap_cuts_off_stops(max_transfers, reached):
+    index = _index()
+    expected = _multigraph(index)
+    arrival, _ = raptor_search(index, ACCESS, RIDE_TIMES, FOOTPATHS, 10000.0, max_transfers=max_transfers)
+    assert [s for s in RIDDEN if s in arrival] == reached
+    for stop_id in reached:
+        assert arrival[stop_id] == pytest.approx(expected[stop_id])
+    # Dijkstra по мультиграфу числа пересадок не ограничивает
+    assert all(math.isfinite(expected[s]) for s in RIDDEN)
+
+
+def test_cutoff_drops_late_stops():
+    index = _index()
+    arrival, _ = raptor_search(index, ACCESS, RIDE_TIMES, FOOTPATHS, 1200.0, max_transfers=2)
+    assert sorted(arrival) == [1, 2, 3, 4, 5]
+
+
+def _network(seed, num_stops=40, num_routes=10):
+    """
+    Случайная сеть с целыми временами: таблица хранит секунды с точностью 1 сек,
+    поэтому на целых временах она совпадает с поиском точно.
+    """
+    rng = np.random.default_rng(seed)
+    stop_ids = np.arange(100, 100 + num_stops)
+    stops_route_map, headway, ride_times = {}, {}, {}
+    for rid in range(num_routes):
+        stops = rng.choice(stop_ids, int(rng.integers(4, 10)), replace=False).tolist()
+        stops_route_map[rid] = [(stop_id, 100.0 * i, None) for i, stop_id in enumerate(stops)]
+        headway[rid] = float(2 * rng.integers(60, 600)) if rng.random() < 0.8 else None
+        ride_times[rid] = rng.integers(60, 400, len(stops) - 1).astype(float).tolist()
+    footpaths = {}
+    for stop_id in stop_ids.tolist():
+        near = rng.choice(stop_ids, 2, replace=False).tolist()
+        footpaths[stop_id] = [(s, float(rng.integers(30, 300))) for s in near if s != stop_id]
+    # Остановка без маршрутов: до неё доходят только пешком
+    footpaths[stop_ids[0]] = [(999, 120.0)]
+    return TransitIndex(stops_route_map, headway), ride_times, footpaths, np.append(stop_ids, 999)
+
+
+@pytest.mark.parametrize('seed', [0, 1, 2, 3])
+@pytest.mark.parametrize('max_transfers', [0, 2])
+def test_table_matches_raptor(seed, max_transfers):
+    index, ride_times, footpaths, stop_ids = _network(seed)
+    table = StopTimeTable.build(index, ride_times, footpaths, stop_ids, threshold=3000.0,
+                                max_transfers=max_transfers)
+    assert len(table) > 0
+    restored = StopTimeTable.from_arrays(table.to_arrays())
+
+    rng = np.random.default_rng(seed)
+    for _ in range(10):
+        starts = rng.choice(stop_ids, int(rng.integers(1, 5)), replace=False).tolist()
+        access = {s: float(rng.integers(0, 600)) for s in starts}
+        for cutoff in (900.0, 2400.0):
+            expected, _ = raptor_search(index, access, ride_times, footpaths, cutoff, max_transfers)
+            assert table.query(access, cutoff) == expected
+            assert restored.query(access, cutoff) == expected
+
+
+def test_table_threshold_caps_cutoff():
+    index, ride_times, footpaths, stop_ids = _network(5)
+    table = StopTimeTable.build(index, ride_times, footpaths, stop_ids, threshold=600.0)
+    access = {int(stop_ids[1]): 0.0}
+    expected, _ = raptor_search(index, access, ride_times, footpaths, 600.0)
+    assert table.query(access, 5000.0) == expected
+    assert table.query(access) == expected
+
+
+def test_build_can_be_cancelled():
+    index, ride_times, footpaths, stop_ids = _network(6)
+    calls = []
+
+    def progress(done, total):
+        calls.append(done)
+        return done < 3
+
+    assert StopTimeTable.build(index, ride_times, footpaths, stop_ids, progress=progress) is None
+    assert calls == [1, 2, 3]